@@ -0,0 +1,212 @@
+"""Headless micro-benchmarks for completion setup.
+
+Registers a synthetic language per vocabulary size and times, per size:
+
+- first_tab: creating the first editor of the language
+- tab: creating each further editor (median and worst)
+- vocabulary: building the shared vocabulary, once per process
+- complete: answering one completion prefix
+- fuzzy_build: building the FuzzyMatcher of the vocabulary
+- fuzzy_keystroke: filtering the vocabulary as each query is typed
+- keypress: handling a key typed into an editor, TYPING_MS apart
+- popup: from the last key typed to the completion popup showing
+
+Tab creation should not depend on the vocabulary size: the vocabulary
+is built once per process, outside of any editor. Filtering should
+stay under 5 ms per keystroke at 100k words; completion is ranked off
+the GUI thread, so keypress should not grow with the vocabulary at
+all. Results are JSON:
+
+    python benchmarks/bench_completion.py
+    python benchmarks/bench_completion.py --sizes 1000 100000 -o bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import re
+import argparse
+import statistics
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PySide6
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QEventLoop, QTimer
+from PySide6.QtGui import QTextCursor
+from PySide6.QtTest import QTest
+
+# code_editor needs a QApplication at import time
+app = QApplication.instance() or QApplication(sys.argv[:1])
+
+import code_editor
+
+SIZES = (0, 1000, 10000, 100000)
+TABS = 50
+# Milliseconds between the keys of a fast typist, and queries typed
+TYPING_MS = 40
+TYPED_QUERIES = 4
+PREFIXES = ('se', 'get_', 'Qt', 'xyz')
+SOURCE = '\n'.join(
+    f'def get_value_{i}(self, setting):\n    return self.settings[{i}]' for i in range(200))
+SYLLABLES = ['ba', 'co', 'de', 'fi', 'ga', 'hu', 'ji', 'ka', 'lo', 'me', 'nu', 'po', 'qi',
+             'ra', 'su', 'ti', 'vo', 'wa', 'xe', 'yo', 'zu', 'an', 'el', 'in', 'or', 'um']
+
+def synthetic_words(size):
+    """size distinct identifiers of one to three of a few hundred stems,
+    in snake_case or camelCase"""
+    rng = random.Random(size)
+    stems = sorted({rng.choice(SYLLABLES) + rng.choice(SYLLABLES) + rng.choice(['', 't', 'n', 's'])
+                    for _ in range(400)})
+    words = set()
+    while len(words) < size:
+        parts = [rng.choice(stems) for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.5:
+            words.add('_'.join(parts))
+        else:
+            words.add(parts[0] + ''.join(part.capitalize() for part in parts[1:]))
+    return sorted(words)
+
+def synthetic_queries(words):
+    """Queries typed into the fuzzy matcher: whole words, the initials of
+    their parts, a word with its vowels left out, and no match at all"""
+    rng = random.Random(len(words))
+    queries = ['zqzq']
+    for word in rng.sample(words, min(len(words), 4)):
+        parts = re.findall(r'[a-z]+|[A-Z][a-z]*', word)
+        queries.append(word)
+        queries.append(''.join(part[0] for part in parts) + parts[-1][1:3])
+        queries.append(re.sub('[aeiou]', '', word.lower()))
+    return queries
+
+def register_language(words):
+    """A language of the vocabulary words; returns it and a file name"""
+    extension = f'.bench{len(words)}'
+    language = code_editor.Language(f'Bench {len(words)}', [extension],
+                                    vocabulary=lambda: words)
+    code_editor.LANGUAGES_BY_EXTENSION[extension] = language
+    return language, f'file{extension}'
+
+def time_tab(file_name):
+    start = time.perf_counter()
+    editor = code_editor.GlassmorphicCodeEditor(None, file_name)
+    editor.setPlainText(SOURCE)
+    seconds = time.perf_counter() - start
+    return seconds, editor
+
+def wait(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec()
+
+def time_typing(editor, queries):
+    """Type each query on a line of its own; returns the seconds each
+    key took to handle and the editor's keystroke to popup latencies"""
+    editor.show()
+    keypresses = []
+    for query in queries:
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        editor.setTextCursor(cursor)
+        editor.insertPlainText('\n')
+        for char in query:
+            start = time.perf_counter()
+            QTest.keyClicks(editor, char)
+            keypresses.append(time.perf_counter() - start)
+            wait(TYPING_MS)
+        wait(editor.COMPLETION_DELAY + 200)
+    editor.hide()
+    return keypresses, list(editor.completion_latency)
+
+def measure(size):
+    words = synthetic_words(size)
+    language, file_name = register_language(words)
+    first_tab, editor = time_tab(file_name)
+    editors = [editor]
+    tabs = []
+    for _ in range(TABS):
+        seconds, editor = time_tab(file_name)
+        tabs.append(seconds)
+        editors.append(editor)
+
+    start = time.perf_counter()
+    language.vocabulary()
+    vocabulary = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = language.vocabulary().matcher()
+    fuzzy_build = time.perf_counter() - start
+
+    # The ranking a CompletionThread does, timed without the thread
+    complete = []
+    position = editor.textCursor().position()
+    for prefix in PREFIXES:
+        start = time.perf_counter()
+        snapshot = editor.identifiers.snapshot(prefix, position)
+        snapshot.rank(language.vocabulary(), editor.MAX_COMPLETIONS, editor.project_symbols())
+        editor.identifiers.rematched(snapshot)
+        complete.append(time.perf_counter() - start)
+
+    keystrokes = []
+    for query in synthetic_queries(words):
+        # The editor completes from two characters on
+        for end in range(2, len(query) + 1):
+            start = time.perf_counter()
+            matcher.match(query[:end], editor.MAX_COMPLETIONS)
+            keystrokes.append(time.perf_counter() - start)
+
+    queries = [query for query in synthetic_queries(words) if query.isidentifier()]
+    keypresses, popups = time_typing(editor, queries[:TYPED_QUERIES])
+
+    for editor in editors:
+        editor.deleteLater()
+    app.processEvents()
+    return {
+        'first_tab_seconds': round(first_tab, 6),
+        'tab_median_seconds': round(statistics.median(tabs), 6),
+        'tab_max_seconds': round(max(tabs), 6),
+        'vocabulary_seconds': round(vocabulary, 6),
+        'complete_max_seconds': round(max(complete), 6),
+        'fuzzy_build_seconds': round(fuzzy_build, 6),
+        'fuzzy_keystroke_median_seconds': round(statistics.median(keystrokes), 6),
+        'fuzzy_keystroke_max_seconds': round(max(keystrokes), 6),
+        'keypress_median_seconds': round(statistics.median(keypresses), 6),
+        'keypress_max_seconds': round(max(keypresses), 6),
+        'popup_median_seconds': round(statistics.median(popups), 6) if popups else None,
+        'popup_max_seconds': round(max(popups), 6) if popups else None,
+    }
+
+def run_benchmarks(sizes):
+    results = []
+    for size in sizes:
+        result = {'vocabulary': size}
+        result.update(measure(size))
+        results.append(result)
+        print(f"{size:>7} words  tab {result['tab_median_seconds'] * 1e3:7.3f} ms  "
+              f"vocabulary {result['vocabulary_seconds'] * 1e3:8.3f} ms  "
+              f"keystroke {result['fuzzy_keystroke_max_seconds'] * 1e3:6.3f} ms  "
+              f"keypress {result['keypress_max_seconds'] * 1e3:6.3f} ms", file=sys.stderr)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('-o', '--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': sys.version.split()[0],
+        'pyside': PySide6.__version__,
+        'results': run_benchmarks(args.sizes),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Headless micro-benchmarks for the syntax highlighters.
+
+Generates synthetic Python, C++ and Java files and times, per language
+and size:
+
+- full: highlighting the whole document
+- edit_top / edit_middle / edit_end: a single-character edit
+- paste: pasting 5k lines into the middle of the document
+
+Each scenario reports its wall time, the time spent in highlightBlock,
+the number of blocks highlighted, ns per highlighted block and the peak
+Python memory (tracemalloc) as JSON:
+
+    python benchmarks/bench_highlighters.py
+    python benchmarks/bench_highlighters.py --sizes 1000 10000 -o bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PySide6
+from PySide6.QtWidgets import QApplication, QPlainTextEdit
+from PySide6.QtGui import QTextCursor
+
+# code_editor needs a QApplication at import time
+app = QApplication.instance() or QApplication(sys.argv[:1])
+
+import code_editor
+
+SIZES = (1000, 10000, 100000)
+PASTE_LINES = 5000
+
+# One "unit" of each synthetic file; units are repeated up to the size,
+# covering keywords, builtins, strings, comments, numbers and the
+# multi-line constructs of each language
+CORPORA = {
+    'python': [
+        'class Shape{n}(object):',
+        '    """Docstring of shape {n}',
+        '    spanning several lines"""',
+        '',
+        '    @property',
+        '    def area(self, scale=1.5):',
+        "        name = 'shape-{n}'  # single-quoted",
+        '        return len([x * scale for x in range({n})])',
+        '',
+        'value_{n} = {{"key": "value", "count": {n}}}',
+    ],
+    'cpp': [
+        '#include <vector>',
+        '/* Block comment for widget {n}',
+        '   spanning several lines */',
+        'class Widget{n} : public Base {{',
+        'public:',
+        '    virtual int size() const {{ return {n}; }}  // line comment',
+        '    static constexpr double scale = 1.5;',
+        '    std::vector<int> items{{1, 2, 3}};',
+        '    const char *name = "widget-{n}";',
+        '}};',
+    ],
+    'java': [
+        'package com.example.bench;',
+        '/* Block comment for service {n}',
+        '   spanning several lines */',
+        '@Deprecated',
+        'public class Service{n} extends Base implements Runnable {{',
+        '    private static final int COUNT = {n};',
+        '    public void run() {{  // line comment',
+        '        String name = "service-{n}";',
+        '        for (int i = 0; i < COUNT; i++) {{ total += i * 2; }}',
+        '    }}',
+    ],
+}
+
+HIGHLIGHTERS = {
+    'python': code_editor.PythonHighlighter,
+    'cpp': code_editor.CppHighlighter,
+    'java': code_editor.JavaHighlighter,
+}
+
+def synthetic_text(language, lines):
+    """Return `lines` lines of synthetic source for language"""
+    unit = CORPORA[language]
+    return '\n'.join(unit[i % len(unit)].format(n=i // len(unit)) for i in range(lines))
+
+def counting_highlighter(highlighter_class):
+    """Subclass that counts and times highlightBlock calls"""
+    class CountingHighlighter(highlighter_class):
+        blocks = 0
+        seconds = 0.0
+
+        def highlightBlock(self, text):
+            start = time.perf_counter()
+            super().highlightBlock(text)
+            CountingHighlighter.seconds += time.perf_counter() - start
+            CountingHighlighter.blocks += 1
+
+    # Share the compiled rules and formats with the real class
+    CountingHighlighter._compiled_rules = highlighter_class.compiled_rules()
+    CountingHighlighter._shared_formats = highlighter_class.shared_formats()
+    return CountingHighlighter
+
+def make_document(language, lines):
+    # A bare QTextDocument has no layout and never reports edits to its
+    # highlighter, so the document comes from a (hidden) editor
+    editor = QPlainTextEdit()
+    editor.setPlainText(synthetic_text(language, lines))
+    document = editor.document()
+    highlighter = counting_highlighter(HIGHLIGHTERS[language])(document)
+    return document, highlighter, editor
+
+def edit_at(document, position):
+    cursor = QTextCursor(document)
+    cursor.setPosition(position)
+    cursor.insertText('x')
+
+def scenarios(language, lines):
+    """Yield (name, setup, run); run(state) is the timed part"""
+    def full_setup():
+        return make_document(language, lines)
+
+    def full_run(state):
+        state[1].rehighlight()
+
+    def highlighted_setup():
+        state = make_document(language, lines)
+        # Let QSyntaxHighlighter run its delayed first pass; until it has,
+        # it ignores edits
+        app.processEvents()
+        return state
+
+    def block_position(document, fraction):
+        block = document.findBlockByNumber(int((document.blockCount() - 1) * fraction))
+        return block.position()
+
+    paste_text = synthetic_text(language, PASTE_LINES)
+
+    yield 'full', full_setup, full_run
+    yield 'edit_top', highlighted_setup, lambda state: edit_at(state[0], 0)
+    yield ('edit_middle', highlighted_setup,
+           lambda state: edit_at(state[0], block_position(state[0], 0.5)))
+    yield ('edit_end', highlighted_setup,
+           lambda state: edit_at(state[0], state[0].characterCount() - 1))
+
+    def paste_run(state):
+        cursor = QTextCursor(state[0])
+        cursor.setPosition(block_position(state[0], 0.5))
+        cursor.insertText(paste_text + '\n')
+
+    yield 'paste', highlighted_setup, paste_run
+
+def measure(setup, run):
+    """Time run() on a fresh setup, then measure its peak memory on another"""
+    state = setup()
+    highlighter_class = type(state[1])
+    highlighter_class.blocks = 0
+    highlighter_class.seconds = 0.0
+    start = time.perf_counter()
+    run(state)
+    seconds = time.perf_counter() - start
+    blocks = highlighter_class.blocks
+    highlight_seconds = highlighter_class.seconds
+    del state
+
+    state = setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del state
+
+    return {
+        'seconds': round(seconds, 6),
+        'highlight_seconds': round(highlight_seconds, 6),
+        'blocks': blocks,
+        'ns_per_block': round(highlight_seconds * 1e9 / blocks) if blocks else None,
+        'peak_bytes': peak,
+    }
+
+def run_benchmarks(languages, sizes):
+    results = []
+    for language in languages:
+        for lines in sizes:
+            for name, setup, run in scenarios(language, lines):
+                result = {'language': language, 'lines': lines, 'scenario': name}
+                result.update(measure(setup, run))
+                results.append(result)
+                print(f"{language:>6} {lines:>7} {name:<12} "
+                      f"{result['ns_per_block'] or 0:>8} ns/block", file=sys.stderr)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--languages', nargs='+', choices=sorted(CORPORA),
+                        default=sorted(CORPORA))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('-o', '--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': sys.version.split()[0],
+        'pyside': PySide6.__version__,
+        'results': run_benchmarks(args.languages, args.sizes),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
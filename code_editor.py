@@ -9,14 +9,17 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                               QListWidget, QTreeWidget, QTreeWidgetItem, QToolTip,
                               QSplashScreen, QGraphicsOpacityEffect, QScrollArea,
                               QGridLayout, QTextEdit, QFrame, QProgressDialog,
-                              QListWidgetItem, QGroupBox, QStackedWidget, QTabBar)  # Added QTabBar here
+                              QListWidgetItem, QGroupBox, QStackedWidget, QTabBar,  # Added QTabBar here
+                              QAbstractScrollArea, QProgressBar)
 from PySide6.QtCore import (Qt, QRect, QDir, QSize, QProcess, QRegularExpression,
                            QStringListModel, QTimer, QPropertyAnimation, QUrl,  # Added QPropertyAnimation here
-                           QEasingCurve, QThread, QObject, Signal)  # Added QThread and QObject here
+                           QEasingCurve, QThread, QObject, Signal,  # Added QThread and QObject here
+                           QRectF, QPointF, QPoint, QFileSystemWatcher, QEvent)
 from PySide6.QtGui import (QColor, QPalette, QTextCharFormat, QSyntaxHighlighter,
                           QFont, QPainter, QBrush, QAction, QIcon, QKeySequence, 
                           QTextCursor, QShortcut, QTextDocument, QPixmap, QPen,
-                          QLinearGradient, QTextFormat, QCursor, QFontMetricsF)  # Added QFontMetricsF here
+                          QLinearGradient, QTextFormat, QCursor, QFontMetricsF,  # Added QFontMetricsF here
+                          QTextLayout, QImage, QPolygonF)
 import qdarkstyle
 import subprocess
 import json
@@ -24,7 +27,32 @@ import platform
 import keyword
 import builtins
 import re
+import ast
 import time
+import hashlib
+import threading
+import mmap
+import bisect
+import heapq
+import codecs
+import shutil
+import tempfile
+import fnmatch
+import multiprocessing
+import concurrent.futures
+import functools
+import struct
+import queue
+import zlib
+import abc
+import sqlite3
+import uuid
+from collections import deque, Counter
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+from array import array
 from pathlib import Path
 
 # Add these color constants at the top of the file
@@ -39,6 +67,9 @@ EDITOR_COLORS = {
     'operators': '#FF79C6',
     'class_names': '#8BE9FD',
     'decorators': '#FFB86C',
+    'parameters': '#FFB86C',
+    'attributes': '#9AEDFE',
+    'imports': '#69FF94',
     'constants': '#BD93F9',
     'selection_bg': '#44475A',
     'current_line': '#283593',
@@ -297,72 +328,730 @@ class FileSystemHelper:
         return None
 
 # Add language-specific syntax highlighters
-class BaseHighlighter(QSyntaxHighlighter):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.highlighting_rules = []
+class HighlightRules:
+    """Compiled rule set shared by every highlighter of one language.
+
+    All token patterns are merged into a single alternation so a block is
+    scanned once, and identifiers are resolved with a dict lookup instead
+    of one regex per keyword/builtin.
+
+    Constructs that can span lines (triple-quoted strings, block comments)
+    are described as (format_name, open_pattern, close_pattern). A block
+    that ends inside one reports state ``index + 1`` so the next block
+    resumes there; state 0 means "outside any construct".
+    """
+
+    def __init__(self, token_patterns, words, multiline_patterns=()):
+        parts = [f"(?P<ml{i}>{opener})"
+                 for i, (_, opener, _) in enumerate(multiline_patterns)]
+        parts += [f"(?P<{name}>{pattern})" for name, pattern in token_patterns]
+        parts.append(r"(?P<number>\b\d+\b)")
+        parts.append(r"(?P<word>\w+)")
+        self.pattern = re.compile("|".join(parts))
+        self.words = words
+        # Close patterns are matched anchored, so they include the body
+        self.multiline = [(name, re.compile(closer))
+                          for name, _, closer in multiline_patterns]
+        # Stable small ids for every format name, used by compact span arrays
+        names = [name for name, _ in token_patterns]
+        names += [name for name, _, _ in multiline_patterns]
+        names += ['number', *words.values()]
+        self.format_names = tuple(dict.fromkeys(names))
+        self.format_ids = {name: i for i, name in enumerate(self.format_names)}
+
+    def tokenize(self, text, state=0):
+        """Return ([(start, length, format_name), ...], end_state) for a line"""
+        tokens = []
+        pos = 0
+        length = len(text)
+        if state:
+            name, closer = self.multiline[state - 1]
+            match = closer.match(text)
+            if match is None:
+                if length:
+                    tokens.append((0, length, name))
+                return tokens, state
+            pos = match.end()
+            tokens.append((0, pos, name))
+
+        words = self.words
+        search = self.pattern.search
+        while True:
+            match = search(text, pos)
+            if match is None:
+                return tokens, 0
+            kind = match.lastgroup
+            start, pos = match.span()
+            if kind == 'word':
+                kind = words.get(match.group())
+                if kind is None:
+                    continue
+            elif kind.startswith('ml'):
+                index = int(kind[2:])
+                kind, closer = self.multiline[index]
+                close = closer.match(text, pos)
+                if close is None:
+                    tokens.append((start, length - start, kind))
+                    return tokens, index + 1
+                pos = close.end()
+            tokens.append((start, pos - start, kind))
+
+    def block_spans(self, text, state=0):
+        """Like tokenize(), but as a flat array of (start, length, format_id)
+        triples in UTF-16 units, ready for QSyntaxHighlighter.setFormat"""
+        tokens, state = self.tokenize(text, state)
+        format_ids = self.format_ids
+        offsets = utf16_offsets(text)
+        spans = array('I')
+        for start, length, kind in tokens:
+            if offsets is not None:
+                start, length = offsets[start], offsets[start + length] - offsets[start]
+            spans.extend((start, length, format_ids[kind]))
+        return spans, state
+
+def utf16_offsets(text):
+    """Map str indices to QString (UTF-16) positions, or None if they match"""
+    if text.isascii() or max(text) <= '\uffff':
+        return None
+    offsets = [0]
+    for char in text:
+        offsets.append(offsets[-1] + (2 if char > '\uffff' else 1))
+    return offsets
+
+class SemanticAnalyzer:
+    """Classify Python names with `ast` for the semantic highlighting pass.
+
+    The source is split at top-level statements and every chunk is parsed
+    on its own, with its analysis cached by a hash of its text. After an
+    edit only the changed chunk is parsed again, and each ast.parse call,
+    which holds the GIL, stays short. Names a chunk cannot resolve in its
+    own scopes are looked up in the module-level definitions of all chunks.
+
+    analyze() returns ({line: array of (start, length, kind_id) triples in
+    UTF-16 units}, [(first_line, end_line), ...]) where the second item
+    lists chunks that do not parse; their old overlay should be kept.
+    """
+    KINDS = ('class', 'function', 'parameter', 'local', 'attribute', 'imported')
+    # A top-level statement starts at column 0, unless it continues the
+    # previous one
+    STATEMENT_START = re.compile(r'(?!(?:else|elif|except|finally)\b)[A-Za-z_@]')
+    # Errors of a chunk that was cut too early, e.g. inside brackets
+    INCOMPLETE = ('was never closed', 'unterminated', 'unexpected EOF', 'expected an indented block')
+    MAX_MERGES = 8
+    CACHE_SIZE = 4096
+
+    cache = {}  # Chunk hash -> (definitions, tokens, unresolved), shared
+    cache_lock = threading.Lock()
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.kind_ids = {kind: i for i, kind in enumerate(self.KINDS)}
+        self.last_error = None
+
+    def chunk_bounds(self, lines):
+        """Line numbers where top-level statements start"""
+        bounds = [0]
+        state = 0
+        tokenize = self.rules.tokenize
+        for number, line in enumerate(lines):
+            if (number and not state and self.STATEMENT_START.match(line)
+                    and not lines[number - 1].startswith('@')
+                    and not lines[number - 1].endswith('\\')):
+                bounds.append(number)
+            # Only a triple quote can open or close a multi-line string
+            if '"""' in line or "'''" in line:
+                state = tokenize(line, state)[1]
+        bounds.append(len(lines))
+        return bounds
+
+    def analyze(self, lines, cancelled=lambda: False):
+        bounds = self.chunk_bounds(lines)
+        chunks = []
+        broken = []
+        index = 0
+        while index < len(bounds) - 1:
+            if cancelled():
+                return None
+            # Hand the GIL back between chunks
+            time.sleep(0)
+            first = bounds[index]
+            for merges in range(self.MAX_MERGES + 1):
+                end = bounds[min(index + 1 + merges, len(bounds) - 1)]
+                result = self.analyze_chunk(lines, first, end)
+                if result is not None or end == len(lines):
+                    break
+                if not isinstance(self.last_error, SyntaxError) or not any(
+                        text in str(self.last_error.msg) for text in self.INCOMPLETE):
+                    break
+            index += 1 + merges
+            if result is None:
+                broken.append((first, end))
+            else:
+                chunks.append((first, result))
+
+        # Resolve module-level names across chunks
+        definitions = {}
+        for _, (chunk_definitions, _, _) in chunks:
+            definitions.update(chunk_definitions)
+        kind_ids = self.kind_ids
+        lines_tokens = {}
+        for first, (_, tokens, unresolved) in chunks:
+            for line, start, length, kind in tokens:
+                lines_tokens.setdefault(first + line, []).append((start, length, kind))
+            for line, start, length, name in unresolved:
+                kind = definitions.get(name)
+                if kind is not None:
+                    lines_tokens.setdefault(first + line, []).append(
+                        (start, length, kind_ids[kind]))
+        spans = {}
+        for line, tokens in lines_tokens.items():
+            tokens.sort()
+            spans[line] = array('I', [value for token in tokens for value in token])
+        return spans, broken
+
+    def analyze_chunk(self, lines, first, end):
+        """Return the cached or fresh analysis of lines[first:end], or None"""
+        text = '\n'.join(lines[first:end])
+        key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        with self.cache_lock:
+            result = self.cache.pop(key, None)
+        if result is None:
+            try:
+                tree = ast.parse(text)
+                result = ChunkVisitor(lines[first:end], self.kind_ids).analyze(tree)
+            except (SyntaxError, ValueError, RecursionError) as e:
+                self.last_error = e
+                return None
+        with self.cache_lock:
+            if len(self.cache) >= self.CACHE_SIZE:
+                del self.cache[next(iter(self.cache))]
+            self.cache[key] = result  # Most recently used last
+        return result
+
+class ChunkVisitor(ast.NodeVisitor):
+    """Collect semantic tokens of one chunk; positions are chunk-relative"""
+
+    def __init__(self, lines, kind_ids):
+        self.lines = lines
+        self.kind_ids = kind_ids
+        self.scopes = []  # Function scopes map name -> kind; None for classes
+        self.definitions = {}
+        self.tokens = []
+        self.unresolved = []
+
+    def analyze(self, tree):
+        self.visit(tree)
+        return self.definitions, self.tokens, self.unresolved
+
+    def position(self, lineno, col_offset, length):
+        """Convert an ast (1-based line, UTF-8 column) to (line, start, length) in UTF-16"""
+        line = lineno - 1
+        text = self.lines[line] if line < len(self.lines) else ''
+        if not text.isascii():
+            col_offset = len(text.encode('utf-8', 'surrogatepass')[:col_offset].decode('utf-8', 'ignore'))
+            offsets = utf16_offsets(text)
+            if offsets is not None and col_offset + length < len(offsets):
+                start = offsets[col_offset]
+                return line, start, offsets[col_offset + length] - start
+        return line, col_offset, length
+
+    def add(self, lineno, col_offset, name, kind):
+        line, start, length = self.position(lineno, col_offset, len(name))
+        self.tokens.append((line, start, length, self.kind_ids[kind]))
+
+    def define(self, name, kind):
+        if not self.scopes:
+            self.definitions[name] = kind
+        elif self.scopes[-1] is not None:
+            self.scopes[-1][name] = kind
+
+    def add_name_after(self, node, keyword, name, kind):
+        """Token for the name that follows `keyword` in a def/class/import line"""
+        line = self.lines[node.lineno - 1] if node.lineno <= len(self.lines) else ''
+        col = len(line.encode('utf-8', 'surrogatepass')[:node.col_offset].decode('utf-8', 'ignore'))
+        match = re.compile(keyword + r'\s+' + re.escape(name) + r'\b').search(line, col)
+        if match:
+            byte_col = len(line[:match.end() - len(name)].encode('utf-8', 'surrogatepass'))
+            self.add(node.lineno, byte_col, name, kind)
+
+    def local_names(self, body):
+        """Names bound in a function body, not descending into nested scopes"""
+        names = {}
+        declared = set()
+        stack = list(body)
+        while stack:
+            node = stack.pop()
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                names[node.name] = 'function'
+                stack.extend(node.decorator_list)
+                continue
+            if isinstance(node, ast.ClassDef):
+                names[node.name] = 'class'
+                stack.extend(node.decorator_list)
+                stack.extend(node.bases)
+                continue
+            if isinstance(node, ast.Lambda):
+                continue
+            if isinstance(node, (ast.Global, ast.Nonlocal)):
+                declared.update(node.names)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                names.setdefault(node.id, 'local')
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    names[alias.asname or alias.name.split('.')[0]] = 'imported'
+            stack.extend(ast.iter_child_nodes(node))
+        for name in declared:
+            names.pop(name, None)
+        return names
+
+    def visit_ClassDef(self, node):
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+        self.add_name_after(node, 'class', node.name, 'class')
+        self.define(node.name, 'class')
+        self.scopes.append(None)
+        for child in node.body:
+            self.visit(child)
+        self.scopes.pop()
+
+    def visit_FunctionDef(self, node):
+        for child in node.decorator_list:
+            self.visit(child)
+        self.add_name_after(node, 'def', node.name, 'function')
+        self.define(node.name, 'function')
+        self.visit_function(node.args, node.body, node.returns)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self.visit_function(node.args, [node.body])
+
+    def visit_function(self, args, body, returns=None):
+        for child in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(child)
+        if returns is not None:
+            self.visit(returns)
+        scope = self.local_names(body)
+        params = args.posonlyargs + args.args + args.kwonlyargs
+        params += [arg for arg in (args.vararg, args.kwarg) if arg is not None]
+        for arg in params:
+            scope[arg.arg] = 'parameter'
+            self.add(arg.lineno, arg.col_offset, arg.arg, 'parameter')
+            if arg.annotation is not None:
+                self.visit(arg.annotation)
+        self.scopes.append(scope)
+        for child in body:
+            self.visit(child)
+        self.scopes.pop()
+
+    def visit_Name(self, node):
+        # Class bodies are invisible to the functions nested in them
+        for scope in reversed(self.scopes):
+            if scope is not None and node.id in scope:
+                self.add(node.lineno, node.col_offset, node.id, scope[node.id])
+                return
+        line, start, length = self.position(node.lineno, node.col_offset, len(node.id))
+        self.unresolved.append((line, start, length, node.id))
+
+    def visit_Attribute(self, node):
+        self.visit(node.value)
+        if node.end_lineno is not None:
+            self.add(node.end_lineno, node.end_col_offset - len(node.attr.encode('utf-8', 'surrogatepass')),
+                     node.attr, 'attribute')
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                continue
+            if alias.asname:
+                self.add_name_after(alias, 'as', alias.asname, 'imported')
+                self.define(alias.asname, 'imported')
+            else:
+                name = alias.name.split('.')[0]
+                self.add(alias.lineno, alias.col_offset, name, 'imported')
+                self.define(name, 'imported')
 
-    def highlightBlock(self, text):
-        for pattern, format in self.highlighting_rules:
-            expression = QRegularExpression(pattern)
-            matches = expression.globalMatch(text)
-            while matches.hasNext():
-                match = matches.next()
-                self.setFormat(match.capturedStart(), match.capturedLength(), format)
+    visit_ImportFrom = visit_Import
 
-class PythonHighlighter(BaseHighlighter):
-    def __init__(self, parent=None):
+class DocumentSnapshot(QObject):
+    """Copy the text of a document for a worker, in GUI-thread slices.
+
+    toPlainText() stalls the GUI for seconds on a document of millions
+    of lines, so the text is copied PIECE_CHARS at a time, for at most
+    SLICE seconds per pass of the event loop. ``ready`` gets the pieces,
+    in which blocks are separated by U+2029; split_lines() turns them
+    into lines on the worker. Set ``cancelled`` when the text changes.
+    """
+    ready = Signal(object)
+
+    PIECE_CHARS = 1 << 19
+    SLICE = 0.008
+
+    def __init__(self, document, parent=None):
         super().__init__(parent)
-        
-        # Python-specific formats
-        self.init_formats()
-        
-        # Add Python-specific rules
-        self.add_python_rules()
-        
-        # Add common rules (strings, numbers, etc.)
-        self.add_common_rules()
+        self.document = document
+        self.cancelled = False
+        self.pieces = []
+        self.position = 0
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.take_slice)
+
+    def start(self):
+        # Small documents are copied right away
+        self.take_slice()
+        if self.pieces is not None and not self.cancelled:
+            self.timer.start()
+
+    def take_slice(self):
+        if self.cancelled:
+            self.timer.stop()
+            self.deleteLater()
+            return
+        end_of_text = self.document.characterCount() - 1
+        deadline = time.perf_counter() + self.SLICE
+        cursor = QTextCursor(self.document)
+        while self.position < end_of_text and time.perf_counter() < deadline:
+            end = min(self.position + self.PIECE_CHARS, end_of_text)
+            cursor.setPosition(self.position)
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+            self.pieces.append(cursor.selectedText())
+            self.position = end
+        if self.position >= end_of_text:
+            self.timer.stop()
+            pieces, self.pieces = self.pieces, None
+            self.ready.emit(pieces)
+            self.deleteLater()
 
-    def init_formats(self):
-        # Keywords
-        self.keyword_format = QTextCharFormat()
-        self.keyword_format.setForeground(QColor(EDITOR_COLORS['keywords']))
-        self.keyword_format.setFontWeight(QFont.Bold)
-        
-        # Built-ins
-        self.builtin_format = QTextCharFormat()
-        self.builtin_format.setForeground(QColor("#66D9EF"))
-        
-        # Decorators
-        self.decorator_format = QTextCharFormat()
-        self.decorator_format.setForeground(QColor(EDITOR_COLORS['decorators']))
-
-    def add_python_rules(self):
-        import builtins as py_builtins  # Import builtins properly
-        
-        # Python keywords
-        keywords = [
-            "and", "as", "assert", "break", "class", "continue", "def",
-            "del", "elif", "else", "except", "False", "finally", "for",
-            "from", "global", "if", "import", "in", "is", "lambda", "None",
-            "nonlocal", "not", "or", "pass", "raise", "return", "True",
-            "try", "while", "with", "yield"
-        ]
-        for word in keywords:
-            pattern = f"\\b{word}\\b"
-            self.highlighting_rules.append((pattern, self.keyword_format))
-            
-        # Python built-ins
-        builtin_funcs = dir(py_builtins)  # Use the imported builtins
-        for word in builtin_funcs:
-            if not word.startswith('_'):  # Skip private builtins
-                pattern = f"\\b{word}\\b"
-                self.highlighting_rules.append((pattern, self.builtin_format))
-            
-        # Decorators
-        self.highlighting_rules.append((r"@\w+", self.decorator_format))
+    @staticmethod
+    def split_lines(pieces):
+        """Block texts of a snapshot; releases the GIL between pieces"""
+        lines = ['']
+        while pieces:
+            parts = pieces.pop(0).split('\u2029')
+            lines[-1] += parts[0]
+            lines.extend(parts[1:])
+            time.sleep(0)
+        return lines
+
+class WorkerThread(QThread):
+    """QThread that keeps its Python wrapper alive until it has finished"""
+    running = set()
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = False
+        self.finished.connect(self.release)
+
+    def start(self):
+        WorkerThread.running.add(self)
+        super().start()
+
+    def release(self):
+        self.wait()
+        WorkerThread.running.discard(self)
+
+class TokenizerThread(WorkerThread):
+    """Tokenize a snapshot of a document off the GUI thread.
+
+    Results are emitted as (revision, first_block, [(spans, state), ...])
+    where spans is a flat array of (start, length, format_id) triples in
+    UTF-16 units. The visible range is emitted first; everything else
+    follows in batches. Set ``cancelled`` to stop a job that went stale.
+    """
+    spans_ready = Signal(int, int, object)
+    done = Signal(int)
+
+    BATCH_SIZE = 2000
+    YIELD_EVERY = 32
+
+    def __init__(self, rules, pieces, revision, visible_blocks):
+        super().__init__()
+        self.rules = rules
+        self.pieces = pieces
+        self.revision = revision
+        self.visible_blocks = visible_blocks
+
+    def run(self):
+        self.lines = DocumentSnapshot.split_lines(self.pieces)
+        block_spans = self.rules.block_spans
+        first_visible, last_visible = self.visible_blocks
+        last_visible = min(last_visible, len(self.lines) - 1)
+        results = []
+        emitted = 0
+        state = 0
+        for number, line in enumerate(self.lines):
+            if not number % self.YIELD_EVERY:
+                if self.cancelled:
+                    return
+                # Hand the GIL back so the GUI thread never queues behind us
+                time.sleep(0)
+            spans, state = block_spans(line, state)
+            results.append((spans, state))
+
+            if number == last_visible:
+                # Visible blocks first, then whatever preceded them
+                first = min(first_visible, number)
+                self.spans_ready.emit(self.revision, first, results[first:])
+                if first:
+                    self.spans_ready.emit(self.revision, 0, results[:first])
+                emitted = number + 1
+            elif number > last_visible and number + 1 - emitted >= self.BATCH_SIZE:
+                self.spans_ready.emit(self.revision, emitted, results[emitted:])
+                emitted = number + 1
+
+        if emitted < len(results):
+            self.spans_ready.emit(self.revision, emitted, results[emitted:])
+        self.done.emit(self.revision)
+
+class SemanticThread(WorkerThread):
+    """Run a SemanticAnalyzer over a snapshot of a document"""
+    tokens_ready = Signal(int, object)
+
+    def __init__(self, analyzer, pieces, revision):
+        super().__init__()
+        self.analyzer = analyzer
+        self.pieces = pieces
+        self.revision = revision
+
+    def run(self):
+        lines = DocumentSnapshot.split_lines(self.pieces)
+        result = self.analyzer.analyze(lines, lambda: self.cancelled)
+        if result is not None and not self.cancelled:
+            self.tokens_ready.emit(self.revision, result)
+
+# Byte order marks that are written back by save_text(), for the codecs
+# that do not write one of their own
+BYTE_ORDER_MARKS = {'utf-16-le': codecs.BOM_UTF16_LE, 'utf-16-be': codecs.BOM_UTF16_BE}
+
+class FileLoaderThread(WorkerThread):
+    """Read and decode a text file in chunks off the GUI thread.
+
+    Emits the decoded text chunk by chunk with universal newlines, then
+    ``done`` with the encoding used and the file's line break, or
+    ``failed`` with an error message.
+    At most CHUNKS_AHEAD chunks are emitted before the receiver calls
+    consumed(), so reading never gets far ahead of the GUI.
+
+    Text is decoded strictly: replacement characters would be saved in
+    place of the bytes they stand for. Only a sample of the file picks
+    the encoding, so when a later part does not decode, ``restarted``
+    tells the receiver to throw the chunks so far away, and the file is
+    read again as Latin-1, which keeps every byte.
+    """
+    chunk_ready = Signal(str)
+    progress = Signal(int, int)
+    restarted = Signal()
+    done = Signal(str, str)
+    failed = Signal(str)
+
+    CHUNK_CHARS = 1 << 18
+    CHUNKS_AHEAD = 4
+    SAMPLE_BYTES = 1 << 16
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+        self.credits = threading.Semaphore(self.CHUNKS_AHEAD)
+
+    def consumed(self):
+        """Called by the receiver once it is done with a chunk"""
+        self.credits.release()
+
+    def run(self):
+        try:
+            encoding = self.detect_encoding(self.file_path)
+            try:
+                newline = self.read_text(encoding)
+            except UnicodeDecodeError:
+                encoding = 'latin-1'
+                self.credits = threading.Semaphore(self.CHUNKS_AHEAD)
+                self.restarted.emit()
+                newline = self.read_text(encoding)
+        except OSError as e:
+            self.failed.emit(str(e))
+            return
+        if not self.cancelled:
+            self.done.emit(encoding, newline)
+
+    def read_text(self, encoding):
+        """Emit the text of the file as chunks; returns its line break"""
+        total = os.path.getsize(self.file_path)
+        with open(self.file_path, 'r', encoding=encoding) as f:
+            first = True
+            while not self.cancelled:
+                if not self.credits.acquire(timeout=0.1):
+                    continue
+                text = f.read(self.CHUNK_CHARS)
+                if not text:
+                    break
+                if first and encoding in BYTE_ORDER_MARKS and text.startswith('\ufeff'):
+                    # These codecs keep the byte order mark as text
+                    text = text[1:]
+                first = False
+                if not text:
+                    self.credits.release()
+                    continue
+                self.chunk_ready.emit(text)
+                self.progress.emit(f.buffer.tell(), total)
+            return self.file_newline(f.newlines)
+
+    @staticmethod
+    def file_newline(newlines):
+        """The line break to save a file with, from the newlines attribute
+        of the file read; files that mix them are saved with CRLF if it
+        is one of them"""
+        if isinstance(newlines, str):
+            return newlines
+        return '\r\n' if newlines and '\r\n' in newlines else '\n'
+
+    @classmethod
+    def detect_encoding(cls, file_path):
+        """Encoding from the BOM, else UTF-8 if the start of the file
+        decodes as UTF-8, else Latin-1"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(cls.SAMPLE_BYTES)
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        for encoding, bom in BYTE_ORDER_MARKS.items():
+            if sample.startswith(bom):
+                return encoding
+        try:
+            sample.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A character cut in two by the end of the sample is fine
+            if len(sample) < cls.SAMPLE_BYTES or e.start < len(sample) - 3:
+                return 'latin-1'
+        return 'utf-8'
+
+class BaseHighlighter(QSyntaxHighlighter):
+    # Subclasses describe their language declaratively; the rules are
+    # compiled once per class and shared by all of its instances.
+    KEYWORDS = ()
+    BUILTINS = ()
+    TOKEN_PATTERNS = ()
+    MULTILINE_PATTERNS = ()
+
+    # In threaded mode, at most this many blocks per edit are tokenized
+    # on the GUI thread; the rest is left to a TokenizerThread
+    SYNC_BLOCK_BUDGET = 200
+    # Blocks above and below the viewport highlighted along with it
+    VIEWPORT_MARGIN = 50
+    # GUI time one idle fill slice may take, in seconds
+    FILL_SLICE = 0.008
+    # Set by languages that support the semantic pass
+    SEMANTIC_ANALYZER = None
+    # Typing pause, in milliseconds, before the semantic pass runs
+    SEMANTIC_DELAY = 500
+
+    def __init__(self, parent=None, threaded=False, lazy_threshold=0, semantic=False):
+        # A document that starts out above lazy_threshold is never attached:
+        # detaching it again would clear the formats of, and so create a
+        # layout for, every one of its blocks
+        born_detached = bool(lazy_threshold and isinstance(parent, QTextDocument)
+                             and parent.blockCount() > lazy_threshold)
+        super().__init__(None if born_detached else parent)
+        self.formats = self.shared_formats()
+        self.rules = self.compiled_rules()
+        self.format_table = [self.formats[name] for name in self.rules.format_names]
+
+        # Threaded mode: a worker fills block_cache with (spans, state) per
+        # block. Lazy mode: documents above lazy_threshold blocks are
+        # detached from QSyntaxHighlighter, so loading them costs nothing
+        # per block. In both, pending blocks are applied viewport first and
+        # the rest of the document is filled in during idle time.
+        self.threaded = threaded
+        self.lazy_threshold = lazy_threshold
+        self.detached = False
+        self.text_document = parent if born_detached else self.document()
+        self.visible_blocks = (0, 100)
+        self.revision = 0
+        self.sync_budget = self.SYNC_BLOCK_BUDGET
+        self.stale = False
+        self.worker = None
+        self.block_cache = []
+        self.pending = bytearray()
+        self.applying = False
+        self.dirty_start = self.dirty_end = 0
+        self.semantic = False
+        self.semantic_cache = []
+        self.semantic_worker = None
+        document = self.text_document
+        if (threaded or lazy_threshold) and document is not None:
+            self.block_cache = [None] * document.blockCount()
+            self.pending = bytearray(document.blockCount())
+            self.tokenize_timer = QTimer(self)
+            self.tokenize_timer.setSingleShot(True)
+            self.tokenize_timer.setInterval(30)
+            self.tokenize_timer.timeout.connect(self.start_tokenizer)
+            self.fill_timer = QTimer(self)
+            self.fill_timer.setInterval(0)
+            self.fill_timer.timeout.connect(self.fill_pending)
+            if born_detached:
+                self.setParent(document)
+                document.contentsChange.connect(self.on_contents_change)
+                self.detach()
+            else:
+                # Re-attach so our contentsChange slot runs before the one
+                # QSyntaxHighlighter uses to re-highlight the edit
+                self.setDocument(None)
+                document.contentsChange.connect(self.on_contents_change)
+                self.setDocument(document)
+                if lazy_threshold and document.blockCount() > lazy_threshold:
+                    self.detach()
+
+        # Semantic mode: an analyzer worker fills semantic_cache with an
+        # overlay of (start, length, kind_id) triples per block, drawn on
+        # top of the lexical spans
+        self.semantic = bool(semantic and self.SEMANTIC_ANALYZER and self.block_cache)
+        if self.semantic:
+            self.analyzer = self.semantic_analyzer()
+            self.semantic_table = [self.formats[kind] for kind in self.analyzer.KINDS]
+            self.semantic_cache = [None] * document.blockCount()
+            self.semantic_timer = QTimer(self)
+            self.semantic_timer.setSingleShot(True)
+            self.semantic_timer.setInterval(self.SEMANTIC_DELAY)
+            self.semantic_timer.timeout.connect(self.start_semantic_analysis)
+            self.semantic_timer.start()
+
+    @classmethod
+    def compiled_rules(cls):
+        rules = cls.__dict__.get('_compiled_rules')
+        if rules is None:
+            # Later entries win, mirroring the old rule order where
+            # builtins were applied after keywords
+            words = dict.fromkeys(cls.KEYWORDS, 'keyword')
+            words.update(dict.fromkeys(cls.BUILTINS, 'builtin'))
+            rules = HighlightRules(cls.TOKEN_PATTERNS, words,
+                                   cls.MULTILINE_PATTERNS)
+            cls._compiled_rules = rules
+        return rules
+
+    @classmethod
+    def semantic_analyzer(cls):
+        analyzer = cls.__dict__.get('_semantic_analyzer')
+        if analyzer is None:
+            analyzer = cls.SEMANTIC_ANALYZER(cls.compiled_rules())
+            cls._semantic_analyzer = analyzer
+        return analyzer
+
+    @classmethod
+    def shared_formats(cls):
+        # Formats are created once per language too, not once per tab
+        formats = cls.__dict__.get('_shared_formats')
+        if formats is None:
+            formats = {}
+            cls.init_formats(formats)
+            cls.add_common_formats(formats)
+            cls._shared_formats = formats
+        return formats
+
+    @classmethod
+    def init_formats(cls, formats):
+        pass
 
-    def add_common_rules(self):
+    @staticmethod
+    def add_common_formats(formats):
         # String formats
         string_format = QTextCharFormat()
         string_format.setForeground(QColor(EDITOR_COLORS['strings']))
@@ -375,144 +1064,1513 @@ class PythonHighlighter(BaseHighlighter):
         # Number format
         number_format = QTextCharFormat()
         number_format.setForeground(QColor(EDITOR_COLORS['numbers']))
-        
-        # Add common rules
-        self.highlighting_rules.extend([
-            # Strings
-            (r'"[^"\\]*(\\.[^"\\]*)*"', string_format),
-            (r"'[^'\\]*(\\.[^'\\]*)*'", string_format),
-            # Comments
-            (r'#[^\n]*', comment_format),
-            # Numbers
-            (r'\b\d+\b', number_format),
-        ])
 
-class CppHighlighter(BaseHighlighter):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        
-        # C++-specific formats
-        self.init_formats()
+        formats.update({
+            'string': string_format,
+            'comment': comment_format,
+            'number': number_format,
+        })
+
+    def set_visible_blocks(self, first, last):
+        """Prioritize and highlight pending blocks in the visible range"""
+        self.visible_blocks = (first, last)
+        if self.block_cache:
+            self.highlight_visible_blocks()
+
+    def detach(self):
+        """Stop QSyntaxHighlighter from re-highlighting every changed block"""
+        # This also clears the formats of every block, so all of them are
+        # pending until the viewport or the idle fill gets to them
+        self.detached = True
+        self.setDocument(None)
+        self.pending = bytearray(b'\x01' * len(self.pending))
+        if self.threaded:
+            self.stale = True
+            self.tokenize_timer.start()
+        self.fill_timer.start()
+
+    def attach(self):
+        """Hand a document that shrank below lazy_threshold back to Qt"""
+        self.detached = False
+        self.pending = bytearray(len(self.pending))
+        self.fill_timer.stop()
+        self.setDocument(self.text_document)  # Schedules a full re-highlight
+
+    def on_contents_change(self, position, removed, added):
+        # Keep block_cache aligned with the document's blocks: the edited
+        # range is replaced by empty entries that are filled in right away,
+        # by QSyntaxHighlighter or, when detached, by update_blocks()
+        document = self.text_document
+        count = document.blockCount()
+        first = document.findBlock(position).blockNumber()
+        last_block = document.findBlock(position + added)
+        last = last_block.blockNumber() if last_block.isValid() else count - 1
+        new_count = last - first + 1
+        old_count = new_count - (count - len(self.block_cache))
+        self.block_cache[first:first + old_count] = [None] * new_count
+        self.pending[first:first + old_count] = (b'\x01' if self.detached else b'\x00') * new_count
+        if len(self.block_cache) != count:
+            self.block_cache = [None] * count
+            self.pending = bytearray((b'\x01' if self.detached else b'\x00') * count)
+            self.stale = self.threaded
+        if self.semantic:
+            # Edited blocks lose their overlay until the next semantic pass
+            self.semantic_cache[first:first + old_count] = [None] * new_count
+            if len(self.semantic_cache) != count:
+                self.semantic_cache = [None] * count
+            if self.semantic_worker is not None:
+                self.semantic_worker.cancelled = True
+                self.semantic_worker = None
+            self.semantic_timer.start()
+
+        self.revision += 1
+        self.sync_budget = self.SYNC_BLOCK_BUDGET
+        if self.worker is not None:
+            # Results of a running worker refer to the old text
+            self.worker.cancelled = True
+            self.worker = None
+            self.stale = True
+
+        if self.lazy_threshold:
+            if not self.detached and count > self.lazy_threshold:
+                self.detach()
+            elif self.detached and count <= self.lazy_threshold:
+                self.attach()
+        if self.detached:
+            self.update_blocks(first)
+            self.highlight_visible_blocks()
+            if self.pending.find(1) >= 0:
+                self.fill_timer.start()
+        if self.stale:
+            self.tokenize_timer.start()
+
+    def start_tokenizer(self):
+        document = self.text_document
+        if document is None or not self.stale:
+            return
+        self.sync_budget = self.SYNC_BLOCK_BUDGET
+        # Any edit cancels the snapshot, so the revision still holds when
+        # it is ready
+        self.worker = DocumentSnapshot(document, self)
+        self.worker.ready.connect(self.start_tokenizer_thread)
+        self.worker.start()
+
+    def start_tokenizer_thread(self, pieces):
+        self.worker = TokenizerThread(self.rules, pieces, self.revision, self.visible_blocks)
+        self.worker.spans_ready.connect(self.on_spans_ready)
+        self.worker.done.connect(self.on_tokenizer_done)
+        self.worker.start()
+
+    def on_spans_ready(self, revision, first, results):
+        if revision != self.revision:
+            return  # Text changed since the snapshot was taken
+        # Store the block states right away so later edits start from the
+        # right state; formats are applied viewport first, then when idle
+        block = self.text_document.findBlockByNumber(first)
+        for _, state in results:
+            block.setUserState(state)
+            block = block.next()
+        self.block_cache[first:first + len(results)] = results
+        self.pending[first:first + len(results)] = b'\x01' * len(results)
+        self.highlight_visible_blocks()
+        self.fill_timer.start()
+
+    def on_tokenizer_done(self, revision):
+        if revision == self.revision:
+            self.worker = None
+            self.stale = False
+
+    def release(self):
+        """Detach from the document for good, e.g. when the file type changes"""
+        if self.worker is not None:
+            self.worker.cancelled = True
+            self.worker = None
+        if self.semantic:
+            self.semantic_timer.stop()
+            if self.semantic_worker is not None:
+                self.semantic_worker.cancelled = True
+                self.semantic_worker = None
+        if self.block_cache:
+            self.tokenize_timer.stop()
+            self.fill_timer.stop()
+            self.text_document.contentsChange.disconnect(self.on_contents_change)
+        self.setDocument(None)
+        self.text_document = None
+        self.setParent(None)
+        self.deleteLater()
+
+    def start_semantic_analysis(self):
+        document = self.text_document
+        if document is None:
+            return
+        self.semantic_worker = DocumentSnapshot(document, self)
+        self.semantic_worker.ready.connect(self.start_semantic_thread)
+        self.semantic_worker.start()
+
+    def start_semantic_thread(self, pieces):
+        self.semantic_worker = SemanticThread(self.analyzer, pieces, self.revision)
+        self.semantic_worker.tokens_ready.connect(self.on_semantic_tokens)
+        self.semantic_worker.start()
+
+    def on_semantic_tokens(self, revision, result):
+        if revision != self.revision:
+            return  # Text changed since the snapshot was taken
+        self.semantic_worker = None
+        tokens, broken = result
+        keep = bytearray(len(self.semantic_cache))
+        for first, end in broken:
+            # Chunks that do not parse right now keep their old overlay
+            keep[first:end] = b'\x01' * (end - first)
+
+        # Only blocks whose overlay actually changed are repainted
+        changed = []
+        cache = self.semantic_cache
+        for number in set(tokens).union(n for n, old in enumerate(cache) if old is not None):
+            if number < len(cache) and not keep[number] and cache[number] != tokens.get(number):
+                cache[number] = tokens.get(number)
+                changed.append(number)
+        for number in changed:
+            if self.block_cache[number] is not None:
+                self.pending[number] = 1
+        # Repaint viewport first, the rest in idle time
+        self.highlight_visible_blocks()
+        if changed:
+            self.fill_timer.start()
+
+    def apply_block_spans(self, block, spans, state, overlay=None):
+        """Set formats on the block layout directly, as QSyntaxHighlighter does"""
+        table = self.format_table
+        ranges = []
+        # Semantic tokens replace the lexical span of the same identifier
+        covered = set(overlay[0::3]) if overlay else ()
+        for i in range(0, len(spans), 3):
+            if spans[i] in covered:
+                continue
+            format_range = QTextLayout.FormatRange()
+            format_range.start = spans[i]
+            format_range.length = spans[i + 1]
+            format_range.format = table[spans[i + 2]]
+            ranges.append(format_range)
+        if overlay:
+            table = self.semantic_table
+            for i in range(0, len(overlay), 3):
+                format_range = QTextLayout.FormatRange()
+                format_range.start = overlay[i]
+                format_range.length = overlay[i + 1]
+                format_range.format = table[overlay[i + 2]]
+                ranges.append(format_range)
+        block.layout().setFormats(ranges)
+        block.setUserState(state)
+        # Relayout runs of neighbouring blocks at once; every dirty range
+        # makes the editor repaint and report its viewport again
+        position = block.position()
+        if position != self.dirty_end:
+            self.flush_dirty()
+            self.dirty_start = position
+        self.dirty_end = position + block.length()
+
+    def flush_dirty(self):
+        if self.dirty_end > self.dirty_start:
+            self.text_document.markContentsDirty(self.dirty_start,
+                                                 self.dirty_end - self.dirty_start)
+        self.dirty_start = self.dirty_end = 0
+
+    def update_block(self, block, number):
+        """Bring one pending block up to date from the cache or the tokenizer"""
+        entry = self.block_cache[number]
+        if entry is None:
+            previous = block.previous()
+            state = max(previous.userState(), 0) if previous.isValid() else 0
+            entry = self.rules.block_spans(block.text(), state)
+            self.block_cache[number] = entry
+        spans, state = entry
+        changed = block.userState() != state
+        overlay = self.semantic_cache[number] if self.semantic else None
+        self.apply_block_spans(block, spans, state, overlay)
+        self.pending[number] = 0
+        if changed and number + 1 < len(self.pending):
+            # Carry the state change into the next block, like
+            # QSyntaxHighlighter does
+            self.block_cache[number + 1] = None
+            self.pending[number + 1] = 1
+
+    def update_blocks(self, number):
+        """Highlight consecutive pending blocks from number, within the budget"""
+        block = self.text_document.findBlockByNumber(number)
+        budget = self.SYNC_BLOCK_BUDGET
+        self.applying = True
+        try:
+            while budget and number < len(self.pending) and self.pending[number]:
+                self.update_block(block, number)
+                block = block.next()
+                number += 1
+                budget -= 1
+        finally:
+            self.flush_dirty()
+            self.applying = False
+
+    def highlight_visible_blocks(self):
+        document = self.text_document
+        if self.applying or document is None:
+            return
+        first, last = self.visible_blocks
+        first = max(first - self.VIEWPORT_MARGIN, 0)
+        last = min(last + self.VIEWPORT_MARGIN, len(self.pending) - 1)
+        number = self.pending.find(1, first, last + 1)
+        if number < 0:
+            return
+        self.applying = True
+        try:
+            block = document.findBlockByNumber(number)
+            for number in range(number, last + 1):
+                if self.pending[number]:
+                    self.update_block(block, number)
+                block = block.next()
+        finally:
+            self.flush_dirty()
+            self.applying = False
+
+    def fill_pending(self):
+        """Idle-time slice: highlight pending blocks from the top down"""
+        number = self.pending.find(1)
+        if number < 0:
+            self.fill_timer.stop()
+            return
+        document = self.text_document
+        deadline = time.perf_counter() + self.FILL_SLICE
+        block = document.findBlockByNumber(number)
+        self.applying = True
+        try:
+            while time.perf_counter() < deadline:
+                if self.block_cache[number] is None and self.worker is not None:
+                    # The worker is about to deliver this block; its results
+                    # restart the fill
+                    self.fill_timer.stop()
+                    return
+                self.update_block(block, number)
+                if number + 1 < len(self.pending) and self.pending[number + 1]:
+                    block = block.next()
+                    number += 1
+                    continue
+                number = self.pending.find(1, number + 1)
+                if number < 0:
+                    self.fill_timer.stop()
+                    return
+                block = document.findBlockByNumber(number)
+        finally:
+            self.flush_dirty()
+            self.applying = False
+
+    def highlightBlock(self, text):
+        if self.threaded and self.sync_budget <= 0:
+            # Leave the block to the worker. Its stored state is kept,
+            # which stops QSyntaxHighlighter from cascading any further
+            if not self.stale:
+                self.stale = True
+                self.tokenize_timer.start()
+            return
+
+        # QSyntaxHighlighter keeps re-highlighting following blocks only
+        # while their end state changes, so an edit stops as soon as the
+        # state converges again
+        spans, state = self.rules.block_spans(text, max(self.previousBlockState(), 0))
+        if self.block_cache:
+            number = self.currentBlock().blockNumber()
+            self.block_cache[number] = (spans, state)
+            self.pending[number] = 0
+            if self.threaded:
+                self.sync_budget -= 1
+
+        table = self.format_table
+        for i in range(0, len(spans), 3):
+            self.setFormat(spans[i], spans[i + 1], table[spans[i + 2]])
+        if self.semantic:
+            overlay = self.semantic_cache[number]
+            if overlay:
+                table = self.semantic_table
+                for i in range(0, len(overlay), 3):
+                    self.setFormat(overlay[i], overlay[i + 1], table[overlay[i + 2]])
+        self.setCurrentBlockState(state)
+
+# Double- and single-quoted strings on a single line
+STRING_PATTERN = ('string', r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+                            r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'")
+
+# /* ... */ comments shared by the C-family languages
+BLOCK_COMMENT_PATTERN = ('comment', r'/\*', r'.*?\*/')
+
+class PythonHighlighter(BaseHighlighter):
+    # Python keywords
+    KEYWORDS = (
+        "and", "as", "assert", "break", "class", "continue", "def",
+        "del", "elif", "else", "except", "False", "finally", "for",
+        "from", "global", "if", "import", "in", "is", "lambda", "None",
+        "nonlocal", "not", "or", "pass", "raise", "return", "True",
+        "try", "while", "with", "yield"
+    )
+    # Python built-ins, skipping private names
+    BUILTINS = tuple(word for word in dir(builtins) if not word.startswith('_'))
+    TOKEN_PATTERNS = (
+        STRING_PATTERN,
+        ('comment', r'#[^\n]*'),
+        ('decorator', r'@\w+'),
+    )
+    # Triple-quoted strings, with optional r/b/u/f prefixes
+    MULTILINE_PATTERNS = (
+        ('string', r'[rRbBuUfF]{0,2}"""', r'(?:[^"\\]|\\.|"(?!""))*"""'),
+        ('string', r"[rRbBuUfF]{0,2}'''", r"(?:[^'\\]|\\.|'(?!''))*'''"),
+    )
+    SEMANTIC_ANALYZER = SemanticAnalyzer
+
+    @classmethod
+    def init_formats(cls, formats):
+        # Keywords
+        keyword_format = QTextCharFormat()
+        keyword_format.setForeground(QColor(EDITOR_COLORS['keywords']))
+        keyword_format.setFontWeight(QFont.Bold)
         
-        # Add C++-specific rules
-        self.add_cpp_rules()
+        # Built-ins
+        builtin_format = QTextCharFormat()
+        builtin_format.setForeground(QColor("#66D9EF"))
         
-        # Add common rules
-        self.add_common_rules()
+        # Decorators
+        decorator_format = QTextCharFormat()
+        decorator_format.setForeground(QColor(EDITOR_COLORS['decorators']))
+
+        formats.update({
+            'keyword': keyword_format,
+            'builtin': builtin_format,
+            'decorator': decorator_format,
+        })
+
+        # Semantic overlay, one format per SemanticAnalyzer kind
+        for kind, color in (('class', 'class_names'), ('function', 'functions'),
+                            ('parameter', 'parameters'), ('local', 'text'),
+                            ('attribute', 'attributes'), ('imported', 'imports')):
+            formats[kind] = QTextCharFormat()
+            formats[kind].setForeground(QColor(EDITOR_COLORS[color]))
+        formats['parameter'].setFontItalic(True)
+
+class CppHighlighter(BaseHighlighter):
+    # C++ keywords
+    KEYWORDS = (
+        "alignas", "alignof", "and", "and_eq", "asm", "auto", "bitand",
+        "bitor", "bool", "break", "case", "catch", "char", "char8_t",
+        "char16_t", "char32_t", "class", "compl", "concept", "const",
+        "consteval", "constexpr", "constinit", "const_cast", "continue",
+        "co_await", "co_return", "co_yield", "decltype", "default",
+        "delete", "do", "double", "dynamic_cast", "else", "enum",
+        "explicit", "export", "extern", "false", "float", "for",
+        "friend", "goto", "if", "inline", "int", "long", "mutable",
+        "namespace", "new", "noexcept", "not", "not_eq", "nullptr",
+        "operator", "or", "or_eq", "private", "protected", "public",
+        "register", "reinterpret_cast", "requires", "return", "short",
+        "signed", "sizeof", "static", "static_assert", "static_cast",
+        "struct", "switch", "template", "this", "thread_local", "throw",
+        "true", "try", "typedef", "typeid", "typename", "union",
+        "unsigned", "using", "virtual", "void", "volatile", "wchar_t",
+        "while", "xor", "xor_eq"
+    )
+    TOKEN_PATTERNS = (
+        STRING_PATTERN,
+        ('comment', r'//[^\n]*'),
+        # Preprocessor directives
+        ('preprocessor', r'#\w+'),
+    )
+    MULTILINE_PATTERNS = (BLOCK_COMMENT_PATTERN,)
 
-    def init_formats(self):
+    @classmethod
+    def init_formats(cls, formats):
         # Keywords
-        self.keyword_format = QTextCharFormat()
-        self.keyword_format.setForeground(QColor(EDITOR_COLORS['keywords']))
-        self.keyword_format.setFontWeight(QFont.Bold)
+        keyword_format = QTextCharFormat()
+        keyword_format.setForeground(QColor(EDITOR_COLORS['keywords']))
+        keyword_format.setFontWeight(QFont.Bold)
         
         # Types
-        self.type_format = QTextCharFormat()
-        self.type_format.setForeground(QColor("#66D9EF"))
+        type_format = QTextCharFormat()
+        type_format.setForeground(QColor("#66D9EF"))
         
         # Preprocessor
-        self.preprocessor_format = QTextCharFormat()
-        self.preprocessor_format.setForeground(QColor("#F92672"))
-
-    def add_cpp_rules(self):
-        # C++ keywords
-        keywords = [
-            "alignas", "alignof", "and", "and_eq", "asm", "auto", "bitand",
-            "bitor", "bool", "break", "case", "catch", "char", "char8_t",
-            "char16_t", "char32_t", "class", "compl", "concept", "const",
-            "consteval", "constexpr", "constinit", "const_cast", "continue",
-            "co_await", "co_return", "co_yield", "decltype", "default",
-            "delete", "do", "double", "dynamic_cast", "else", "enum",
-            "explicit", "export", "extern", "false", "float", "for",
-            "friend", "goto", "if", "inline", "int", "long", "mutable",
-            "namespace", "new", "noexcept", "not", "not_eq", "nullptr",
-            "operator", "or", "or_eq", "private", "protected", "public",
-            "register", "reinterpret_cast", "requires", "return", "short",
-            "signed", "sizeof", "static", "static_assert", "static_cast",
-            "struct", "switch", "template", "this", "thread_local", "throw",
-            "true", "try", "typedef", "typeid", "typename", "union",
-            "unsigned", "using", "virtual", "void", "volatile", "wchar_t",
-            "while", "xor", "xor_eq"
-        ]
-        for word in keywords:
-            pattern = f"\\b{word}\\b"
-            self.highlighting_rules.append((pattern, self.keyword_format))
-            
-        # Preprocessor directives
-        self.highlighting_rules.append((r"#\w+", self.preprocessor_format))
+        preprocessor_format = QTextCharFormat()
+        preprocessor_format.setForeground(QColor("#F92672"))
+
+        formats.update({
+            'keyword': keyword_format,
+            'type': type_format,
+            'preprocessor': preprocessor_format,
+        })
 
 class JavaHighlighter(BaseHighlighter):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.init_formats()
-        self.add_java_rules()
-        self.add_common_rules()
+    # Java keywords
+    KEYWORDS = (
+        "abstract", "assert", "boolean", "break", "byte", "case", "catch",
+        "char", "class", "const", "continue", "default", "do", "double",
+        "else", "enum", "extends", "final", "finally", "float", "for",
+        "if", "implements", "import", "instanceof", "int", "interface",
+        "long", "native", "new", "package", "private", "protected",
+        "public", "return", "short", "static", "strictfp", "super",
+        "switch", "synchronized", "this", "throw", "throws", "transient",
+        "try", "void", "volatile", "while", "true", "false", "null"
+    )
+    TOKEN_PATTERNS = (
+        STRING_PATTERN,
+        ('comment', r'//[^\n]*'),
+        # Annotations
+        ('annotation', r'@\w+'),
+    )
+    MULTILINE_PATTERNS = (BLOCK_COMMENT_PATTERN,)
 
-    def init_formats(self):
+    @classmethod
+    def init_formats(cls, formats):
         # Keywords
-        self.keyword_format = QTextCharFormat()
-        self.keyword_format.setForeground(QColor(EDITOR_COLORS['keywords']))
-        self.keyword_format.setFontWeight(QFont.Bold)
+        keyword_format = QTextCharFormat()
+        keyword_format.setForeground(QColor(EDITOR_COLORS['keywords']))
+        keyword_format.setFontWeight(QFont.Bold)
         
         # Types
-        self.type_format = QTextCharFormat()
-        self.type_format.setForeground(QColor("#66D9EF"))
+        type_format = QTextCharFormat()
+        type_format.setForeground(QColor("#66D9EF"))
         
         # Annotations
-        self.annotation_format = QTextCharFormat()
-        self.annotation_format.setForeground(QColor(EDITOR_COLORS['decorators']))
-
-    def add_java_rules(self):
-        # Java keywords
-        keywords = [
-            "abstract", "assert", "boolean", "break", "byte", "case", "catch",
-            "char", "class", "const", "continue", "default", "do", "double",
-            "else", "enum", "extends", "final", "finally", "float", "for",
-            "if", "implements", "import", "instanceof", "int", "interface",
-            "long", "native", "new", "package", "private", "protected",
-            "public", "return", "short", "static", "strictfp", "super",
-            "switch", "synchronized", "this", "throw", "throws", "transient",
-            "try", "void", "volatile", "while", "true", "false", "null"
-        ]
-        for word in keywords:
-            pattern = f"\\b{word}\\b"
-            self.highlighting_rules.append((pattern, self.keyword_format))
-            
-        # Annotations
-        self.highlighting_rules.append((r"@\w+", self.annotation_format))
+        annotation_format = QTextCharFormat()
+        annotation_format.setForeground(QColor(EDITOR_COLORS['decorators']))
+
+        formats.update({
+            'keyword': keyword_format,
+            'type': type_format,
+            'annotation': annotation_format,
+        })
+
+def python_vocabulary():
+    """Completion words for Python: keywords, builtins, common modules, snippets"""
+    words = set()
+    words.update(keyword.kwlist)  # Python keywords
+    words.update(dir(builtins))   # Python builtins
+    
+    # Add common Python modules
+    common_modules = ['os', 'sys', 'datetime', 'math', 'random', 'json', 're', 'time']
+    for module in common_modules:
+        try:
+            module_obj = __import__(module)
+            words.update(dir(module_obj))
+        except ImportError:
+            pass
+    
+    # Add code snippets
+    words.update([
+        "def __init__(self):",
+        "if __name__ == '__main__':",
+        "try:\n    \nexcept Exception as e:",
+        "for i in range():",
+        "while True:",
+        "class ClassName:",
+        "def function_name():",
+        "import ",
+        "from  import ",
+        "print()",
+        "return ",
+        "raise Exception",
+        "with open() as f:",
+    ])
+    return words
+
+def cpp_vocabulary():
+    return CppHighlighter.KEYWORDS
+
+def java_vocabulary():
+    return JavaHighlighter.KEYWORDS
+
+def edited_blocks(document, position, added, known_blocks):
+    """Blocks a contentsChange touched: (first, count, texts), where the
+    count blocks from first that an index of known_blocks blocks kept
+    were replaced by the blocks of texts"""
+    count = document.blockCount()
+    first_block = document.findBlock(position)
+    first = first_block.blockNumber()
+    last_block = document.findBlock(position + added)
+    last = last_block.blockNumber() if last_block.isValid() else count - 1
+    new_count = last - first + 1
+    if new_count == 1:
+        texts = [first_block.text()]
+    else:
+        # One selection of the edited blocks instead of a QTextBlock
+        # per line, which adds up for a replace-all or a paste
+        cursor = QTextCursor(first_block)
+        cursor.setPosition(last_block.position() + last_block.length() - 1
+                           if last_block.isValid() else document.characterCount() - 1,
+                           QTextCursor.KeepAnchor)
+        texts = cursor.selectedText().split('\u2029')
+    return first, new_count - (count - known_blocks), texts
+
+class FoldIndex(abc.ABC):
+    """Fold regions of a document, from one int per block.
+
+    A block's entry depends on its own text and the state the block
+    before it ended in (say, inside a comment), so contentsChange
+    re-reads the edited blocks, and the ones below only as long as
+    their state changes, the way the highlighter keeps its block_cache
+    aligned. Where a region ends is worked out on demand by scanning
+    down from its first line, and regions() finds all of them in one
+    pass. Folding hides the blocks of a region; folded marks the first
+    line of each folded region.
+    """
+    def __init__(self, document):
+        self.document = document
+        # Bumped when an edit may have moved fold markers
+        self.revision = 0
+        self.reset()
+        document.contentsChange.connect(self.on_contents_change)
+
+    @abc.abstractmethod
+    def block_entry(self, text, state):
+        """(entry, state at its end) of a block starting in state"""
+
+    @abc.abstractmethod
+    def is_start(self, number):
+        """Whether a region starts at block number"""
+
+    @abc.abstractmethod
+    def region_end(self, number):
+        """Last block hidden when block number is folded, or None"""
+
+    @abc.abstractmethod
+    def enclosing(self, number):
+        """First block of the innermost region holding block number, or None"""
+
+    @abc.abstractmethod
+    def regions(self):
+        """Every (first, last hidden) region of the document"""
+
+    def read(self, texts, state):
+        """Entries and end states of consecutive blocks, the first one
+        starting in state"""
+        entries = array('i')
+        states = bytearray()
+        for text in texts:
+            entry, state = self.block_entry(text, state)
+            entries.append(entry)
+            states.append(state)
+        return entries, states
+
+    def reset(self):
+        texts = document_text(self.document).split('\n')
+        self.entries, self.states = self.read(texts, 0)
+        self.folded = bytearray(len(texts))
+
+    def release(self):
+        """Show every block again and stop following the document"""
+        self.unfold_all()
+        self.document.contentsChange.disconnect(self.on_contents_change)
+
+    def on_contents_change(self, position, removed, added):
+        first, old_count, texts = edited_blocks(
+            self.document, position, added, len(self.entries))
+        new_count = len(texts)
+        last = first + new_count - 1
+        state = self.states[first - 1] if first else 0
+        end_state = self.states[first + old_count - 1] if old_count else state
+        entries, states = self.read(texts, state)
+        if self.entries[first:first + old_count] != entries:
+            self.revision += 1
+        was_folded = self.folded.find(1, first, first + old_count) >= 0
+        self.entries[first:first + old_count] = entries
+        self.states[first:first + old_count] = states
+        self.folded[first:first + old_count] = bytes(new_count)
+
+        # An edit that opens or closes a comment changes the blocks below
+        # it too, up to where their state is what it was
+        if states and states[-1] != end_state:
+            state = states[-1]
+            block = self.document.findBlockByNumber(last + 1)
+            while block.isValid() and last + 1 < len(self.entries):
+                last += 1
+                entry, state = self.block_entry(block.text(), state)
+                if entry != self.entries[last]:
+                    self.entries[last] = entry
+                    self.revision += 1
+                if self.folded[last]:
+                    self.folded[last] = 0
+                    was_folded = True
+                if state == self.states[last]:
+                    break
+                self.states[last] = state
+                block = block.next()
+
+        hidden = False
+        if self.folded.find(1) >= 0:
+            # Only blocks in a folded region can be hidden
+            block = self.document.findBlockByNumber(first)
+            for _ in range(last - first + 1):
+                if not block.isVisible():
+                    hidden = True
+                    break
+                block = block.next()
+        if hidden or was_folded:
+            # Edits to a folded region, or to its first line, unfold it
+            self.reveal(first, last)
+
+    def set_visible(self, block, last, visible):
+        """Show or hide the blocks from block to block number last"""
+        start = block.position()
+        number = block.blockNumber()
+        while block.isValid() and number <= last:
+            block.setVisible(visible)
+            block = block.next()
+            number += 1
+        self.mark_dirty(start, block)
+
+    def mark_dirty(self, start, block):
+        """Relayout from position start up to block"""
+        end = block.position() if block.isValid() else self.document.characterCount()
+        self.document.markContentsDirty(start, end - start)
+
+    def fold(self, number):
+        end = self.region_end(number)
+        if end is None:
+            return False
+        self.folded[number] = 1
+        self.set_visible(self.document.findBlockByNumber(number + 1), end, False)
+        return True
+
+    def unfold(self, number):
+        """Show a folded region; the regions folded inside it stay folded"""
+        end = self.region_end(number)
+        self.folded[number] = 0
+        if end is None:
+            return
+        document = self.document
+        number += 1
+        block = document.findBlockByNumber(number)
+        start = block.position()
+        while block.isValid() and number <= end:
+            block.setVisible(True)
+            nested = self.region_end(number) if self.folded[number] else None
+            if nested is not None:
+                number = nested + 1
+                block = document.findBlockByNumber(number)
+            else:
+                block = block.next()
+                number += 1
+        self.mark_dirty(start, block)
+
+    def reveal(self, first, last):
+        """Unfold whatever hides the blocks from first to last"""
+        document = self.document
+        block = document.findBlockByNumber(first)
+        while not block.isVisible() and block.previous().isValid():
+            block = block.previous()
+            first -= 1
+        self.folded[first] = 0
+        start = block.position()
+        block = block.next()
+        number = first + 1
+        while block.isValid() and (number <= last or not block.isVisible()):
+            block.setVisible(True)
+            self.folded[number] = 0
+            block = block.next()
+            number += 1
+        self.mark_dirty(start, block)
+
+    def fold_all(self):
+        # Regions come sorted by first line, so nested ones fall inside
+        # the run of blocks hidden for their parent and every block is
+        # visited once
+        runs = []
+        for first, last in sorted(self.regions()):
+            self.folded[first] = 1
+            if runs and first < runs[-1][1]:
+                runs[-1][1] = max(runs[-1][1], last)
+            else:
+                runs.append([first + 1, last])
+        if not runs:
+            return
+        document = self.document
+        start = document.findBlockByNumber(runs[0][0]).position()
+        for first, last in runs:
+            block = document.findBlockByNumber(first)
+            for _ in range(last - first + 1):
+                block.setVisible(False)
+                block = block.next()
+        self.mark_dirty(start, block)
+
+    def unfold_all(self):
+        document = self.document
+        start = None
+        number = self.folded.find(1)
+        while number >= 0:
+            number += 1
+            block = document.findBlockByNumber(number)
+            if start is None:
+                start = block.position()
+            while block.isValid() and not block.isVisible():
+                block.setVisible(True)
+                block = block.next()
+                number += 1
+            number = self.folded.find(1, number)
+        self.folded = bytearray(len(self.folded))
+        if start is not None:
+            self.mark_dirty(start, block)
+
+class IndentFolds(FoldIndex):
+    """Python: a region is a line and the more indented lines below it"""
+    # Entries are indentation widths, with blank lines as BLANK
+    BLANK = -1
+
+    def block_entry(self, text, state):
+        body = text.lstrip(' \t')
+        if not body:
+            return self.BLANK, 0
+        indent = len(text) - len(body)
+        if '\t' in text[:indent]:
+            indent = len(text[:indent].expandtabs())
+        return indent, 0
+
+    def next_indent(self, number):
+        entries = self.entries
+        for number in range(number + 1, len(entries)):
+            if entries[number] != self.BLANK:
+                return entries[number]
+        return self.BLANK
+
+    def is_start(self, number):
+        indent = self.entries[number]
+        return indent != self.BLANK and self.next_indent(number) > indent
+
+    def region_end(self, number):
+        entries = self.entries
+        indent = entries[number]
+        if indent == self.BLANK:
+            return None
+        end = None
+        for line in range(number + 1, len(entries)):
+            entry = entries[line]
+            if entry == self.BLANK:
+                continue
+            if entry <= indent:
+                break
+            end = line
+        return end
+
+    def enclosing(self, number):
+        entries = self.entries
+        indent = entries[number]
+        if indent == self.BLANK:
+            indent = self.next_indent(number)
+        for line in range(number - 1, -1, -1):
+            entry = entries[line]
+            if entry != self.BLANK and (indent == self.BLANK or entry < indent):
+                return line
+        return None
+
+    def regions(self):
+        regions = []
+        stack = []  # (indent, first line)
+        last = -1  # Last non-blank line
+        for number, indent in enumerate(self.entries):
+            if indent == self.BLANK:
+                continue
+            while stack and stack[-1][0] >= indent:
+                first = stack.pop()[1]
+                if last > first:
+                    regions.append((first, last))
+            stack.append((indent, number))
+            last = number
+        for _, first in stack:
+            if last > first:
+                regions.append((first, last))
+        return regions
+
+class BraceFolds(FoldIndex):
+    """C-family languages: a region runs from a { to the line of its }
+
+    An entry packs the braces a line closes before anything else in its
+    high bits and the braces it leaves open in its low 16 bits, so
+    `} else {` both ends a region and starts the next one. A block ends
+    in code, or inside a block comment, a Java text block or a
+    JavaScript template literal that goes on to the next one.
+    """
+    CODE, COMMENT, TEXT_BLOCK, TEMPLATE = range(4)
+    # Strings, character literals and comments, whose braces don't count;
+    # the named groups are those left open at the end of the line
+    NOISE = re.compile(r'/\*.*?\*/|(?P<comment>/\*.*)|//.*'
+                       r'|"""(?:[^\\]|\\.)*?"""|(?P<text_block>""".*)'
+                       r'|"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\''
+                       r'|`(?:[^`\\]|\\.)*`|(?P<template>`.*)')
+    # The rest of a block that starts in each state, up to its close
+    CONTINUED = {
+        COMMENT: re.compile(r'.*?\*/'),
+        TEXT_BLOCK: re.compile(r'(?:[^\\]|\\.)*?"""'),
+        TEMPLATE: re.compile(r'(?:[^`\\]|\\.)*`'),
+    }
+    OPENED = {'comment': COMMENT, 'text_block': TEXT_BLOCK, 'template': TEMPLATE}
+    BRACES = re.compile(r'[{}]')
+    OPEN_MASK = 0xFFFF
+
+    def block_entry(self, text, state):
+        if state != self.CODE:
+            close = self.CONTINUED[state].match(text)
+            if close is None:
+                return 0, state
+            text = text[close.end():]
+            state = self.CODE
+        if ('{' not in text and '}' not in text and '/*' not in text
+                and '"""' not in text and '`' not in text):
+            return 0, state
+        pieces = []
+        position = 0
+        for match in self.NOISE.finditer(text):
+            pieces.append(text[position:match.start()])
+            position = match.end()
+            if match.lastgroup:
+                state = self.OPENED[match.lastgroup]
+        pieces.append(text[position:])
+        closes = opens = 0
+        for brace in self.BRACES.findall(''.join(pieces)):
+            if brace == '{':
+                opens += 1
+            elif opens:
+                opens -= 1
+            else:
+                closes += 1
+        return min(closes, self.OPEN_MASK) << 16 | min(opens, self.OPEN_MASK), state
+
+    def is_start(self, number):
+        return bool(self.entries[number] & self.OPEN_MASK)
+
+    def region_end(self, number):
+        entries = self.entries
+        open_braces = entries[number] & self.OPEN_MASK
+        if not open_braces:
+            return None
+        line = number + 1
+        while line < len(entries):
+            entry = entries[line]
+            if entry >> 16 >= open_braces:
+                break
+            open_braces += (entry & self.OPEN_MASK) - (entry >> 16)
+            line += 1
+        # The line of the closing brace stays visible
+        return line - 1 if line - 1 > number else None
+
+    def enclosing(self, number):
+        entries = self.entries
+        # Closing braces seen walking up that are still to be matched
+        unmatched = 0
+        for line in range(number - 1, -1, -1):
+            entry = entries[line]
+            if entry & self.OPEN_MASK > unmatched:
+                return line
+            unmatched += (entry >> 16) - (entry & self.OPEN_MASK)
+        return None
+
+    def regions(self):
+        regions = []
+        stack = []  # [first line, braces it still has open]
+        for number, entry in enumerate(self.entries):
+            closes = entry >> 16
+            while closes and stack:
+                top = stack[-1]
+                matched = min(top[1], closes)
+                top[1] -= matched
+                closes -= matched
+                if not top[1]:
+                    stack.pop()
+                    if number - 1 > top[0]:
+                        regions.append((top[0], number - 1))
+            if entry & self.OPEN_MASK:
+                stack.append([number, entry & self.OPEN_MASK])
+        last = len(self.entries) - 1
+        for first, _ in stack:
+            if last > first:
+                regions.append((first, last))
+        return regions
+
+class Vocabulary:
+    """The static completion words of a language, built once per process.
+
+    The words are sorted ignoring case into a tuple, and matched by a
+    FuzzyMatcher made the first time it is needed. Every language built
+    by the same factory, and every editor of them, shares one Vocabulary.
+    """
+    _built = {}
+
+    def __init__(self, words):
+        self.words = tuple(sorted(set(words), key=str.lower))
+        self._matcher = None
+        self._model = None
+
+    @classmethod
+    def of(cls, factory):
+        vocabulary = cls._built.get(factory)
+        if vocabulary is None:
+            vocabulary = cls._built[factory] = cls(factory() if factory else ())
+        return vocabulary
+
+    def __len__(self):
+        return len(self.words)
+
+    def matcher(self):
+        """The FuzzyMatcher of the words"""
+        if self._matcher is None:
+            self._matcher = FuzzyMatcher(self.words)
+        return self._matcher
+
+    def model(self):
+        """One QStringListModel of all the words, for completers that
+        filter the whole vocabulary themselves; it must not be changed"""
+        if self._model is None:
+            self._model = QStringListModel(list(self.words))
+        return self._model
+
+def build_vocabularies():
+    """Build the vocabulary of every language, e.g. once the GUI is idle"""
+    for language in LANGUAGES:
+        language.vocabulary().matcher()
+
+class Language:
+    """One entry of the language registry.
+
+    Everything is described declaratively; the completion vocabulary is
+    only built the first time it is needed, and highlighter rules and
+    formats are compiled by the first highlighter instance.
+    """
+    def __init__(self, name, extensions, highlighter=None, vocabulary=None,
+                 indent='    ', build=None, folding=None):
+        self.name = name
+        self.extensions = extensions
+        self.highlighter = highlighter
+        self.vocabulary_factory = vocabulary
+        self.indent = indent
+        self.folding = folding  # FoldIndex subclass
+        self.build = build  # Key into BuildRunner.LANGUAGE_CONFIGS
+
+    def vocabulary(self):
+        """The Vocabulary shared by every editor of this language"""
+        return Vocabulary.of(self.vocabulary_factory)
+
+    def build_config(self):
+        return BuildRunner.LANGUAGE_CONFIGS.get(self.build)
+
+LANGUAGES = [
+    Language('Python', ['.py', '.pyw'], PythonHighlighter, python_vocabulary,
+             '    ', build='Python', folding=IndentFolds),
+    Language('C', ['.c'], CppHighlighter, cpp_vocabulary,
+             '\t', build='C', folding=BraceFolds),
+    Language('C++', ['.cpp', '.cxx', '.cc'], CppHighlighter,
+             cpp_vocabulary, '\t', build='C++', folding=BraceFolds),
+    Language('C/C++ Header', ['.h', '.hpp', '.hh'], CppHighlighter,
+             cpp_vocabulary, '\t', folding=BraceFolds),
+    Language('Java', ['.java'], JavaHighlighter, java_vocabulary,
+             '    ', build='Java', folding=BraceFolds),
+    Language('JavaScript', ['.js'], build='JavaScript', folding=BraceFolds),
+]
+
+LANGUAGES_BY_EXTENSION = {
+    extension: language for language in LANGUAGES for extension in language.extensions
+}
+
+def language_for_path(file_path):
+    """Return the Language for a file, or None for plain text"""
+    if not file_path:
+        return LANGUAGES[0]  # Untitled tabs keep the old Python default
+    return LANGUAGES_BY_EXTENSION.get(os.path.splitext(file_path)[1].lower())
 
 # Add CodeCompleter class for intelligent code completion
+class IdentifierTrie:
+    """Identifiers and how often each occurs, in a radix trie.
+
+    Edges carry whole runs of characters, so there is a node only where
+    words branch or end. Words are keyed ignoring case and the node of
+    a key counts each spelling. An edge is [label, {spelling: count} or
+    None, children or None], children mapping a first character to its
+    edge.
+    """
+    def __init__(self):
+        self.root = {}
+
+    @staticmethod
+    def common_length(a, b):
+        n = min(len(a), len(b))
+        i = 0
+        while i < n and a[i] == b[i]:
+            i += 1
+        return i
+
+    def add(self, word, count=1):
+        key = word.lower()
+        children = self.root
+        while True:
+            edge = children.get(key[0])
+            if edge is None:
+                children[key[0]] = [key, {word: count}, None]
+                return
+            label = edge[0]
+            common = self.common_length(label, key)
+            if common < len(label):
+                # Split the edge where the key leaves it
+                edge[:] = [label[:common], None,
+                           {label[common]: [label[common:], edge[1], edge[2]]}]
+            if common == len(key):
+                if edge[1] is None:
+                    edge[1] = {}
+                edge[1][word] = edge[1].get(word, 0) + count
+                return
+            key = key[common:]
+            if edge[2] is None:
+                edge[2] = {}
+            children = edge[2]
+
+    def remove(self, word, count=1):
+        key = word.lower()
+        path = []
+        children = self.root
+        while True:
+            edge = children.get(key[0])
+            if edge is None or not key.startswith(edge[0]):
+                return
+            path.append((children, edge))
+            key = key[len(edge[0]):]
+            if not key:
+                break
+            children = edge[2]
+            if children is None:
+                return
+        spellings = edge[1]
+        if not spellings or word not in spellings:
+            return
+        if spellings[word] > count:
+            spellings[word] -= count
+            return
+        del spellings[word]
+        if spellings:
+            return
+        edge[1] = None
+        # Drop the node, or merge it into its only child
+        children, edge = path.pop()
+        if edge[2] is None:
+            del children[edge[0][0]]
+            if path:
+                parent = path[-1][1]
+                if not children:
+                    parent[2] = None
+                elif parent[1] is None and len(children) == 1:
+                    self.merge(parent)
+        elif len(edge[2]) == 1:
+            self.merge(edge)
+
+    @staticmethod
+    def merge(edge):
+        (child,) = edge[2].values()
+        edge[:] = [edge[0] + child[0], child[1], child[2]]
+
+    def complete(self, prefix):
+        """(spelling, count) of the words starting with prefix, ignoring case"""
+        key = prefix.lower()
+        children = self.root
+        while key:
+            edge = children.get(key[0]) if children else None
+            if edge is None:
+                return []
+            label = edge[0]
+            if len(key) > len(label) and key.startswith(label):
+                key = key[len(label):]
+                children = edge[2]
+            elif label.startswith(key):
+                break
+            else:
+                return []
+        else:
+            return []
+        found = []
+        stack = [edge]
+        while stack:
+            edge = stack.pop()
+            if edge[1]:
+                found.extend(edge[1].items())
+            if edge[2]:
+                stack.extend(edge[2].values())
+        return found
+
+class IdentifierIndex:
+    """Identifiers used in a document, for completion.
+
+    Like FoldIndex, a contentsChange re-reads only the edited blocks:
+    the identifiers of each block are kept, so those an edit removes
+    come out of the trie again. snapshot() copies what completing a
+    prefix needs, to be ranked by a CompletionThread.
+    """
+    WORD = re.compile(r'[^\W\d]\w{2,}')
+    NEARBY_LINES = 50
+    REMATCH_CHANGES = 500
+
+    def __init__(self, document):
+        self.document = document
+        self.trie = IdentifierTrie()
+        self.blocks = []
+        # Each identifier and its count. Identifiers are fuzzy matched by
+        # a FuzzyMatcher of them as they were after `matched` words came
+        # or went; those since are logged, and the matcher is made again
+        # on a worker after REMATCH_CHANGES of them. `logged` changes
+        # were dropped from the front of the log
+        self.words = {}
+        self.matcher = None
+        self.matched = 0
+        self.log = []
+        self.logged = 0
+        # The snapshot making the next matcher, if any
+        self.rematching = None
+        self.replace(0, 0, document_text(document).split('\n'))
+        document.contentsChange.connect(self.on_contents_change)
+
+    def release(self):
+        self.document.contentsChange.disconnect(self.on_contents_change)
+
+    def on_contents_change(self, position, removed, added):
+        first, count, texts = edited_blocks(self.document, position, added, len(self.blocks))
+        self.replace(first, count, texts)
+
+    def replace(self, first, count, texts):
+        """Replace the identifiers of count blocks from first by those of texts"""
+        findall = self.WORD.findall
+        words = [tuple(findall(text)) for text in texts]
+        removed = Counter(word for block in self.blocks[first:first + count] for word in block)
+        added = Counter(word for block in words for word in block)
+        self.blocks[first:first + count] = words
+        counts = self.words
+        # Without a matcher to catch up with, nothing needs logging
+        log = self.log if self.matcher is not None or self.rematching is not None else None
+        for word, n in (removed - added).items():
+            self.trie.remove(word, n)
+            if counts[word] > n:
+                counts[word] -= n
+            else:
+                del counts[word]
+                if log is not None:
+                    log.append(word)
+        for word, n in (added - removed).items():
+            self.trie.add(word, n)
+            if word in counts:
+                counts[word] += n
+            else:
+                counts[word] = n
+                if log is not None:
+                    log.append(word)
+        if self.rematching is None and len(self.log) > self.REMATCH_CHANGES:
+            # The next snapshot makes a new matcher anyway
+            self.matcher = None
+            self.logged += len(self.log)
+            self.log = []
+
+    def snapshot(self, prefix, position):
+        """A CompletionSnapshot of prefix for a cursor at position"""
+        counts = dict(self.trie.complete(prefix))
+        counts.pop(prefix, None)  # The word being typed
+        line = self.document.findBlock(position).blockNumber()
+        first = max(0, line - self.NEARBY_LINES + 1)
+        snapshot = CompletionSnapshot(self.document.revision(), prefix, position, counts,
+                                      self.blocks[first:line + self.NEARBY_LINES], line - first)
+        snapshot.changes = self.logged + len(self.log)
+        since = self.log[self.matched - self.logged:]
+        if self.rematching is None and (self.matcher is None
+                                        or len(since) > self.REMATCH_CHANGES):
+            snapshot.words = list(self.words)
+            self.rematching = snapshot
+        elif self.matcher is not None:
+            snapshot.matcher = self.matcher
+            words = self.words
+            snapshot.recent = [word for word in set(since) if word in words]
+            snapshot.removed = {word for word in since if word not in words}
+        return snapshot
+
+    def rematched(self, snapshot):
+        """Take the matcher snapshot made, once its CompletionThread is done"""
+        if snapshot is not self.rematching:
+            return
+        self.rematching = None
+        self.matcher = snapshot.matcher
+        self.matched = snapshot.changes
+        del self.log[:self.matched - self.logged]
+        self.logged = self.matched
+
+class CompletionSnapshot:
+    """What completing prefix needs from an IdentifierIndex at revision.
+
+    The words with the prefix and the blocks near the cursor are
+    copied; FuzzyMatchers never change once made, so the index's is
+    shared, along with the words since that it lacks. rank() needs
+    nothing else, so it runs on a worker while the document changes.
+    """
+    def __init__(self, revision, prefix, position, counts, nearby, line):
+        self.revision = revision
+        self.prefix = prefix
+        self.position = position
+        self.counts = counts
+        self.nearby = nearby
+        self.line = line  # Of the cursor, in nearby
+        self.changes = 0
+        self.matcher = None
+        # Words to make the matcher of, instead
+        self.words = None
+        self.recent = ()
+        self.removed = ()
+
+    def rank(self, vocabulary, limit, project=None):
+        """Up to limit words: the identifiers starting with the prefix,
+        nearest and most used first, then fuzzy matches of the prefix
+        among them, vocabulary and the project FuzzyMatcher, if any,
+        best first"""
+        words = self.nearest(limit)
+        if self.words is not None:
+            self.matcher = FuzzyMatcher(self.words)
+            self.words = None
+        if len(words) >= limit:
+            return words
+        prefix = self.prefix
+        removed = self.removed
+        identifiers = []
+        if self.matcher is not None:
+            # Enough more to make up for the identifiers gone since
+            identifiers.append(match for match in self.matcher.match(prefix, limit + len(removed))
+                               if match[1] not in removed)
+        if self.recent:
+            identifiers.append(FuzzyMatcher(self.recent).match(prefix, limit))
+        if project is not None:
+            identifiers.append(project.match(prefix, limit))
+        matches = heapq.merge(*identifiers, vocabulary.matcher().match(prefix, limit),
+                              key=lambda match: match[0])
+        known = set(words)
+        known.add(prefix)  # The word being typed
+        for _, word in matches:
+            if word not in known:
+                known.add(word)
+                words.append(word)
+                if len(words) == limit:
+                    break
+        return words
+
+    def nearest(self, limit):
+        counts = self.counts
+        if not counts:
+            return []
+        distances = {}
+        blocks = self.nearby
+        line = self.line
+        for distance in range(IdentifierIndex.NEARBY_LINES):
+            for number in (line - distance, line + distance) if distance else (line,):
+                if 0 <= number < len(blocks):
+                    for word in blocks[number]:
+                        if word in counts and word not in distances:
+                            distances[word] = distance
+        far = IdentifierIndex.NEARBY_LINES
+        return heapq.nsmallest(limit, counts, key=lambda word: (
+            distances.get(word, far), -counts[word], word))
+
+class CompletionThread(WorkerThread):
+    """Rank the words of a CompletionSnapshot off the GUI thread.
+
+    ``done`` always follows, with the words, even for a snapshot that
+    went stale: a matcher it made still goes back to its index.
+    """
+    done = Signal(object)
+
+    def __init__(self, snapshot, vocabulary, limit, project=None):
+        super().__init__()
+        self.snapshot = snapshot
+        self.vocabulary = vocabulary
+        self.limit = limit
+        self.project = project
+
+    def run(self):
+        self.done.emit(self.snapshot.rank(self.vocabulary, self.limit, self.project))
+
+class FuzzyMatcher:
+    """Fuzzy completion over a fixed set of words.
+
+    A query matches a word when its first character is the initial of
+    the word or of one of its camelCase or snake_case parts and the
+    rest follow in order, ignoring case. match() ranks the words the
+    query starts first, alphabetically, then those it spells part by
+    part (each character continuing the part before it or starting a
+    later one, like "stext" for setText), then the rest; shorter words
+    first in those two tiers.
+
+    Words are put in a bucket per initial, each kept as one string of
+    lines, so a query is filtered by regex scans in C rather than a
+    loop over the words. The matches of the last query are kept and a
+    query that extends it only scans those again, when they are few.
+    """
+    INITIALS = re.compile(r'(?<![^\W_])[^\W_]|(?<=[a-z\d])[A-Z]')
+    # Starts each part of a line; a line is the parts, a tab and the key
+    PART = '\x1f'
+    # Keys stand in for the characters lines are made of
+    ESCAPE = str.maketrans('\n\t\x1f', '\x1e\x1d\x1c')
+    # Joining the lines of the last matches again costs more than
+    # scanning their bucket once they are more than 1/RESCAN_FRACTION of it
+    RESCAN_FRACTION = 4
+
+    def __init__(self, words):
+        # Key (the lowercase word) -> its spellings, and -> its line
+        self.spellings = {}
+        self.lines = {}
+        buckets = {}
+        for word in words:
+            key = word.lower().translate(self.ESCAPE)
+            spellings = self.spellings.get(key)
+            if spellings is not None:
+                if word not in spellings:
+                    spellings.append(word)
+                continue
+            self.spellings[key] = [word]
+            starts = [m.start() for m in self.INITIALS.finditer(word)]
+            if len(key) != len(word):
+                starts = []
+            if not starts or starts[0]:
+                starts.insert(0, 0)
+            parts = [key[start:end] for start, end in zip(starts, starts[1:] + [len(key)])]
+            self.lines[key] = f'{self.PART}{self.PART.join(parts)}\t{key}'
+            for initial in {part[0] for part in parts}:
+                buckets.setdefault(initial, []).append(key)
+        self.keys = sorted(self.spellings)
+        self.buckets = {initial: (self.joined(sorted(keys)), len(keys))
+                        for initial, keys in buckets.items()}
+        self.last = None
+
+    def joined(self, keys):
+        return '\n'.join(map(self.lines.__getitem__, keys))
+
+    def match(self, query, limit):
+        """Up to limit (tier, word) pairs matching query, best first"""
+        query = query.lower()
+        if not query:
+            return []
+        text, size = self.buckets.get(query[0], ('', 0))
+        # Read once: completion workers may share the matcher
+        last = self.last
+        if (last is not None and query.startswith(last[0])
+                and len(last[1]) * self.RESCAN_FRACTION < size):
+            text, size = self.joined(last[1]), len(last[1])
+        # Each character is looked for after the first occurrence of the
+        # one before it, which is all a subsequence needs; the possessive
+        # runs keep a failed line from backtracking. Both patterns start
+        # with the literal initial, which the regex engine skips to
+        part = self.PART
+        chars = [re.escape(c) for c in query]
+        subsequence = f'{part}{chars[0]}' + ''.join(f'[^{c}\\t\\n]*+{c}' for c in chars[1:])
+        matches = re.findall(f'{subsequence}[^\\t\\n]*\\t([^\\n]*)', text)
+        self.last = (query, matches)
+
+        ranked = []
+        # The words starting with the query are a run of the sorted keys
+        start = bisect.bisect_left(self.keys, query)
+        end = bisect.bisect_left(self.keys, query[:-1] + chr(ord(query[-1]) + 1), start)
+        self.add_ranked(ranked, 0, self.keys[start:min(end, start + limit)], limit)
+        if len(ranked) < limit:
+            seen = set(self.keys[start:end])
+            # Only the parts starting with a character are tried for it;
+            # the words spelled part by part are among the matches
+            parts = f'{part}{chars[0]}' + ''.join(
+                f'(?:{c}|[^\\t\\n]*?{part}{c})' for c in chars[1:])
+            if len(matches) * self.RESCAN_FRACTION < size:
+                text = self.joined(matches)
+            keys = [key for key in re.findall(f'{parts}[^\\t\\n]*\\t([^\\n]*)', text)
+                    if key not in seen]
+            seen.update(keys)
+            self.add_ranked(ranked, 1, heapq.nsmallest(limit, keys, key=len), limit)
+        if len(ranked) < limit:
+            keys = heapq.nsmallest(limit, (key for key in matches if key not in seen), key=len)
+            self.add_ranked(ranked, 2, keys, limit)
+        return ranked
+
+    def add_ranked(self, ranked, tier, keys, limit):
+        for key in keys:
+            for word in self.spellings[key]:
+                if len(ranked) == limit:
+                    return
+                ranked.append((tier, word))
+
 class CodeCompleter(QCompleter):
-    def __init__(self, parent=None):
+    """Completion popup of an editor, which hands it the words to offer
+    for each prefix ranked best first; they are shown as they are, since
+    fuzzy matches need not start with the prefix"""
+    def __init__(self, parent=None, words=()):
         super().__init__(parent)
-        self.setModel(self.get_completion_model())
-        self.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
+        self.setModel(QStringListModel(list(words)))
+        self.setModelSorting(QCompleter.UnsortedModel)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
         self.setCaseSensitivity(Qt.CaseInsensitive)
         self.setWrapAround(False)
 
-    def get_completion_model(self):
-        words = set()
-        # Add Python keywords
-        words.update(keyword.kwlist)
-        # Add Python builtins
-        words.update(dir(builtins))
-        # Add common snippets
-        snippets = [
-            "def __init__(self):",
-            "if __name__ == '__main__':",
-            "for i in range()",
-            "try:\n    \nexcept Exception as e:",
-            "class :",
-            "print()",
-            "return",
-            "import",
-            "from",
-        ]
-        words.update(snippets)
-        return QStringListModel(sorted(list(words)))
-
 # Add FindReplaceDialog for search functionality
+def document_text(document):
+    """The text of a QTextDocument, with \\n between blocks; unlike
+    toPlainText() it keeps non-breaking spaces, so it can be put back"""
+    return document.toRawText().replace('\u2029', '\n')
+
+class TextPositions:
+    """Convert between str indices into a document's text and its
+    QTextCursor positions, which count UTF-16 units"""
+    ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+
+    def __init__(self, text):
+        self.astral = [] if text.isascii() else [m.start() for m in self.ASTRAL.finditer(text)]
+        self.positions = [index + i for i, index in enumerate(self.astral)]
+
+    def position(self, index):
+        return index + bisect.bisect_left(self.astral, index)
+
+    def index(self, position):
+        return position - bisect.bisect_left(self.positions, position)
+
+def compile_search(text, regex=False, case_sensitive=False, whole_words=False):
+    """Compile find options into a Python pattern; re.error if invalid"""
+    pattern = text if regex else re.escape(text)
+    if whole_words:
+        pattern = rf'(?<!\w)(?:{pattern})(?!\w)'
+    return re.compile(pattern, re.MULTILINE | (0 if case_sensitive else re.IGNORECASE))
+
+# Matches closer than this many characters are replaced by one edit
+REPLACE_MERGE_GAP = 4096
+
+def replace_in_document(document, pattern, replacement, expand=False):
+    """Replace every match of pattern in document as a single undo step.
+
+    The text is matched in one pass and nearby matches are merged into
+    one edit, so dense matches cost a few edits and sparse ones leave
+    the text between them alone. With expand, replacement is a template
+    for match.expand() (\\1, \\g<name>). Returns the number replaced.
+    """
+    text = document_text(document)
+    edits = []  # [start, end, replacement pieces]
+    count = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        new = match.expand(replacement) if expand else replacement
+        if edits and start - edits[-1][1] <= REPLACE_MERGE_GAP:
+            edit = edits[-1]
+            edit[2].append(text[edit[1]:start])
+            edit[2].append(new)
+            edit[1] = end
+        else:
+            edits.append([start, end, [new]])
+        count += 1
+    if not edits:
+        return 0
+
+    positions = TextPositions(text)
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    # Last edit first, so the positions of the others still hold
+    for start, end, pieces in reversed(edits):
+        cursor.setPosition(positions.position(start))
+        cursor.setPosition(positions.position(end), QTextCursor.KeepAnchor)
+        cursor.insertText(''.join(pieces))
+    cursor.endEditBlock()
+    return count
+
 class FindReplaceDialog(QDialog):
+    # Typing pause, in milliseconds, before the matches are counted
+    COUNT_DELAY = 300
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
@@ -547,138 +2605,628 @@ class FindReplaceDialog(QDialog):
         options_layout = QHBoxLayout()
         self.case_sensitive = QCheckBox("Case sensitive")
         self.whole_words = QCheckBox("Whole words")
+        self.regex = QCheckBox("Regular expression")
         options_layout.addWidget(self.case_sensitive)
         options_layout.addWidget(self.whole_words)
+        options_layout.addWidget(self.regex)
+
+        # Match count preview, refreshed once typing pauses
+        self.match_count = QLabel()
+        self.count_timer = QTimer(self)
+        self.count_timer.setSingleShot(True)
+        self.count_timer.setInterval(self.COUNT_DELAY)
+        self.count_timer.timeout.connect(self.count_matches)
+        self.find_input.textChanged.connect(self.count_timer.start)
+        for option in (self.case_sensitive, self.whole_words, self.regex):
+            option.toggled.connect(self.count_timer.start)
 
         layout.addLayout(find_layout)
         layout.addLayout(replace_layout)
         layout.addLayout(options_layout)
+        layout.addWidget(self.match_count)
 
     def get_editor(self):
-        return self.parent.get_current_editor()
-
-    def find_text(self):
-        editor = self.get_editor()
-        if not editor:
-            return
+        editor = self.parent.get_current_editor()
+        # Only QTextDocument based editors can be searched from here
+        return editor if isinstance(editor, QPlainTextEdit) else None
 
+    def pattern(self):
+        """The compiled search, or None after reporting why there is none"""
         text = self.find_input.text()
         if not text:
+            self.match_count.clear()
+            return None
+        try:
+            return compile_search(text, self.regex.isChecked(),
+                                  self.case_sensitive.isChecked(), self.whole_words.isChecked())
+        except re.error as e:
+            self.match_count.setText(f"Invalid regular expression: {e}")
+            return None
+
+    def count_matches(self):
+        editor = self.get_editor()
+        pattern = self.pattern()
+        if not editor or pattern is None:
             return
+        count = sum(1 for _ in pattern.finditer(document_text(editor.document())))
+        self.match_count.setText(f"{count} match{'es' if count != 1 else ''}")
 
-        flags = QTextDocument.FindFlags()
-        if self.case_sensitive.isChecked():
-            flags |= QTextDocument.FindCaseSensitively
-        if self.whole_words.isChecked():
-            flags |= QTextDocument.FindWholeWords
+    def find_text(self):
+        editor = self.get_editor()
+        pattern = self.pattern()
+        if not editor or pattern is None:
+            return
 
-        if not editor.find(text, flags):
-            cursor = editor.textCursor()
-            cursor.movePosition(QTextCursor.Start)
-            editor.setTextCursor(cursor)
-            editor.find(text, flags)
+        text = document_text(editor.document())
+        positions = TextPositions(text)
+        # Continue after the current match, wrapping around at the end
+        start = positions.index(editor.textCursor().selectionEnd())
+        match = pattern.search(text, start)
+        if match is not None and match.end() == start:
+            # An empty match at the cursor would be found forever
+            match = pattern.search(text, start + 1) if start < len(text) else None
+        if match is None:
+            match = pattern.search(text)
+        if match is None:
+            return
+        cursor = editor.textCursor()
+        cursor.setPosition(positions.position(match.start()))
+        cursor.setPosition(positions.position(match.end()), QTextCursor.KeepAnchor)
+        editor.setTextCursor(cursor)
 
     def replace_text(self):
         editor = self.get_editor()
-        if not editor:
+        pattern = self.pattern()
+        if not editor or pattern is None:
             return
 
-        if editor.textCursor().hasSelection():
-            editor.textCursor().insertText(self.replace_input.text())
+        cursor = editor.textCursor()
+        if cursor.hasSelection():
+            # Only replace a selection the search would have found, matched
+            # where it is so word boundaries and lookarounds see its context
+            text = document_text(editor.document())
+            positions = TextPositions(text)
+            match = pattern.match(text, positions.index(cursor.selectionStart()))
+            if match is not None and match.end() == positions.index(cursor.selectionEnd()):
+                replacement = self.replace_input.text()
+                cursor.insertText(match.expand(replacement) if self.regex.isChecked() else replacement)
         self.find_text()
 
     def replace_all(self):
-        count = 0
         editor = self.get_editor()
-        if not editor:
+        pattern = self.pattern()
+        if not editor or pattern is None:
             return
 
-        cursor = editor.textCursor()
-        cursor.movePosition(QTextCursor.Start)
-        editor.setTextCursor(cursor)
-        
-        while editor.find(self.find_input.text()):
-            cursor = editor.textCursor()
-            cursor.insertText(self.replace_input.text())
-            count += 1
-        
-        QMessageBox.information(self, "Replace All", f"Replaced {count} occurrences")
+        try:
+            count = replace_in_document(editor.document(), pattern, self.replace_input.text(),
+                                        expand=self.regex.isChecked())
+        except (re.error, IndexError) as e:
+            # A template that refers to a group the pattern does not have
+            QMessageBox.warning(self, "Replace All", f"Invalid replacement: {e}")
+            return
+        self.count_matches()
+        QMessageBox.information(self, "Replace All",
+                                f"Replaced {count} occurrences; Undo reverts them all at once")
+
+# Classes of characters that take in a newline
+NEWLINE_CATEGORIES = {sre_parse.CATEGORY_SPACE, sre_parse.CATEGORY_NOT_DIGIT,
+                      sre_parse.CATEGORY_NOT_WORD, sre_parse.CATEGORY_LINEBREAK}
+
+def pattern_spans_lines(pattern):
+    """Whether a match of a compiled pattern can take in a newline or
+    depends on where the text ends (\\Z, or $ without MULTILINE), so
+    that it cannot be searched a few lines at a time"""
+    def in_set(items):
+        negate = newline = False
+        for op, argument in items:
+            if op == sre_parse.NEGATE:
+                negate = True
+            elif op == sre_parse.LITERAL:
+                newline |= argument == 10
+            elif op == sre_parse.RANGE:
+                newline |= argument[0] <= 10 <= argument[1]
+            elif op == sre_parse.CATEGORY:
+                newline |= argument in NEWLINE_CATEGORIES
+            else:
+                return True
+        return newline != negate
+
+    def walk(items, flags):
+        for op, argument in items:
+            if op == sre_parse.LITERAL:
+                spans = argument == 10
+            elif op == sre_parse.NOT_LITERAL:
+                spans = argument != 10
+            elif op == sre_parse.IN:
+                spans = in_set(argument)
+            elif op == sre_parse.CATEGORY:
+                spans = argument in NEWLINE_CATEGORIES
+            elif op == sre_parse.ANY:
+                spans = bool(flags & re.DOTALL)
+            elif op == sre_parse.AT:
+                spans = (argument == sre_parse.AT_END_STRING
+                         or argument == sre_parse.AT_END and not flags & re.MULTILINE)
+            elif op == sre_parse.SUBPATTERN:
+                _, add_flags, del_flags, sub_items = argument
+                spans = walk(sub_items, (flags | add_flags) & ~del_flags)
+            elif op == sre_parse.BRANCH:
+                spans = any(walk(branch, flags) for branch in argument[1])
+            elif op in REQUIRED_REPEATS:
+                spans = walk(argument[2], flags)
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                spans = walk(argument[1], flags)
+            elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+                spans = walk(argument, flags)
+            elif op == sre_parse.GROUPREF_EXISTS:
+                spans = walk(argument[1], flags) or bool(argument[2]) and walk(argument[2], flags)
+            else:
+                spans = False
+            if spans:
+                return True
+        return False
 
-# Add this new class for advanced code completion
-class AdvancedCodeCompleter(QCompleter):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        # Initialize snippets before using them
-        self.init_snippets()
-        self.setModel(self.create_completion_model())
-        self.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
-        self.setCaseSensitivity(Qt.CaseInsensitive)
-        self.setWrapAround(False)
-        self.setMaxVisibleItems(10)
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except re.error:
+        return True
+    return walk(parsed, parsed.state.flags)
+
+class DocumentSearchThread(WorkerThread):
+    """Find every match of a pattern in a snapshot of a document.
+
+    Matches are reported as arrays of QTextCursor start and end
+    positions, in order, every EMIT_INTERVAL seconds through
+    ``found``; ``done`` gets the total. Empty matches are skipped.
+
+    re holds the GIL for as long as it scans, which for a pattern that
+    matches nowhere is the whole text, so the text is searched WINDOW
+    characters of whole lines at a time. A match that runs into the end
+    of a window is searched again in the next one; patterns that can
+    match a newline or anchor at the end of the text (see
+    pattern_spans_lines) are searched across the text in one go.
+    """
+    found = Signal(int, object, object)
+    done = Signal(int, int)
+
+    EMIT_INTERVAL = 0.05
+    WINDOW = 1 << 16
+    # Matches between checks of the clock and of cancelled
+    CHECK_EVERY = 4096
+
+    def __init__(self, job, pieces, pattern):
+        super().__init__()
+        self.job = job
+        self.pieces = pieces
+        self.pattern = pattern
 
-    def init_snippets(self):
-        # Store snippets and their expansions
-        self.snippets = {
-            # Python snippets
-            "def": "def ${1:function_name}(${2:parameters}):\n\t${3:pass}",
-            "class": "class ${1:ClassName}:\n\tdef __init__(self):\n\t\t${2:pass}",
-            "if": "if ${1:condition}:\n\t${2:pass}",
-            "for": "for ${1:item} in ${2:items}:\n\t${3:pass}",
-            "while": "while ${1:condition}:\n\t${2:pass}",
-            "try": "try:\n\t${1:pass}\nexcept ${2:Exception} as ${3:e}:\n\t${4:pass}",
-            "with": "with ${1:expression} as ${2:variable}:\n\t${3:pass}",
-            
-            # C/C++ snippets
-            "main": "int main(int argc, char *argv[]) {\n\t${1:return 0;}\n}",
-            "inc": "#include <${1:iostream}>",
-            "using": "using namespace ${1:std};",
-            "class.h": "class ${1:ClassName} {\npublic:\n\t${2:ClassName}();\nprivate:\n\t${3}\n};",
-            "struct": "struct ${1:name} {\n\t${2}\n};",
-            "printf": 'printf("${1:%s}\\n"${2:, });',
-            "scanf": 'scanf("${1:%d}", &${2:var});',
-            "cout": 'std::cout << ${1:"Hello"} << std::endl;',
-            "cin": 'std::cin >> ${1:var};',
-            
-            # Common snippets
-            "todo": "# TODO: ${1:description}",
-            "fixme": "# FIXME: ${1:description}",
-            "debug": "print(f'Debug: ${1:variable} = {${1:variable}}')",
-            "header": "/*\n * ${1:Description}\n * Author: ${2:Name}\n * Date: ${3:Date}\n */",
-            "guard": "#ifndef ${1:HEADER_H}\n#define ${1:HEADER_H}\n\n${2}\n\n#endif // ${1:HEADER_H}",
-        }
+    def run(self):
+        text = ''.join(self.pieces).replace('\u2029', '\n')
+        size = len(text)
+        multiline = pattern_spans_lines(self.pattern)
+        starts, ends = array('q'), array('q')
+        count = 0
+        emitted = time.perf_counter()
+        position = 0
+        # Characters outside the BMP before position, which take two
+        # cursor positions each
+        astral = 0
+        window = self.WINDOW
+        while position < size:
+            end = size if multiline else text.find('\n', position + window) + 1 or size
+            positions = TextPositions(text[position:end])
+            resume = None
+            for match in self.pattern.finditer(text, position, end):
+                start, stop = match.span()
+                if stop == end < size:
+                    # It may go on past the window
+                    resume = start
+                    break
+                if start == stop:
+                    continue
+                starts.append(position + astral + positions.position(start - position))
+                ends.append(position + astral + positions.position(stop - position))
+                count += 1
+                if count % self.CHECK_EVERY == 0:
+                    if self.cancelled:
+                        return
+                    time.sleep(0)
+            if resume == position:
+                window *= 2
+                continue
+            window = self.WINDOW
+            next_position = end if resume is None else resume
+            astral += bisect.bisect_left(positions.astral, next_position - position)
+            position = next_position
+            if self.cancelled:
+                return
+            if starts and time.perf_counter() - emitted >= self.EMIT_INTERVAL:
+                self.found.emit(self.job, starts, ends)
+                starts, ends = array('q'), array('q')
+                emitted = time.perf_counter()
+            time.sleep(0)
+        if starts:
+            self.found.emit(self.job, starts, ends)
+        self.done.emit(self.job, count)
+
+class FindBar(QFrame):
+    """Incremental search shown over the top right of an editor.
+
+    Every change of the query searches a snapshot of the document on a
+    DocumentSearchThread, cancelling the search before it, and selects
+    the first match after where the search started. Only the matches
+    in the viewport are highlighted, as extra selections of the editor,
+    so the number of matches costs nothing on the GUI thread beyond the
+    arrays of their positions.
+    """
+    # Typing pause, in milliseconds, before searching
+    SEARCH_DELAY = 80
+    # Most matches highlighted at once, for very long visible lines
+    MAX_HIGHLIGHTS = 2000
 
-    def create_completion_model(self):
-        words = set()
-        
-        # Add Python keywords and builtins
-        words.update(keyword.kwlist)
-        words.update(dir(builtins))
-        
-        # Add snippet triggers
-        words.update(self.snippets.keys())
-        
-        # Add common Python modules
-        common_modules = ['os', 'sys', 'datetime', 'math', 'random', 'json', 're']
-        for module in common_modules:
-            try:
-                module_obj = __import__(module)
-                words.update(dir(module_obj))
-            except ImportError:
-                pass
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.job = 0
+        self.worker = None
+        self.snapshot = None
+        # Pieces of the document text and the revision they are of
+        self.pieces = None
+        self.revision = -1
+        self.starts = array('q')
+        self.ends = array('q')
+        self.searching = False
+        # Where the search started, and whether a match was selected yet
+        self.anchor = 0
+        self.jumped = False
+        self.highlighted = None
+        self.setup_ui()
 
-        # Add C/C++ keywords
-        cpp_keywords = {
-            'auto', 'break', 'case', 'char', 'const', 'continue', 'default', 'do',
-            'double', 'else', 'enum', 'extern', 'float', 'for', 'goto', 'if',
-            'int', 'long', 'register', 'return', 'short', 'signed', 'sizeof', 'static',
-            'struct', 'switch', 'typedef', 'union', 'unsigned', 'void', 'volatile',
-            'while', 'class', 'namespace', 'template', 'virtual', 'public', 'private',
-            'protected', 'friend', 'operator', 'explicit', 'inline', 'throw', 'try',
-            'catch', 'delete', 'new', 'this', 'using'
-        }
-        words.update(cpp_keywords)
-        
-        return QStringListModel(sorted(list(words)))
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.start_search)
+        editor.document().contentsChange.connect(self.on_contents_change)
+        editor.updateRequest.connect(self.update_highlights)
+
+    def setup_ui(self):
+        self.setStyleSheet(f"""
+            QFrame {{
+                background-color: #2D2D2D;
+                border: 1px solid {EDITOR_COLORS['comments']}40;
+                border-radius: 6px;
+            }}
+            QLineEdit {{ background: {EDITOR_COLORS['background']}; color: {EDITOR_COLORS['text']};
+                         border: 1px solid #3C3C3C; border-radius: 4px; padding: 2px 6px; }}
+            QLineEdit[missing="true"] {{ border-color: #F44747; }}
+            QLabel, QCheckBox {{ color: #CCCCCC; border: none; }}
+            QPushButton {{ color: #CCCCCC; border: none; padding: 2px 8px; }}
+            QPushButton:hover {{ background: #3C3C3C; }}
+        """)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(8, 4, 4, 4)
+        self.find_input = QLineEdit()
+        self.find_input.setPlaceholderText("Find")
+        self.find_input.setMinimumWidth(220)
+        self.find_input.textChanged.connect(self.on_query_changed)
+        self.find_input.installEventFilter(self)
+        self.case_sensitive = QCheckBox("Aa")
+        self.case_sensitive.setToolTip("Case sensitive")
+        self.whole_words = QCheckBox("Word")
+        self.whole_words.setToolTip("Whole words")
+        self.regex = QCheckBox(".*")
+        self.regex.setToolTip("Regular expression")
+        for option in (self.case_sensitive, self.whole_words, self.regex):
+            option.toggled.connect(self.on_query_changed)
+        self.count_label = QLabel()
+        self.count_label.setMinimumWidth(110)
+        previous_button = QPushButton("↑")
+        previous_button.setToolTip("Previous match (Shift+Enter)")
+        previous_button.clicked.connect(self.find_previous)
+        next_button = QPushButton("↓")
+        next_button.setToolTip("Next match (Enter)")
+        next_button.clicked.connect(self.find_next)
+        close_button = QPushButton("×")
+        close_button.setToolTip("Close (Escape)")
+        close_button.clicked.connect(self.close_bar)
+        layout.addWidget(self.find_input)
+        layout.addWidget(self.case_sensitive)
+        layout.addWidget(self.whole_words)
+        layout.addWidget(self.regex)
+        layout.addWidget(self.count_label)
+        layout.addWidget(previous_button)
+        layout.addWidget(next_button)
+        layout.addWidget(close_button)
+        self.setFocusProxy(self.find_input)
+        self.resize(self.sizeHint())
+
+    def eventFilter(self, obj, event):
+        if obj is self.find_input and event.type() == QEvent.KeyPress:
+            if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+                if event.modifiers() & Qt.ShiftModifier:
+                    self.find_previous()
+                else:
+                    self.find_next()
+                return True
+            if event.key() == Qt.Key_Escape:
+                self.close_bar()
+                return True
+        return super().eventFilter(obj, event)
+
+    def open(self):
+        """Show the bar, seeded with the editor's selection if it has one"""
+        cursor = self.editor.textCursor()
+        selected = cursor.selectedText()
+        if selected and '\u2029' not in selected:
+            self.find_input.setText(selected)
+        self.anchor = cursor.selectionStart()
+        self.place()
+        self.show()
+        self.raise_()
+        self.find_input.setFocus()
+        self.find_input.selectAll()
+        if self.find_input.text() and not self.searching and not self.starts:
+            self.start_search()
+
+    def place(self):
+        rect = self.editor.viewport().geometry()
+        self.move(rect.right() - self.width() - 16, rect.top() + 8)
+
+    def close_bar(self):
+        self.cancel_search()
+        self.hide()
+        self.clear_matches()
+        self.editor.setFocus()
+
+    def pattern(self):
+        """The compiled query, or None after showing why there is none"""
+        text = self.find_input.text()
+        if not text:
+            return None
+        try:
+            return compile_search(text, self.regex.isChecked(),
+                                  self.case_sensitive.isChecked(), self.whole_words.isChecked())
+        except re.error:
+            self.count_label.setText("Invalid pattern")
+            return None
+
+    def on_query_changed(self):
+        # The query grows from where it first matched, as in a browser
+        self.anchor = self.editor.textCursor().selectionStart()
+        self.cancel_search()
+        self.clear_matches()
+        self.search_timer.start()
+
+    def on_contents_change(self, position, removed, added):
+        # The syntax highlighter reports format changes here too; only
+        # edits of the text move the matches
+        if self.isHidden() or self.editor.document().revision() == self.revision:
+            return
+        self.pieces = None
+        self.anchor = self.editor.textCursor().selectionStart()
+        self.jumped = True  # An edit does not move the cursor to a match
+        self.cancel_search()
+        self.clear_matches(keep_jumped=True)
+        self.search_timer.start()
+
+    def cancel_search(self):
+        self.search_timer.stop()
+        self.job += 1
+        if self.worker is not None:
+            self.worker.cancelled = True
+            self.worker = None
+        if self.snapshot is not None:
+            self.snapshot.cancelled = True
+            self.snapshot = None
+        self.searching = False
+
+    def clear_matches(self, keep_jumped=False):
+        self.starts = array('q')
+        self.ends = array('q')
+        if not keep_jumped:
+            self.jumped = False
+        self.highlighted = None
+        self.editor.set_search_selections([])
+        self.set_missing(False)
+        self.count_label.clear()
+
+    def start_search(self):
+        self.cancel_search()
+        pattern = self.pattern()
+        if pattern is None or self.editor.is_loading():
+            return
+        self.searching = True
+        self.count_label.setText("Searching…")
+        job = self.job
+        document = self.editor.document()
+        if self.pieces is not None and self.revision == document.revision():
+            self.search_pieces(job, pattern, self.pieces)
+            return
+        self.revision = document.revision()
+        self.snapshot = DocumentSnapshot(document, self)
+        self.snapshot.ready.connect(lambda pieces: self.search_pieces(job, pattern, pieces))
+        self.snapshot.start()
+
+    def search_pieces(self, job, pattern, pieces):
+        if job != self.job:
+            return
+        self.snapshot = None
+        self.pieces = pieces
+        self.worker = DocumentSearchThread(job, pieces, pattern)
+        self.worker.found.connect(self.on_found)
+        self.worker.done.connect(self.on_done)
+        self.worker.start()
+
+    def on_found(self, job, starts, ends):
+        if job != self.job:
+            return
+        first = len(self.starts)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        if not self.jumped:
+            i = bisect.bisect_left(self.starts, self.anchor, first)
+            if i < len(self.starts):
+                self.select(i)
+        self.highlighted = None
+        self.update_highlights()
+        self.update_count()
+
+    def on_done(self, job, count):
+        if job != self.job:
+            return
+        self.worker = None
+        self.searching = False
+        if not self.jumped and self.starts:
+            # Nothing after where the search started: wrap around
+            self.select(0)
+        self.set_missing(not self.starts)
+        self.update_count()
+
+    def set_missing(self, missing):
+        self.find_input.setProperty('missing', missing)
+        self.find_input.style().unpolish(self.find_input)
+        self.find_input.style().polish(self.find_input)
+
+    def current(self):
+        """Index of the match selected in the editor, or -1"""
+        cursor = self.editor.textCursor()
+        i = bisect.bisect_left(self.starts, cursor.selectionStart())
+        if (i < len(self.starts) and self.starts[i] == cursor.selectionStart()
+                and self.ends[i] == cursor.selectionEnd()):
+            return i
+        return -1
+
+    def update_count(self):
+        total = len(self.starts)
+        if not total:
+            self.count_label.setText("Searching…" if self.searching else "No results")
+            return
+        more = "+" if self.searching else ""
+        i = self.current()
+        if i < 0:
+            self.count_label.setText(f"{total:,}{more} match{'es' if total != 1 or more else ''}")
+        else:
+            self.count_label.setText(f"{i + 1:,} of {total:,}{more}")
+
+    def select(self, i):
+        self.jumped = True
+        cursor = self.editor.textCursor()
+        cursor.setPosition(self.starts[i])
+        cursor.setPosition(self.ends[i], QTextCursor.KeepAnchor)
+        self.editor.setTextCursor(cursor)
+        self.editor.centerCursor()
+        self.update_count()
+
+    def find_next(self):
+        if not self.starts:
+            if not self.searching:
+                self.start_search()
+            return
+        position = self.editor.textCursor().selectionStart()
+        i = bisect.bisect_right(self.starts, position)
+        if i == len(self.starts):
+            if self.searching:
+                return  # The next match may not have been found yet
+            i = 0
+        self.select(i)
+
+    def find_previous(self):
+        if not self.starts:
+            return
+        position = self.editor.textCursor().selectionStart()
+        i = bisect.bisect_left(self.starts, position) - 1
+        if i < 0:
+            if self.searching:
+                return
+            i = len(self.starts) - 1
+        self.select(i)
+
+    def update_highlights(self, rect=None, dy=0):
+        """Highlight the matches that start in the visible blocks"""
+        if self.isHidden() or not self.starts:
+            return
+        editor = self.editor
+        first = editor.firstVisibleBlock()
+        viewport = editor.viewport()
+        last = editor.cursorForPosition(QPoint(viewport.width(), viewport.height())).block()
+        low = first.position()
+        high = last.position() + last.length()
+        i = bisect.bisect_left(self.ends, low)
+        j = min(bisect.bisect_left(self.starts, high), i + self.MAX_HIGHLIGHTS)
+        if self.highlighted == (i, j):
+            return  # Only the caret blinked, or no match came into view
+        self.highlighted = (i, j)
+        match_format = QTextCharFormat()
+        match_format.setBackground(QColor(EDITOR_COLORS['decorators'] + '55'))
+        selections = []
+        document = editor.document()
+        for start, end in zip(self.starts[i:j], self.ends[i:j]):
+            selection = QTextEdit.ExtraSelection()
+            selection.format = match_format
+            selection.cursor = QTextCursor(document)
+            selection.cursor.setPosition(start)
+            selection.cursor.setPosition(end, QTextCursor.KeepAnchor)
+            selections.append(selection)
+        editor.set_search_selections(selections)
+
+    def release(self):
+        self.cancel_search()
+
+# Add this new class for advanced code completion
+class AdvancedCodeCompleter(QCompleter):
+    # Snippet triggers and their expansions
+    SNIPPETS = {
+        # Python snippets
+        "def": "def ${1:function_name}(${2:parameters}):\n\t${3:pass}",
+        "class": "class ${1:ClassName}:\n\tdef __init__(self):\n\t\t${2:pass}",
+        "if": "if ${1:condition}:\n\t${2:pass}",
+        "for": "for ${1:item} in ${2:items}:\n\t${3:pass}",
+        "while": "while ${1:condition}:\n\t${2:pass}",
+        "try": "try:\n\t${1:pass}\nexcept ${2:Exception} as ${3:e}:\n\t${4:pass}",
+        "with": "with ${1:expression} as ${2:variable}:\n\t${3:pass}",
+        
+        # C/C++ snippets
+        "main": "int main(int argc, char *argv[]) {\n\t${1:return 0;}\n}",
+        "inc": "#include <${1:iostream}>",
+        "using": "using namespace ${1:std};",
+        "class.h": "class ${1:ClassName} {\npublic:\n\t${2:ClassName}();\nprivate:\n\t${3}\n};",
+        "struct": "struct ${1:name} {\n\t${2}\n};",
+        "printf": 'printf("${1:%s}\\n"${2:, });',
+        "scanf": 'scanf("${1:%d}", &${2:var});',
+        "cout": 'std::cout << ${1:"Hello"} << std::endl;',
+        "cin": 'std::cin >> ${1:var};',
+        
+        # Common snippets
+        "todo": "# TODO: ${1:description}",
+        "fixme": "# FIXME: ${1:description}",
+        "debug": "print(f'Debug: ${1:variable} = {${1:variable}}')",
+        "header": "/*\n * ${1:Description}\n * Author: ${2:Name}\n * Date: ${3:Date}\n */",
+        "guard": "#ifndef ${1:HEADER_H}\n#define ${1:HEADER_H}\n\n${2}\n\n#endif // ${1:HEADER_H}",
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Initialize snippets before using them
+        self.init_snippets()
+        self.setModel(self.create_completion_model())
+        self.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        self.setWrapAround(False)
+        self.setMaxVisibleItems(10)
+
+    def init_snippets(self):
+        self.snippets = self.SNIPPETS
+
+    @staticmethod
+    def vocabulary():
+        words = set(python_vocabulary())
+        words.update(AdvancedCodeCompleter.SNIPPETS)
+        words.update(CppHighlighter.KEYWORDS)
+        return words
+
+    def create_completion_model(self):
+        # Built once per process and shared by every instance
+        return Vocabulary.of(self.vocabulary).model()
 
     def get_snippet(self, trigger):
         return self.snippets.get(trigger)
@@ -688,14 +3236,16 @@ class LineNumberArea(QWidget):
     def __init__(self, editor):
         super().__init__(editor)
         self.editor = editor
+        # No background, border or padding: the paint covers them all,
+        # and with them Qt would not keep the area opaque
         self.setStyleSheet(f"""
-            background-color: {EDITOR_COLORS['background']}E6;
             color: {EDITOR_COLORS['line_numbers']};
             font-family: 'JetBrains Mono';
             font-size: 11px;
-            padding: 8px 12px;
-            border-right: 1px solid {EDITOR_COLORS['comments']}40;
         """)
+        # Every paint fills its rect, so scrolling can move the pixels
+        # already there and paint only the rows scrolled into view
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
 
     def sizeHint(self):
         return QSize(self.editor.lineNumberAreaWidth(), 0)
@@ -703,33 +3253,435 @@ class LineNumberArea(QWidget):
     def paintEvent(self, event):
         self.editor.lineNumberAreaPaintEvent(event)
 
+    def mousePressEvent(self, event):
+        self.editor.lineNumberAreaMousePressEvent(event)
+
+class GutterRenderer:
+    """Paints the line numbers of a QPlainTextEdit into its LineNumberArea.
+
+    Numbers are drawn from Qt's glyph cache at a point worked out from
+    the digit advance, with the pen and background made once, so a
+    paint lays out no text and only covers the rows Qt asks for. The
+    editor asks for a repaint of the whole viewport on most changes;
+    the gutter only follows when the numbers on screen moved or were
+    renumbered. The width only changes with the number of digits.
+
+    With folding, a column right of the numbers holds a marker for every
+    region of the FoldIndex in folds; clicking it is up to the editor.
+    """
+    def __init__(self, editor, background, foreground, folding=False):
+        self.editor = editor
+        self.background = QColor(background)
+        self.pen = QPen(QColor(foreground))
+        self.folding = folding
+        self.folds = None
+        # Digit advance and ascent of the font with key font_key
+        self.font_metrics = None
+        self.font_key = None
+        self.width_key = None
+        self.painted = None
+
+    def width(self, lines):
+        digits = len(str(max(1, lines)))
+        return 3 + self.editor.fontMetrics().horizontalAdvance('9') * digits + self.marker_width()
+
+    def marker_width(self):
+        return 2 * self.editor.fontMetrics().horizontalAdvance('9') if self.folding else 0
+
+    def width_changed(self, lines):
+        """Whether the width for lines differs from that of the last call"""
+        key = (len(str(max(1, lines))), self.editor.font().key())
+        if key == self.width_key:
+            return False
+        self.width_key = key
+        return True
+
+    def state(self):
+        """What the numbers on screen depend on, besides scrolling"""
+        editor = self.editor
+        return (editor.blockCount(), editor.document().documentLayout().documentSize().height(),
+                self.folds.revision if self.folds is not None else 0)
+
+    def update_request(self, area, rect, dy):
+        """Repaint area for an updateRequest(rect, dy) of the editor"""
+        if dy:
+            # Every scroll comes with its dy: the rows already painted are
+            # moved and only those scrolled into view get painted
+            area.scroll(0, dy)
+        elif self.state() != self.painted:
+            area.update(0, rect.y(), area.width(), rect.height())
+
+    def metrics(self, font):
+        """Digit advance and ascent of font"""
+        if font.key() != self.font_key:
+            metrics = QFontMetricsF(font)
+            self.font_metrics = metrics.horizontalAdvance('0'), metrics.ascent()
+            self.font_key = font.key()
+        return self.font_metrics
+
+    def paint(self, area, event):
+        editor = self.editor
+        rect = event.rect()
+        self.painted = self.state()
+        painter = QPainter(area)
+        painter.fillRect(rect, self.background)
+        painter.setPen(self.pen)
+        advance, ascent = self.metrics(painter.font())
+        marker = self.marker_width()
+        width = area.width() - marker
+        folds = self.folds
+
+        block = editor.firstVisibleBlock()
+        if rect.top() > 0:
+            # Start at the first dirty row instead of walking down to it
+            block = editor.cursorForPosition(QPoint(0, rect.top())).block()
+        number = block.blockNumber()
+        top = editor.blockBoundingGeometry(block).translated(editor.contentOffset()).top()
+        while block.isValid() and top <= rect.bottom():
+            height = editor.blockBoundingRect(block).height()
+            if block.isVisible() and top + height >= rect.top():
+                digits = str(number + 1)
+                painter.drawText(QPointF(width - len(digits) * advance, top + ascent), digits)
+                if folds is not None and (folds.folded[number] or folds.is_start(number)):
+                    self.paint_marker(painter, width + marker / 2, top + ascent / 2 + 2,
+                                      marker / 4, folds.folded[number])
+            block = block.next()
+            top += height
+            number += 1
+
+    def paint_marker(self, painter, x, y, size, folded):
+        """A triangle around (x, y), pointing right when folded, else down"""
+        if folded:
+            points = [QPointF(x - size / 2, y - size), QPointF(x + size / 2, y),
+                      QPointF(x - size / 2, y + size)]
+        else:
+            points = [QPointF(x - size, y - size / 2), QPointF(x + size, y - size / 2),
+                      QPointF(x, y + size / 2)]
+        painter.save()
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.pen.color())
+        painter.drawPolygon(QPolygonF(points))
+        painter.restore()
+
+class Minimap(QWidget):
+    """Overview of a QPlainTextEdit's document, one pixel row per line.
+
+    Every character is a pixel, colored from the format spans the
+    highlighter keeps per block. Only the rows on screen are kept, as
+    ARGB pixels together with the cache entry they were drawn from, so
+    memory follows the number of lines and not the size of the text. A
+    row is drawn again only when contentsChange touched its line or the
+    highlighter replaced its spans. Documents taller than the minimap
+    scroll along with the editor. Click to jump, drag to scroll.
+    """
+    # Columns shown, one pixel each
+    WIDTH = 100
+    # Opacity of the text pixels over the minimap background
+    ALPHA = 0xB0
+    WHITESPACE = re.compile(r'\s+')
+
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.setFixedWidth(self.WIDTH)
+        self.background = QColor(EDITOR_COLORS['background']).darker(110)
+        self.slider_color = QColor(255, 255, 255, 28)
+        self.text_pixel = self.pixel(QColor(EDITOR_COLORS['text']))
+        self.blank = bytes(4 * self.WIDTH)
+        self.tab_size = 4
+        # (cache entry, pixels) per row shown; None where it must be drawn
+        self.rows = []
+        self.first_line = 0
+        self.line_count = editor.blockCount()
+        # The rows joined into one image, with the (first, shown) it is for
+        self.pixels = b''
+        self.image = None
+        self.image_key = None
+        self.highlighter = None
+        self.colors = []
+        self.drag = None
+        document = editor.document()
+        document.contentsChange.connect(self.on_contents_change)
+        # Also emitted when the highlighter formats lines off screen
+        document.documentLayout().update.connect(self.on_layout_update)
+        editor.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+    def pixel(self, color):
+        """Premultiplied ARGB32 bytes of color, faded to ALPHA"""
+        alpha = self.ALPHA
+        return bytes((color.blue() * alpha // 255, color.green() * alpha // 255,
+                      color.red() * alpha // 255, alpha))
+
+    def format_pixels(self, highlighter):
+        pixels = []
+        for text_format in highlighter.format_table:
+            brush = text_format.foreground()
+            pixels.append(self.text_pixel if brush.style() == Qt.NoBrush
+                          else self.pixel(brush.color()))
+        return pixels
+
+    def visible_lines(self):
+        editor = self.editor
+        return max(1, editor.viewport().height() // max(1, editor.fontMetrics().height()))
+
+    def window(self):
+        """First line shown, following the editor's scroll position"""
+        count = self.editor.blockCount()
+        rows = self.height()
+        if count <= rows:
+            return 0
+        top = self.editor.firstVisibleBlock().blockNumber()
+        first = top * (count - rows) // max(1, count - self.visible_lines())
+        return min(first, count - rows)
+
+    def on_contents_change(self, position, removed, added):
+        document = self.editor.document()
+        count = document.blockCount()
+        first = document.findBlock(position).blockNumber()
+        last_block = document.findBlock(position + added)
+        last = last_block.blockNumber() if last_block.isValid() else count - 1
+        new_count = last - first + 1
+        old_count = new_count - (count - self.line_count)
+        self.line_count = count
+        start = first - self.first_line
+        if start < 0:
+            if old_count != new_count:
+                # Lines above the rows shown moved all of them
+                self.rows.clear()
+                self.update()
+                return
+            new_count = old_count = new_count + start
+            start = 0
+        if new_count > 0 and start < len(self.rows):
+            self.rows[start:start + old_count] = [None] * new_count
+        self.update()
+
+    def on_layout_update(self, rect):
+        self.update()
+
+    def on_scroll(self, value):
+        self.update()
+
+    def scroll_rows(self, first):
+        """Keep the rows drawn when the lines shown start at first"""
+        shift = first - self.first_line
+        self.first_line = first
+        rows = self.rows
+        if abs(shift) >= len(rows):
+            rows.clear()
+        elif shift > 0:
+            del rows[:shift]
+        elif shift < 0:
+            rows[:0] = [None] * -shift
+
+    def draw_row(self, text, entry):
+        """ARGB32 pixels of one line: text color, then its spans' colors"""
+        width = self.WIDTH
+        row = bytearray(self.blank)
+        tabs = '\t' in text
+        line = text.expandtabs(self.tab_size) if tabs else text
+        end = min(len(line), width)
+        row[:4 * end] = self.text_pixel * end
+        if entry is not None:
+            spans = entry[0]
+            colors = self.colors
+            for i in range(0, len(spans), 3):
+                start = spans[i]
+                stop = start + spans[i + 1]
+                if tabs:
+                    start = len(text[:start].expandtabs(self.tab_size))
+                    stop = len(text[:stop].expandtabs(self.tab_size))
+                stop = min(stop, end)
+                if start < stop:
+                    row[4 * start:4 * stop] = colors[spans[i + 2]] * (stop - start)
+        for match in self.WHITESPACE.finditer(line, 0, end):
+            row[4 * match.start():4 * match.end()] = self.blank[:4 * (match.end() - match.start())]
+        return row
+
+    def paintEvent(self, event):
+        editor = self.editor
+        document = editor.document()
+        highlighter = editor.highlighter
+        if highlighter is not self.highlighter:
+            self.highlighter = highlighter
+            self.colors = self.format_pixels(highlighter) if highlighter is not None else []
+            self.rows.clear()
+        cache = highlighter.block_cache if highlighter is not None else []
+        self.tab_size = max(1, round(editor.tabStopDistance()
+                                     / max(1, editor.fontMetrics().horizontalAdvance(' '))))
+
+        first = self.window()
+        self.scroll_rows(first)
+        shown = max(0, min(self.height(), document.blockCount() - first))
+        rows = self.rows
+        del rows[shown:]
+        rows.extend([None] * (shown - len(rows)))
+        block = None
+        block_line = -1
+        for i in range(shown):
+            line = first + i
+            entry = cache[line] if line < len(cache) else None
+            row = rows[i]
+            if row is not None and row[0] is entry:
+                continue
+            if line != block_line:
+                block = document.findBlockByNumber(line)
+            rows[i] = (entry, self.draw_row(block.text(), entry))
+            block = block.next()
+            block_line = line + 1
+        if block is not None or self.image_key != (first, shown):
+            self.image_key = (first, shown)
+            self.pixels = b''.join(row[1] for row in rows)
+            self.image = QImage(self.pixels, self.WIDTH, shown, 4 * self.WIDTH,
+                                QImage.Format_ARGB32_Premultiplied)
+
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), self.background)
+        if shown:
+            painter.drawImage(0, 0, self.image)
+        top = editor.firstVisibleBlock().blockNumber() - first
+        painter.fillRect(0, top, self.width(), self.visible_lines(), self.slider_color)
+        painter.end()
+
+    def scroll_to(self, line):
+        """Scroll the editor so that line is at its top"""
+        document = self.editor.document()
+        block = document.findBlockByNumber(max(0, min(line, document.blockCount() - 1)))
+        self.editor.verticalScrollBar().setValue(block.firstLineNumber())
+
+    def mousePressEvent(self, event):
+        if event.button() != Qt.LeftButton:
+            super().mousePressEvent(event)
+            return
+        y = int(event.position().y())
+        lines = self.visible_lines()
+        top = self.editor.firstVisibleBlock().blockNumber() - self.first_line
+        if not top <= y < top + lines:
+            # Clicking off the slider centers the line under the mouse
+            self.scroll_to(self.first_line + y - lines // 2)
+        self.drag = (y, self.editor.firstVisibleBlock().blockNumber())
+
+    def mouseMoveEvent(self, event):
+        if self.drag is None:
+            return
+        y, top = self.drag
+        dy = int(event.position().y()) - y
+        count = self.editor.blockCount()
+        rows = self.height()
+        if count > rows:
+            # The slider crosses the minimap while the editor crosses
+            # the whole document
+            lines = self.visible_lines()
+            dy = dy * (count - lines) // max(1, rows - lines)
+        self.scroll_to(top + dy)
+
+    def mouseReleaseEvent(self, event):
+        self.drag = None
+
+    def wheelEvent(self, event):
+        self.editor.wheelEvent(event)
+
+class LoadProgress(QFrame):
+    """Progress bar and cancel button shown over an editor while it loads"""
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.setStyleSheet(f"""
+            QFrame {{
+                background-color: #2D2D2D;
+                border: 1px solid {EDITOR_COLORS['comments']}40;
+                border-radius: 6px;
+            }}
+            QProgressBar {{
+                border: none;
+                background: {EDITOR_COLORS['background']};
+                color: {EDITOR_COLORS['text']};
+                text-align: center;
+                max-height: 14px;
+            }}
+            QProgressBar::chunk {{ background: {EDITOR_COLORS['comments']}; }}
+            QPushButton {{ color: #CCCCCC; border: none; padding: 2px 8px; }}
+            QPushButton:hover {{ background: #3C3C3C; }}
+        """)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(8, 4, 4, 4)
+        self.bar = QProgressBar()
+        self.bar.setRange(0, 1000)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(editor.cancel_loading)
+        layout.addWidget(QLabel("Loading"))
+        layout.addWidget(self.bar)
+        layout.addWidget(self.cancel_button)
+        self.resize(320, self.sizeHint().height())
+
+    def set_progress(self, done, total):
+        self.bar.setValue(done * 1000 // max(1, total))
+
 # Then update GlassmorphicCodeEditor to include line number methods
 class GlassmorphicCodeEditor(QPlainTextEdit):
-    def __init__(self, parent=None):
+    # Default for the lazy_highlight_lines setting
+    LAZY_HIGHLIGHT_LINES = 20000
+    # Most words offered for one completion prefix
+    MAX_COMPLETIONS = 100
+    # Milliseconds of typing pause before completing the word
+    COMPLETION_DELAY = 30
+    # Keystroke to popup latencies kept for completion_latency
+    LATENCY_SAMPLES = 200
+    # GUI time per slice spent inserting a file that is being loaded
+    LOAD_SLICE = 0.005
+    # Seconds between repaints of the text while it loads
+    LOAD_REPAINT = 0.1
+
+    # Emitted when loading is cancelled or fails; the tab should close
+    load_aborted = Signal()
+    # Emitted once a file has finished loading and can be edited
+    loaded = Signal()
+
+    def __init__(self, parent=None, file_path=None):
         super().__init__(parent)
+        self.loader = None
+        self.load_progress = None
+        self.encoding = 'utf-8'
+        # Line break written in place of each \n when saving
+        self.newline = '\n'
+        # Created by show_find_bar(); its matches in the viewport
+        self.find_bar = None
+        self.search_selections = []
+        # Line numbers the gutter is kept wide enough for
+        self.reserved_lines = 0
         self.setup_editor()
         self.setup_drag_drop()
         self.setup_completer()
+        self.setup_minimap()
         self.setup_line_numbers()
-        self.setup_syntax_highlighter()
+        self.setup_syntax_highlighter(file_path)
 
     def lineNumberAreaWidth(self):
-        digits = 1
-        max_num = max(1, self.blockCount())
-        while max_num >= 10:
-            max_num //= 10
-            digits += 1
-        space = 3 + self.fontMetrics().horizontalAdvance('9') * digits
-        return space
+        return self.gutter.width(max(self.blockCount(), self.reserved_lines))
 
     def updateLineNumberAreaWidth(self, _):
-        self.setViewportMargins(self.lineNumberAreaWidth(), 0, 0, 0)
+        # New margins re-lay out the whole document, so only set them
+        # when the number of digits changes
+        if not self.gutter.width_changed(max(self.blockCount(), self.reserved_lines)):
+            return
+        self.update_viewport_margins()
+
+    def update_viewport_margins(self):
+        width = self.lineNumberAreaWidth()
+        self.setViewportMargins(width, 0, 0 if self.minimap.isHidden() else self.minimap.width(), 0)
+        cr = self.contentsRect()
+        self.line_number_area.setGeometry(QRect(cr.left(), cr.top(), width, cr.height()))
+        self.place_minimap()
+
+    def place_minimap(self):
+        rect = self.viewport().geometry()
+        self.minimap.setGeometry(QRect(rect.right() + 1, rect.top(), self.minimap.width(), rect.height()))
+
+    def set_minimap_visible(self, visible):
+        self.minimap.setVisible(visible)
+        self.update_viewport_margins()
 
     def updateLineNumberArea(self, rect, dy):
-        if dy:
-            self.line_number_area.scroll(0, dy)
-        else:
-            self.line_number_area.update(0, rect.y(), self.line_number_area.width(), rect.height())
+        self.gutter.update_request(self.line_number_area, rect, dy)
         if rect.contains(self.viewport().rect()):
             self.updateLineNumberAreaWidth(0)
 
@@ -737,30 +3689,25 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
         super().resizeEvent(event)
         cr = self.contentsRect()
         self.line_number_area.setGeometry(QRect(cr.left(), cr.top(), self.lineNumberAreaWidth(), cr.height()))
+        self.place_minimap()
+        self.place_load_progress()
+        if self.find_bar is not None:
+            self.find_bar.place()
 
     def lineNumberAreaPaintEvent(self, event):
-        painter = QPainter(self.line_number_area)
-        painter.fillRect(event.rect(), QColor(EDITOR_COLORS['background']))
+        self.gutter.paint(self.line_number_area, event)
 
-        block = self.firstVisibleBlock()
-        block_number = block.blockNumber()
-        offset = self.contentOffset()
-        top = self.blockBoundingGeometry(block).translated(offset).top()
-        bottom = top + self.blockBoundingRect(block).height()
-
-        while block.isValid() and top <= event.rect().bottom():
-            if block.isVisible() and bottom >= event.rect().top():
-                number = str(block_number + 1)
-                painter.setPen(QColor(EDITOR_COLORS['line_numbers']))
-                painter.drawText(0, int(top), self.line_number_area.width(),
-                               self.fontMetrics().height(),
-                               Qt.AlignRight, number)
-            block = block.next()
-            top = bottom
-            bottom = top + self.blockBoundingRect(block).height()
-            block_number += 1
+    def lineNumberAreaMousePressEvent(self, event):
+        # Clicks on the fold markers' column fold or unfold that line
+        if self.folds is None or event.button() != Qt.LeftButton:
+            return
+        x, y = event.position().x(), int(event.position().y())
+        if x >= self.line_number_area.width() - self.gutter.marker_width():
+            self.toggle_fold(self.cursorForPosition(QPoint(0, y)).blockNumber(), enclosing=False)
 
     def setup_line_numbers(self):
+        self.gutter = GutterRenderer(self, EDITOR_COLORS['background'], EDITOR_COLORS['line_numbers'],
+                                     folding=True)
         self.line_number_area = LineNumberArea(self)
         self.blockCountChanged.connect(self.updateLineNumberAreaWidth)
         self.updateRequest.connect(self.updateLineNumberArea)
@@ -826,6 +3773,164 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
             }}
         """)
 
+    def load_file(self, file_path):
+        """Load file_path in the background, streaming it into the document.
+
+        The editor is read-only until the whole file is in; highlighting
+        starts once it is, so the partial text is never highlighted.
+        """
+        self.setReadOnly(True)
+        self.document().setUndoRedoEnabled(False)
+        self.set_highlighter(None)
+        self.load_queue = deque()
+        self.load_size = os.path.getsize(file_path)
+        self.load_cursor = QTextCursor(self.document())
+        self.load_piece = 1 << 14
+        self.load_encoding = None
+        self.load_painted = 0
+
+        self.load_progress = LoadProgress(self)
+        self.place_load_progress()
+        self.load_progress.show()
+
+        self.load_timer = QTimer(self)
+        self.load_timer.setInterval(0)
+        self.load_timer.timeout.connect(self.insert_loaded_text)
+
+        self.loader = FileLoaderThread(file_path)
+        self.loader.chunk_ready.connect(self.on_chunk_loaded)
+        self.loader.progress.connect(self.load_progress.set_progress)
+        self.loader.restarted.connect(self.on_load_restarted)
+        self.loader.done.connect(self.on_load_done)
+        self.loader.failed.connect(self.on_load_failed)
+        self.loader.start()
+
+    def is_loading(self):
+        return self.loader is not None
+
+    def show_find_bar(self):
+        if self.find_bar is None:
+            self.find_bar = FindBar(self)
+        self.find_bar.open()
+
+    def set_search_selections(self, selections):
+        """Show selections, the highlighted matches of the find bar"""
+        self.search_selections = selections
+        self.highlightCurrentLine()
+
+    def place_load_progress(self):
+        if self.load_progress is not None:
+            rect = self.contentsRect()
+            self.load_progress.move(rect.right() - self.load_progress.width() - 16, rect.top() + 8)
+
+    def on_chunk_loaded(self, text):
+        if not self.reserved_lines:
+            # Every change of the gutter width re-lays out the whole
+            # document, so make room for the line count of the full file,
+            # guessed from the first chunk, up front
+            lines_per_char = (text.count('\n') + 1) / len(text)
+            self.reserved_lines = int(self.load_size * lines_per_char * 1.25) + 1
+            self.updateLineNumberAreaWidth(0)
+        self.load_queue.append(text)
+        self.load_timer.start()
+
+    def insert_loaded_text(self):
+        """Insert queued text for at most LOAD_SLICE, in pieces sized so
+        that one piece takes about half a slice"""
+        # Repainting costs about as much as inserting, while text appended
+        # below the viewport hardly changes what is on screen: repaint
+        # every LOAD_REPAINT, in a pass of the event loop of its own
+        now = time.perf_counter()
+        if now - self.load_painted >= self.LOAD_REPAINT:
+            self.load_painted = now
+            self.set_text_updates(True)
+            return
+        self.set_text_updates(False)
+        deadline = now + self.LOAD_SLICE
+        while self.load_queue and time.perf_counter() < deadline:
+            text = self.load_queue.popleft()
+            piece, rest = text[:self.load_piece], text[self.load_piece:]
+            if rest:
+                self.load_queue.appendleft(rest)
+            else:
+                self.loader.consumed()
+            start = time.perf_counter()
+            self.load_cursor.insertText(piece)
+            elapsed = time.perf_counter() - start
+            if len(piece) == self.load_piece:
+                scale = self.LOAD_SLICE / 2 / max(elapsed, 1e-6)
+                self.load_piece = int(min(max(self.load_piece * min(scale, 2.0), 1 << 10), 1 << 20))
+        # Loading is not an edit: closing the tab must not offer to save
+        self.document().setModified(False)
+        if not self.load_queue:
+            self.load_timer.stop()
+            if self.load_encoding is not None:
+                self.finish_loading()
+
+    def set_text_updates(self, enabled):
+        # Enabling updates again repaints the text, the line numbers
+        # and the minimap
+        self.viewport().setUpdatesEnabled(enabled)
+        self.line_number_area.setUpdatesEnabled(enabled)
+        self.minimap.setUpdatesEnabled(enabled)
+
+    def on_load_restarted(self):
+        # The file is read again in another encoding, from the start
+        self.load_queue.clear()
+        self.document().clear()
+        self.load_cursor = QTextCursor(self.document())
+
+    def on_load_done(self, encoding, newline):
+        self.load_encoding = encoding
+        self.newline = newline
+        if not self.load_queue:
+            self.finish_loading()
+
+    def finish_loading(self):
+        self.loader = None
+        self.encoding = self.load_encoding
+        self.load_cursor = None
+        self.load_progress.deleteLater()
+        self.load_progress = None
+        self.set_text_updates(True)
+        self.document().setUndoRedoEnabled(True)
+        self.document().setModified(False)
+        self.setReadOnly(False)
+        self.set_highlighter(self.language.highlighter if self.language else None)
+        self.loaded.emit()
+
+    def on_load_failed(self, message):
+        self.cancel_loading()
+        QMessageBox.critical(self, "Error", f"Could not open file: {message}")
+
+    def cancel_loading(self):
+        """Stop loading; the partly loaded document is thrown away"""
+        if self.loader is None:
+            return
+        self.loader.cancelled = True
+        self.loader = None
+        self.load_timer.stop()
+        self.load_queue.clear()
+        self.set_text_updates(True)
+        self.load_progress.deleteLater()
+        self.load_progress = None
+        self.load_aborted.emit()
+
+    def release(self):
+        """Stop loading, highlighting, folding and completion, and delete
+        the editor, whose tab was closed"""
+        self.cancel_loading()
+        self.completion_timer.stop()
+        self.completion_job = None
+        if self.find_bar is not None:
+            self.find_bar.release()
+        self.set_highlighter(None)
+        self.set_folding(None)
+        if self.identifiers is not None:
+            self.identifiers.release()
+            self.identifiers = None
+        self.deleteLater()
+
     def setup_drag_drop(self):
         """Setup drag and drop support"""
         self.setAcceptDrops(True)
@@ -859,53 +3964,39 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
         event.acceptProposedAction()
 
     def setup_completer(self):
-        self.completer = CodeCompleter(self)
-        self.completer.setWidget(self)
-        self.completer.activated.connect(self.insert_completion)
-        
-        # Enhanced word list
-        words = set()
-        words.update(keyword.kwlist)  # Python keywords
-        words.update(dir(builtins))   # Python builtins
-        
-        # Add common Python modules
-        common_modules = ['os', 'sys', 'datetime', 'math', 'random', 'json', 're', 'time']
-        for module in common_modules:
-            try:
-                module_obj = __import__(module)
-                words.update(dir(module_obj))
-            except ImportError:
-                pass
-        
-        # Add code snippets
-        snippets = [
-            "def __init__(self):",
-            "if __name__ == '__main__':",
-            "try:\n    \nexcept Exception as e:",
-            "for i in range():",
-            "while True:",
-            "class ClassName:",
-            "def function_name():",
-            "import ",
-            "from  import ",
-            "print()",
-            "return ",
-            "raise Exception",
-            "with open() as f:",
-        ]
-        words.update(snippets)
-        
-        self.completer.model().setStringList(sorted(list(words)))
+        # The identifier index is made by set_file_type(), for files of a
+        # known language, and the popup by get_completer()
+        self.completer = None
+        self.identifiers = None
+        # Words are ranked by a CompletionThread once typing pauses;
+        # only the last one's are shown, if the text is still the same
+        self.completion_job = None
+        self.completion_timer = QTimer(self)
+        self.completion_timer.setSingleShot(True)
+        self.completion_timer.setInterval(self.COMPLETION_DELAY)
+        self.completion_timer.timeout.connect(self.request_completion)
+        # Where the shown popup was put: the start of its word, and rows
+        self.completion_anchor = None
+        # perf_counter() of the last keystroke to complete, and the seconds
+        # from each such keystroke to its popup, newest last
+        self.keystroke_time = None
+        self.completion_latency = deque(maxlen=self.LATENCY_SAMPLES)
 
     def insert_completion(self, completion):
+        # Fuzzy matches need not start with what was typed, so the whole
+        # word is replaced
         tc = self.textCursor()
-        extra = len(completion) - len(self.completer.completionPrefix())
-        tc.movePosition(QTextCursor.Left)
-        tc.movePosition(QTextCursor.EndOfWord)
-        tc.insertText(completion[-extra:])
+        tc.select(QTextCursor.WordUnderCursor)
+        tc.insertText(completion)
         self.setTextCursor(tc)
 
     def keyPressEvent(self, event):
+        keystroke_time = time.perf_counter()
+        if self.isReadOnly():
+            # Auto-indent and friends edit through cursors, which ignore
+            # the read-only flag of a file that is still loading
+            super().keyPressEvent(event)
+            return
         if self.completer and self.completer.popup().isVisible():
             if event.key() in (Qt.Key_Enter, Qt.Key_Return, Qt.Key_Escape, Qt.Key_Tab, Qt.Key_Backtab):
                 event.ignore()
@@ -919,8 +4010,8 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
             indent = re.match(r'^\s*', text).group()
             
             # Check if we need to increase indent
-            if text.strip().endswith(':'):
-                indent += '    '
+            if text.strip().endswith((':', '{')):
+                indent += self.indent_unit
                 
             super().keyPressEvent(event)
             self.insertPlainText(indent)
@@ -932,7 +4023,7 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
             if tc.hasSelection():
                 self.indent_selection()
             else:
-                self.insertPlainText('    ')
+                self.insertPlainText(self.indent_unit)
             return
             
         # Auto-close brackets and quotes
@@ -949,18 +4040,10 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
             
         super().keyPressEvent(event)
         
-        # Show completer
-        if event.text().isalnum() or event.text() == '_':
-            completion_prefix = self.text_under_cursor()
-            if len(completion_prefix) >= 2:
-                self.completer.setCompletionPrefix(completion_prefix)
-                popup = self.completer.popup()
-                popup.setCurrentIndex(self.completer.completionModel().index(0, 0))
-                
-                cr = self.cursorRect()
-                cr.setWidth(self.completer.popup().sizeHintForColumn(0)
-                          + self.completer.popup().verticalScrollBar().sizeHint().width())
-                self.completer.complete(cr)
+        # Show completer, once typing pauses
+        if self.identifiers is not None and (event.text().isalnum() or event.text() == '_'):
+            self.keystroke_time = keystroke_time
+            self.completion_timer.start()
 
     def text_under_cursor(self):
         tc = self.textCursor()
@@ -978,18 +4061,200 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
         tc.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
         
         selected_text = tc.selectedText()
-        indented_text = '    ' + selected_text.replace('\u2029', '\n    ')
+        indent = self.indent_unit
+        indented_text = indent + selected_text.replace('\u2029', '\n' + indent)
         tc.insertText(indented_text)
 
-    def setup_syntax_highlighter(self):
-        highlighter = PythonHighlighter(self.document())
+    def setup_syntax_highlighter(self, file_path=None):
+        self.highlighter = None
+        self.folds = None
+        self.language = None
+        self.indent_unit = '    '
+        self.set_file_type(file_path)
+        self.updateRequest.connect(self.update_visible_blocks)
+        self.cursorPositionChanged.connect(self.reveal_cursor)
+
+    def set_file_type(self, file_path):
+        """Switch highlighting, completion and indentation to file_path's language"""
+        language = language_for_path(file_path)
+        if language is self.language:
+            return
+        self.language = language
+        self.set_highlighter(language.highlighter if language else None)
+        self.set_folding(language.folding if language else None)
+        self.indent_unit = language.indent if language else '    '
+
+        if self.identifiers is not None:
+            self.identifiers.release()
+            self.identifiers = None
+        if language is None:
+            return  # Plain text gets no completion at all
+        self.identifiers = IdentifierIndex(self.document())
+
+    def get_completer(self):
+        """The completion popup, created the first time it is shown"""
+        if self.completer is None:
+            self.completer = CodeCompleter(self)
+            self.completer.setWidget(self)
+            self.completer.activated.connect(self.insert_completion)
+        return self.completer
+
+    def project_symbols(self):
+        """The FuzzyMatcher of the names defined in this Python file's
+        project, if it is indexed"""
+        if self.language is None or self.language.name != 'Python':
+            return None
+        return SymbolIndex.matcher_for(getattr(self, 'current_file', None))
+
+    def request_completion(self):
+        """Rank the completions of the word under the cursor on a worker"""
+        if self.identifiers is None:
+            return
+        prefix = self.text_under_cursor()
+        if len(prefix) < 2:
+            self.completion_job = None
+            if self.completer is not None:
+                self.completer.popup().hide()
+            return
+        snapshot = self.identifiers.snapshot(prefix, self.textCursor().position())
+        # A job still running is left to finish; its words are dropped
+        self.completion_job = CompletionThread(snapshot, self.language.vocabulary(),
+                                               self.MAX_COMPLETIONS, self.project_symbols())
+        self.completion_job.done.connect(self.on_completion_done)
+        self.completion_job.start()
+
+    def on_completion_done(self, words):
+        job = self.sender()
+        snapshot = job.snapshot
+        if self.identifiers is not None:
+            self.identifiers.rematched(snapshot)
+        if job is not self.completion_job:
+            return
+        self.completion_job = None
+        if (snapshot.revision != self.document().revision()
+                or snapshot.position != self.textCursor().position()):
+            return  # Typed on, or moved away, since the snapshot
+        self.show_completions(snapshot.prefix, words)
+
+    def show_completions(self, prefix, words):
+        if not words:
+            if self.completer is not None:
+                self.completer.popup().hide()
+            return
+        completer = self.get_completer()
+        completer.model().setStringList(words)
+        completer.setCompletionPrefix(prefix)
+        popup = completer.popup()
+        popup.setCurrentIndex(completer.completionModel().index(0, 0))
+
+        # The popup stays put while its word is typed, unless it has to
+        # grow or shrink; measuring every row is left for when it moves
+        cursor = self.textCursor()
+        anchor = (cursor.position() - len(prefix), min(len(words), completer.maxVisibleItems()))
+        scroll_bar = popup.verticalScrollBar().sizeHint().width()
+        width = popup.fontMetrics().horizontalAdvance(max(words, key=len)) + scroll_bar
+        if not popup.isVisible() or anchor != self.completion_anchor or width > popup.width():
+            cursor.setPosition(anchor[0])
+            cr = self.cursorRect(cursor)
+            cr.setWidth(max(width, popup.sizeHintForColumn(0) + scroll_bar))
+            completer.complete(cr)
+            self.completion_anchor = anchor
+        if self.keystroke_time is not None:
+            self.completion_latency.append(time.perf_counter() - self.keystroke_time)
+            self.keystroke_time = None
+
+    def set_highlighter(self, highlighter_class):
+        """Attach highlighter_class, replacing the current highlighter"""
+        # Exactly one highlighter per document: every extra one would
+        # re-highlight each keystroke again
+        if type(self.highlighter) is highlighter_class:
+            return
+        if self.highlighter is not None:
+            self.highlighter.release()
+            self.highlighter = None
+        if highlighter_class is not None:
+            settings = self.highlighter_settings()
+            self.highlighter = highlighter_class(
+                self.document(), threaded=True,
+                lazy_threshold=settings.get('lazy_highlight_lines', self.LAZY_HIGHLIGHT_LINES),
+                semantic=settings.get('semantic_highlighting', True))
+            self.update_visible_blocks()
+
+    def set_folding(self, folding_class):
+        """Fold with folding_class, a FoldIndex subclass, or not at all"""
+        if self.folds is not None:
+            self.folds.release()
+        self.folds = folding_class(self.document()) if folding_class else None
+        self.gutter.folds = self.folds
+        self.line_number_area.update()
+
+    def toggle_fold(self, number=None, enclosing=True):
+        """Fold or unfold the region starting at block number, by default
+        the cursor's; with enclosing, a line that starts no region folds
+        the region it is in"""
+        folds = self.folds
+        if folds is None:
+            return
+        if number is None:
+            number = self.textCursor().blockNumber()
+        if folds.folded[number]:
+            folds.unfold(number)
+            return
+        if not folds.fold(number) and enclosing:
+            number = folds.enclosing(number)
+            if number is None or not folds.fold(number):
+                return
+        self.move_out_of_folds()
+
+    def fold_all(self):
+        if self.folds is not None:
+            self.folds.fold_all()
+            self.move_out_of_folds()
+
+    def unfold_all(self):
+        if self.folds is not None:
+            self.folds.unfold_all()
+
+    def move_out_of_folds(self):
+        """Put a cursor that was folded away on the line that hides it"""
+        block = self.textCursor().block()
+        if block.isVisible():
+            return
+        while not block.isVisible() and block.previous().isValid():
+            block = block.previous()
+        cursor = QTextCursor(block)
+        cursor.movePosition(QTextCursor.EndOfBlock)
+        self.setTextCursor(cursor)
+
+    def reveal_cursor(self):
+        # Find, go to line and friends unfold what they land in
+        block = self.textCursor().block()
+        if self.folds is not None and not block.isVisible():
+            number = block.blockNumber()
+            self.folds.reveal(number, number)
+
+    def highlighter_settings(self):
+        """Read settings.json; lazy_highlight_lines is the document size
+        above which only the viewport is highlighted up front"""
+        try:
+            with open('settings.json', 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def update_visible_blocks(self, rect=None, dy=0):
+        """Let the highlighter's worker deliver the visible blocks first"""
+        if self.highlighter is None:
+            return
+        first = self.firstVisibleBlock().blockNumber()
+        rows = self.viewport().height() // max(1, self.fontMetrics().height())
+        self.highlighter.set_visible_blocks(first, first + rows + 1)
 
     def setup_auto_indent(self):
+        # Indent unit per extension, from the language registry
         self.indent_chars = {
-            "py": "    ",  # 4 spaces for Python
-            "cpp": "\t",   # tab for C++
-            "c": "\t",     # tab for C
-            "java": "    " # 4 spaces for Java
+            extension.lstrip('.'): language.indent
+            for extension, language in LANGUAGES_BY_EXTENSION.items()
         }
 
     def setup_auto_pairs(self):
@@ -1002,20 +4267,8 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
         }
 
     def setup_minimap(self):
-        self.minimap = QPlainTextEdit(self)
-        self.minimap.setReadOnly(True)
-        self.minimap.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.minimap.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.minimap.setStyleSheet("""
-            QPlainTextEdit {
-                background-color: rgba(40, 42, 54, 0.3);
-                color: rgba(248, 248, 242, 0.5);
-                border: none;
-                font-size: 2px;
-            }
-        """)
-        self.minimap.setFixedWidth(100)
-        self.minimap.setVisible(False)  # Hidden by default
+        self.minimap = Minimap(self)
+        self.minimap.setVisible(self.highlighter_settings().get('minimap', True))
 
     def setup_status_info(self):
         self.status_info = QLabel()
@@ -1059,187 +4312,3478 @@ class GlassmorphicCodeEditor(QPlainTextEdit):
             self.smart_completion = SmartCompletion(editor)
             self.code_analyzer = CodeAnalyzer(editor)
 
-    # Add this method to the GlassmorphicCodeEditor class
-    def highlightCurrentLine(self):
-        """Highlight the current line"""
-        extraSelections = []
+    # Add this method to the GlassmorphicCodeEditor class
+    def highlightCurrentLine(self):
+        """Highlight the current line"""
+        extraSelections = []
+
+        if not self.isReadOnly():
+            selection = QTextEdit.ExtraSelection()
+            
+            # Set the line color
+            lineColor = QColor(EDITOR_COLORS['current_line'])
+            lineColor.setAlpha(60)  # Make it semi-transparent
+            
+            selection.format.setBackground(lineColor)
+            selection.format.setProperty(QTextFormat.FullWidthSelection, True)
+            selection.cursor = self.textCursor()
+            selection.cursor.clearSelection()
+            
+            extraSelections.append(selection)
+
+        self.setExtraSelections(extraSelections + self.search_selections)
+
+# Add new TabWidget class
+class LineIndexThread(WorkerThread):
+    """Build the sparse line index of a MappedText off the GUI thread.
+
+    Appends to ``text.block_lines`` as it scans, so lines in the part
+    already indexed can be shown before the scan is done. ``progress``
+    reports the bytes scanned and the newlines counted so far.
+    """
+    progress = Signal(int, int)
+    done = Signal(int)
+
+    PROGRESS_EVERY = 256  # blocks, 16 MB
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+    def run(self):
+        buffer = self.text.buffer
+        block_lines = self.text.block_lines
+        block_size = MappedText.BLOCK_SIZE
+        size = len(buffer)
+        lines = 0
+        for start in range(0, size, block_size):
+            if self.cancelled:
+                return
+            block_lines.append(lines)
+            lines += buffer[start:start + block_size].count(b'\n')
+            if len(block_lines) % self.PROGRESS_EVERY == 0:
+                self.progress.emit(min(start + block_size, size), lines)
+                time.sleep(0)
+        self.progress.emit(size, lines)
+        self.done.emit(lines)
+
+class MappedSearchThread(WorkerThread):
+    """Find the next (or previous) match of needle in a mapped file.
+
+    The buffer is searched in WINDOW sized pieces, wrapping around at
+    the end, so the GIL is released regularly and a search can be
+    cancelled. Emits (job, offset) with offset -1 when nothing matched.
+    """
+    found = Signal(int, int)
+
+    WINDOW = 1 << 22
+
+    def __init__(self, buffer, job, needle, start, backward=False, case_sensitive=True):
+        super().__init__()
+        self.buffer = buffer
+        self.job = job
+        self.needle = needle
+        self.start_offset = start
+        self.backward = backward
+        # Case folding of bytes only covers ASCII letters
+        self.case_sensitive = case_sensitive
+        if not case_sensitive:
+            self.needle = needle.lower()
+
+    def run(self):
+        size = len(self.buffer)
+        start = self.start_offset
+        if self.backward:
+            ranges = [(0, start), (start, size)]
+        else:
+            ranges = [(start, size), (0, start)]
+        for low, high in ranges:
+            windows = [(a, min(a + self.WINDOW, high)) for a in range(low, high, self.WINDOW)]
+            if self.backward:
+                windows.reverse()
+            for low_window, high_window in windows:
+                if self.cancelled:
+                    return
+                offset = self.search(low_window, high_window)
+                if offset >= 0:
+                    self.found.emit(self.job, offset)
+                    return
+                time.sleep(0)
+        self.found.emit(self.job, -1)
+
+    def search(self, low, high):
+        """Offset of the first/last match starting in [low, high) or -1"""
+        end = min(high + len(self.needle) - 1, len(self.buffer))
+        if self.case_sensitive:
+            if self.backward:
+                return self.buffer.rfind(self.needle, low, end)
+            return self.buffer.find(self.needle, low, end)
+        window = self.buffer[low:end].lower()
+        offset = window.rfind(self.needle) if self.backward else window.find(self.needle)
+        return offset + low if offset >= 0 else -1
+
+class MappedText:
+    """Read-only, memory-mapped text file with a sparse line index.
+
+    ``block_lines[i]`` is the number of newlines before byte
+    i * BLOCK_SIZE. It is filled in by a LineIndexThread; ``indexed_bytes``
+    and ``indexed_lines`` say how far the index can be trusted so far.
+    """
+    BLOCK_SIZE = 1 << 16
+    # Longer lines are cut off when shown
+    MAX_LINE_BYTES = 1 << 14
+
+    def __init__(self, file_path, block_lines=None, lines=0):
+        """block_lines and lines, when given, are the complete index"""
+        self.file_path = file_path
+        self.open()
+        self.block_lines = array('Q') if block_lines is None else block_lines
+        self.indexed_bytes = 0 if block_lines is None else self.size
+        self.indexed_lines = lines
+
+    def open(self):
+        with open(self.file_path, 'rb') as f:
+            # Empty files cannot be mapped
+            if os.fstat(f.fileno()).st_size:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = b''
+        self.size = len(self.buffer)
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        # Searching a closed mmap crashes; a last paint before the view
+        # is deleted reads nothing instead
+        self.buffer = b''
+
+    def index_complete(self):
+        return self.indexed_bytes >= self.size
+
+    def line_count(self):
+        """Number of lines known so far"""
+        if self.index_complete() and not self.buffer[-1:] == b'\n':
+            return self.indexed_lines + 1
+        return self.indexed_lines
+
+    def line_offset(self, line):
+        """Byte offset where (0-based) line starts"""
+        if line <= 0:
+            return 0
+        if line > self.indexed_lines:
+            # Past the index so far: walk on from where it stops
+            offset, known = self.indexed_bytes, self.indexed_lines
+        else:
+            # The block holding the line-th newline, then walk to it
+            blocks = -(-self.indexed_bytes // self.BLOCK_SIZE)
+            block = max(bisect.bisect_left(self.block_lines, line, 0, blocks) - 1, 0)
+            offset, known = block * self.BLOCK_SIZE, self.block_lines[block]
+        for _ in range(line - known):
+            newline = self.buffer.find(b'\n', offset)
+            if newline < 0:
+                return self.size
+            offset = newline + 1
+        return offset
+
+    def line_at(self, offset):
+        """(0-based) line containing the byte at offset"""
+        block = offset // self.BLOCK_SIZE
+        if offset < self.indexed_bytes:
+            start, line = block * self.BLOCK_SIZE, self.block_lines[block]
+        else:
+            start, line = self.indexed_bytes, self.indexed_lines
+        return line + self.count_newlines(start, offset)
+
+    def count_newlines(self, start, end):
+        count = 0
+        for a in range(start, end, self.BLOCK_SIZE):
+            count += self.buffer[a:min(a + self.BLOCK_SIZE, end)].count(b'\n')
+        return count
+
+    def lines(self, first, count):
+        """Yield (line, offset, text) for up to count lines from first"""
+        offset = self.line_offset(first)
+        last = min(first + count, self.line_count())
+        for line in range(first, last):
+            end = self.buffer.find(b'\n', offset, offset + self.MAX_LINE_BYTES)
+            cut = end if end >= 0 else min(offset + self.MAX_LINE_BYTES, self.size)
+            yield line, offset, self.decode(offset, cut)
+            if end >= 0:
+                offset = end + 1
+            elif line + 1 < last:
+                # Skip the rest of an overlong line through the index
+                offset = self.line_offset(line + 1)
+
+    def decode(self, start, end):
+        return self.buffer[start:end].rstrip(b'\r').decode('utf-8', 'replace')
+
+class MappedTextView(QAbstractScrollArea):
+    """Paints only the visible lines of a MappedText.
+
+    The vertical scroll bar counts lines and the horizontal one columns,
+    so nothing is laid out ahead of time however large the file is.
+    """
+    TAB_SIZE = 4
+
+    def __init__(self, text, parent=None):
+        super().__init__(parent)
+        self.text = text
+        # (line, first column, last column) of the current match, in
+        # characters of the line before tabs are expanded
+        self.match = None
+        font = QFont("JetBrains Mono", 12)
+        font.setStyleHint(QFont.Monospace)
+        self.setFont(font)
+        self.viewport().setFont(font)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setStyleSheet(f"""
+            QAbstractScrollArea {{
+                background-color: {EDITOR_COLORS['background']};
+                border: none;
+            }}
+        """)
+        self.horizontalScrollBar().setRange(0, MappedText.MAX_LINE_BYTES)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+        self.update_scroll_range()
+
+    def line_height(self):
+        return self.fontMetrics().height()
+
+    def visible_rows(self):
+        return max(1, self.viewport().height() // self.line_height())
+
+    def gutter_width(self):
+        digits = len(str(max(1, self.text.line_count())))
+        return 16 + self.fontMetrics().horizontalAdvance('9') * digits
+
+    def update_scroll_range(self):
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(0, self.text.line_count() - self.visible_rows()))
+        bar.setPageStep(self.visible_rows())
+        self.viewport().update()
+
+    def first_visible_line(self):
+        return self.verticalScrollBar().value()
+
+    def scroll_to_line(self, line, column=0):
+        """Scroll line (0-based) into the middle of the view"""
+        self.verticalScrollBar().setValue(line - self.visible_rows() // 2)
+        columns = self.visible_columns()
+        bar = self.horizontalScrollBar()
+        if not bar.value() <= column < bar.value() + columns:
+            bar.setValue(max(0, column - columns // 2))
+
+    def visible_columns(self):
+        width = self.viewport().width() - self.gutter_width()
+        return max(1, width // max(1, self.fontMetrics().horizontalAdvance('9')))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scroll_range()
+
+    def keyPressEvent(self, event):
+        bar = self.verticalScrollBar()
+        steps = {
+            Qt.Key_Up: -1, Qt.Key_Down: 1,
+            Qt.Key_PageUp: -bar.pageStep(), Qt.Key_PageDown: bar.pageStep(),
+        }
+        if event.key() in steps:
+            bar.setValue(bar.value() + steps[event.key()])
+        elif event.key() == Qt.Key_Home and event.modifiers() & Qt.ControlModifier:
+            bar.setValue(bar.minimum())
+        elif event.key() == Qt.Key_End and event.modifiers() & Qt.ControlModifier:
+            bar.setValue(bar.maximum())
+        elif event.key() in (Qt.Key_Left, Qt.Key_Right):
+            columns = self.horizontalScrollBar()
+            columns.setValue(columns.value() + (1 if event.key() == Qt.Key_Right else -1))
+        else:
+            super().keyPressEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), QColor(EDITOR_COLORS['background']))
+        metrics = QFontMetricsF(self.font())
+        line_height = self.line_height()
+        gutter = self.gutter_width()
+        first_column = self.horizontalScrollBar().value()
+        columns = self.visible_columns() + 1
+        first = self.first_visible_line() + event.rect().top() // line_height
+        rows = event.rect().height() // line_height + 2
+        text_x = gutter + 4
+
+        y = (first - self.first_visible_line()) * line_height
+        for line, _, text in self.text.lines(first, rows):
+            highlight = self.highlight_range(line, text)
+            if highlight:
+                left = self.column_x(text, highlight[0], metrics)
+                right = self.column_x(text, highlight[1], metrics)
+                painter.fillRect(QRectF(text_x + left, y, right - left, line_height),
+                                 QColor(EDITOR_COLORS['selection_bg']))
+            text = text.expandtabs(self.TAB_SIZE)[first_column:first_column + columns]
+            painter.setPen(QColor(EDITOR_COLORS['text']))
+            painter.drawText(text_x, y + self.fontMetrics().ascent(), text)
+            painter.fillRect(0, y, gutter, line_height, QColor(EDITOR_COLORS['background']))
+            painter.setPen(QColor(EDITOR_COLORS['line_numbers']))
+            painter.drawText(0, y, gutter - 8, line_height, Qt.AlignRight, str(line + 1))
+            y += line_height
+        painter.setPen(QColor(f"{EDITOR_COLORS['comments']}40"))
+        painter.drawLine(gutter - 1, event.rect().top(), gutter - 1, event.rect().bottom())
+        painter.end()
+
+    def highlight_range(self, line, text):
+        """(first, last) column of text to highlight on line, or None"""
+        if self.match and self.match[0] == line:
+            return self.match[1], self.match[2]
+        return None
+
+    def column_x(self, text, column, metrics):
+        """x of column of text, relative to the left of the text area.
+
+        Columns past the end of the text count as spaces, columns
+        scrolled out of view on the left as 0.
+        """
+        first_column = self.horizontalScrollBar().value()
+        expanded = text[:column].expandtabs(self.TAB_SIZE) + ' ' * (column - len(text))
+        return metrics.horizontalAdvance(expanded[first_column:])
+
+class LargeFileViewer(QWidget):
+    """Read-only tab for files too large to load into an editor.
+
+    The file is memory mapped and indexed in the background; only the
+    visible lines are ever decoded. Supports goto-line and search.
+    """
+    # Default for the large_file_mb setting
+    LARGE_FILE_MB = 1024
+
+    def __init__(self, file_path, parent=None):
+        super().__init__(parent)
+        self.current_file = file_path
+        self.text = MappedText(file_path)
+        self.search_job = 0
+        self.search_worker = None
+        # Byte offset of the current match
+        self.match_offset = -1
+        self.setup_ui()
+
+        self.index_worker = LineIndexThread(self.text)
+        self.index_worker.progress.connect(self.on_index_progress)
+        self.index_worker.start()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+
+        bar = QWidget()
+        bar.setStyleSheet(f"""
+            QWidget {{ background: #2D2D2D; color: #CCCCCC; }}
+            QLineEdit {{ background: {EDITOR_COLORS['background']}; border: 1px solid #3C3C3C;
+                         border-radius: 4px; padding: 2px 6px; }}
+            QPushButton {{ border: none; padding: 4px 8px; }}
+            QPushButton:hover {{ background: #3C3C3C; }}
+        """)
+        bar_layout = QHBoxLayout(bar)
+        bar_layout.setContentsMargins(8, 4, 8, 4)
+        self.status_label = QLabel()
+        self.find_input = QLineEdit()
+        self.find_input.setPlaceholderText("Find")
+        self.find_input.setMaximumWidth(300)
+        self.find_input.returnPressed.connect(self.find_next)
+        self.case_sensitive = QCheckBox("Case sensitive")
+        previous_button = QPushButton("Previous")
+        previous_button.clicked.connect(self.find_previous)
+        next_button = QPushButton("Next")
+        next_button.clicked.connect(self.find_next)
+        bar_layout.addWidget(self.status_label)
+        bar_layout.addStretch()
+        bar_layout.addWidget(self.find_input)
+        bar_layout.addWidget(self.case_sensitive)
+        bar_layout.addWidget(previous_button)
+        bar_layout.addWidget(next_button)
+
+        self.view = MappedTextView(self.text, self)
+        layout.addWidget(bar)
+        layout.addWidget(self.view)
+        self.setFocusProxy(self.view)
+        self.update_status()
+
+    def update_status(self, message=None):
+        size = f"{self.text.size / (1 << 20):,.1f} MB"
+        lines = f"{self.text.line_count():,} lines"
+        if not self.text.index_complete():
+            lines += f" (indexing {self.text.indexed_bytes * 100 // max(1, self.text.size)}%)"
+        self.status_label.setText(" · ".join(filter(None, ["Read-only", size, lines, message])))
+
+    def on_index_progress(self, indexed_bytes, indexed_lines):
+        self.text.indexed_bytes = indexed_bytes
+        self.text.indexed_lines = indexed_lines
+        self.view.update_scroll_range()
+        self.update_status()
+
+    def line_count(self):
+        return self.text.line_count()
+
+    def goto_line(self, line):
+        """Show (1-based) line"""
+        line = min(max(1, line), max(1, self.line_count()))
+        self.view.scroll_to_line(line - 1)
+        self.view.setFocus()
+
+    def show_find(self):
+        self.find_input.setFocus()
+        self.find_input.selectAll()
+
+    def find_next(self):
+        self.find(backward=False)
+
+    def find_previous(self):
+        self.find(backward=True)
+
+    def find(self, backward=False):
+        needle = self.find_input.text().encode('utf-8')
+        if not needle:
+            return
+        if self.match_offset >= 0:
+            start = self.match_offset if backward else self.match_offset + 1
+        else:
+            start = self.text.line_offset(self.view.first_visible_line())
+        self.cancel_search()
+        self.search_job += 1
+        self.search_needle = needle
+        self.search_worker = MappedSearchThread(self.text.buffer, self.search_job, needle, start,
+                                                backward, self.case_sensitive.isChecked())
+        self.search_worker.found.connect(self.on_found)
+        self.search_worker.start()
+        self.update_status("Searching...")
+
+    def cancel_search(self):
+        if self.search_worker is not None:
+            self.search_worker.cancelled = True
+            self.search_worker = None
+
+    def on_found(self, job, offset):
+        if job != self.search_job:
+            return
+        self.search_worker = None
+        if offset < 0:
+            self.update_status(f"'{self.find_input.text()}' not found")
+            return
+        self.match_offset = offset
+        line = self.text.line_at(offset)
+        line_start = self.text.line_offset(line)
+        prefix = self.text.decode(line_start, offset)
+        match = self.text.decode(offset, offset + len(self.search_needle))
+        self.view.match = (line, len(prefix), len(prefix) + len(match))
+        self.view.scroll_to_line(line, len(prefix.expandtabs(MappedTextView.TAB_SIZE)))
+        self.view.viewport().update()
+        self.update_status(f"Match on line {line + 1:,}")
+
+    def set_file_type(self, file_path):
+        """Large files are always shown as plain text"""
+
+    def release(self):
+        """Stop the workers and unmap the file"""
+        workers = [self.index_worker, self.search_worker]
+        self.cancel_search()
+        for worker in workers:
+            if worker is not None:
+                worker.cancelled = True
+                worker.wait()
+        self.text.close()
+        self.deleteLater()
+
+# Bytes that were not UTF-8, as decoded with 'surrogateescape'
+LONE_SURROGATES = re.compile('[\udc80-\udcff]')
+
+class PieceTable:
+    """Editable text over a MappedText, kept as a table of pieces.
+
+    Each piece is a span of either the mapped original file, which is
+    never written to, or of the append-only ``add`` buffer holding all
+    inserted text. Offsets are bytes of UTF-8 text. The newline count of
+    every piece and the running sums of lengths and newlines make up the
+    line index; an edit only recomputes the sums from the piece it
+    touched on.
+    """
+    ORIGINAL = 0
+    ADD = 1
+
+    def __init__(self, original):
+        self.original = original
+        self.add = bytearray()
+        pieces = 1 if original.size else 0
+        self.kinds = [self.ORIGINAL] * pieces
+        self.starts = [0] * pieces
+        self.lengths = [original.size] * pieces
+        self.newlines = [original.indexed_lines] * pieces
+        # Offset of, and newlines before, each piece
+        self.offsets = []
+        self.lines_before = []
+        self.reindex(0)
+
+    def reindex(self, first):
+        """Recompute the running sums from piece first on"""
+        del self.offsets[first:]
+        del self.lines_before[first:]
+        offset = lines = 0
+        if first:
+            offset = self.offsets[first - 1] + self.lengths[first - 1]
+            lines = self.lines_before[first - 1] + self.newlines[first - 1]
+        for length, newlines in zip(self.lengths[first:], self.newlines[first:]):
+            self.offsets.append(offset)
+            self.lines_before.append(lines)
+            offset += length
+            lines += newlines
+        self.size = offset
+        self.newline_count = lines
+
+    def buffer(self, kind):
+        return self.add if kind == self.ADD else self.original.buffer
+
+    def count_newlines(self, kind, start, end):
+        if kind == self.ADD:
+            return self.add.count(b'\n', start, end)
+        return self.original.line_at(end) - self.original.line_at(start)
+
+    def line_count(self):
+        # Text ending in a newline has an empty last line to put the caret on
+        return self.newline_count + 1
+
+    def line_offset(self, line):
+        """Byte offset where (0-based) line starts"""
+        if line <= 0:
+            return 0
+        if line > self.newline_count:
+            return self.size
+        # The last piece starting before the line-th newline holds it
+        piece = bisect.bisect_left(self.lines_before, line) - 1
+        kind, start = self.kinds[piece], self.starts[piece]
+        nth = line - self.lines_before[piece]
+        if kind == self.ORIGINAL:
+            end = self.original.line_offset(self.original.line_at(start) + nth)
+        else:
+            end = start
+            for _ in range(nth):
+                end = self.add.find(b'\n', end) + 1
+        return self.offsets[piece] + end - start
+
+    def line_at(self, offset):
+        """(0-based) line containing the byte at offset"""
+        piece = bisect.bisect_right(self.offsets, offset) - 1
+        if piece < 0:
+            return 0
+        start = self.starts[piece]
+        end = start + min(offset - self.offsets[piece], self.lengths[piece])
+        return self.lines_before[piece] + self.count_newlines(self.kinds[piece], start, end)
+
+    def text(self, start, end):
+        """Bytes from start to end"""
+        parts = []
+        piece = max(0, bisect.bisect_right(self.offsets, start) - 1)
+        while piece < len(self.offsets) and self.offsets[piece] < end:
+            offset, first = self.offsets[piece], self.starts[piece]
+            a = first + max(start - offset, 0)
+            b = first + min(end - offset, self.lengths[piece])
+            parts.append(self.buffer(self.kinds[piece])[a:b])
+            piece += 1
+        return b''.join(parts)
+
+    def chunks(self, size=1 << 20):
+        """Yield the whole text as bytes, at most size at a time"""
+        for kind, start, length in zip(self.kinds, self.starts, self.lengths):
+            buffer = self.buffer(kind)
+            for a in range(start, start + length, size):
+                yield buffer[a:min(a + size, start + length)]
+
+    def lines(self, first, count):
+        """Yield (line, offset, text) for up to count lines from first"""
+        last = min(first + count, self.line_count())
+        if first >= last:
+            return
+        offset = self.line_offset(first)
+        end = self.line_offset(last) if last <= self.newline_count else self.size
+        data = self.text(offset, min(end, offset + count * MappedText.MAX_LINE_BYTES))
+        for line, raw in zip(range(first, last), data.split(b'\n')):
+            yield line, offset, self.display(raw[:MappedText.MAX_LINE_BYTES])
+            offset += len(raw) + 1
+
+    @staticmethod
+    def decode(raw):
+        """Text of raw bytes; bytes that are not UTF-8 become lone
+        surrogates, one per byte, so they can be encoded back unchanged"""
+        return raw.rstrip(b'\r').decode('utf-8', 'surrogateescape')
+
+    @classmethod
+    def display(cls, raw):
+        """decode() with the lone surrogates shown as replacement characters"""
+        return LONE_SURROGATES.sub('\ufffd', cls.decode(raw))
+
+    @staticmethod
+    def encode(text):
+        return text.encode('utf-8', 'surrogateescape')
+
+    def boundary(self, offset):
+        """Index of the piece starting at offset, splitting one if needed"""
+        piece = bisect.bisect_right(self.offsets, offset) - 1
+        if piece < 0 or offset == self.offsets[piece]:
+            return max(piece, 0)
+        local = offset - self.offsets[piece]
+        if local >= self.lengths[piece]:
+            return piece + 1
+        kind, start = self.kinds[piece], self.starts[piece]
+        newlines = self.count_newlines(kind, start, start + local)
+        self.kinds.insert(piece + 1, kind)
+        self.starts.insert(piece + 1, start + local)
+        self.lengths.insert(piece + 1, self.lengths[piece] - local)
+        self.newlines.insert(piece + 1, self.newlines[piece] - newlines)
+        self.lengths[piece] = local
+        self.newlines[piece] = newlines
+        self.reindex(piece)
+        return piece + 1
+
+    def insert(self, offset, data):
+        if not data:
+            return
+        start = len(self.add)
+        self.add += data
+        piece = self.boundary(offset)
+        before = piece - 1
+        if (before >= 0 and self.kinds[before] == self.ADD
+                and self.starts[before] + self.lengths[before] == start):
+            # Typing goes on at the end of the previous insert: grow its piece
+            self.lengths[before] += len(data)
+            self.newlines[before] += data.count(b'\n')
+            self.reindex(before)
+            return
+        self.kinds.insert(piece, self.ADD)
+        self.starts.insert(piece, start)
+        self.lengths.insert(piece, len(data))
+        self.newlines.insert(piece, data.count(b'\n'))
+        self.reindex(piece)
+
+    def delete(self, start, end):
+        if start >= end:
+            return
+        first = self.boundary(start)
+        last = self.boundary(end)
+        for pieces in (self.kinds, self.starts, self.lengths, self.newlines):
+            del pieces[first:last]
+        self.reindex(first)
+
+class PieceTableDocument(QObject):
+    """The part of the QTextDocument API the IDE uses, for a PieceTableEditor"""
+    modificationChanged = Signal(bool)
+    contentsChanged = Signal()
+
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.modified = False
+
+    def isModified(self):
+        return self.modified
+
+    def setModified(self, modified=True):
+        if modified != self.modified:
+            self.modified = modified
+            self.modificationChanged.emit(modified)
+
+    def blockCount(self):
+        return self.editor.blockCount()
+
+    def toPlainText(self):
+        return self.editor.toPlainText()
+
+class PieceTableEditor(MappedTextView):
+    """Editor for files too large for a QTextDocument.
+
+    The file is memory mapped and edited through a PieceTable, so
+    opening it costs one pass over the file to index its lines and
+    editing never copies it. Only the visible lines are decoded and
+    painted. The text is plain, without highlighting or completion.
+    """
+    # Default for the piece_table_mb setting
+    PIECE_TABLE_MB = 32
+
+    load_aborted = Signal()
+
+    def __init__(self, file_path, parent=None):
+        mapped = MappedText(file_path)
+        super().__init__(mapped, parent)
+        self.mapped = mapped
+        self.current_file = file_path
+        self.text_document = PieceTableDocument(self)
+        self.indent_unit = '    '
+        self.set_file_type(file_path)
+        # Line break typed by Enter, that of the file's first line
+        self.newline = b'\n'
+        # (line, column) of the caret and of the other end of the selection
+        self.caret = (0, 0)
+        self.anchor = None
+        # Groups of edits, each a list of (offset, removed, inserted) bytes
+        self.undo_stack = []
+        self.redo_stack = []
+        self.clean_depth = 0
+        self.merge_typing = False
+        self.cached_line = None
+        self.setAttribute(Qt.WA_InputMethodEnabled)
+        self.viewport().setCursor(Qt.IBeamCursor)
+
+        # Read-only until the lines are indexed
+        self.load_progress = LoadProgress(self)
+        self.loader = LineIndexThread(self.mapped)
+        self.loader.progress.connect(self.on_index_progress)
+        self.loader.done.connect(self.on_index_done)
+        self.loader.start()
+
+    # The surface the IDE shares with GlassmorphicCodeEditor
+
+    def document(self):
+        return self.text_document
+
+    def toPlainText(self):
+        text = b''.join(self.text.chunks()).decode('utf-8', 'replace')
+        return text.replace('\r\n', '\n') if self.newline == b'\r\n' else text
+
+    def blockCount(self):
+        return self.line_count()
+
+    def set_file_type(self, file_path):
+        language = language_for_path(file_path)
+        self.indent_unit = language.indent if language else '    '
+
+    def is_loading(self):
+        return self.loader is not None
+
+    def cancel_loading(self):
+        if self.loader is None:
+            return
+        self.loader.cancelled = True
+        self.loader = None
+        self.load_progress.deleteLater()
+        self.load_progress = None
+        self.load_aborted.emit()
+
+    def release(self):
+        """Stop indexing and unmap the file"""
+        if self.loader is not None:
+            self.loader.cancelled = True
+            self.loader.wait()
+            self.loader = None
+        self.mapped.close()
+        self.deleteLater()
+
+    def line_count(self):
+        return self.text.line_count()
+
+    def goto_line(self, line):
+        """Put the caret on (1-based) line"""
+        line = min(max(1, line), self.line_count()) - 1
+        self.set_caret((line, 0))
+        self.scroll_to_line(line)
+        self.setFocus()
+
+    def save_to(self, file_path):
+        """Write the text to file_path and edit that file from now on.
+
+        The text goes to a temporary file that then replaces file_path,
+        so the mapped original is never overwritten while it is read.
+        The line index of the new file is counted on the way out.
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.pylight-')
+        block_size = MappedText.BLOCK_SIZE
+        block_lines = array('Q')
+        position = lines = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in self.text.chunks():
+                    f.write(chunk)
+                    done = 0
+                    while done < len(chunk):
+                        if position % block_size == 0:
+                            block_lines.append(lines)
+                        step = min(block_size - position % block_size, len(chunk) - done)
+                        lines += chunk.count(b'\n', done, done + step)
+                        done += step
+                        position += step
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, temp_path)
+            # Windows cannot replace a file that is still mapped
+            self.mapped.close()
+            try:
+                os.replace(temp_path, file_path)
+            except OSError:
+                self.mapped.open()
+                raise
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        sync_directory(directory)
+
+        self.mapped = MappedText(file_path, block_lines, lines)
+        self.text = PieceTable(self.mapped)
+        self.current_file = file_path
+        # Offsets recorded for undo still hold, the text is the same
+        self.cached_line = None
+        self.clean_depth = len(self.undo_stack)
+        self.merge_typing = False
+        self.text_document.setModified(False)
+
+    # Loading
+
+    def on_index_progress(self, indexed_bytes, indexed_lines):
+        self.mapped.indexed_bytes = indexed_bytes
+        self.mapped.indexed_lines = indexed_lines
+        if self.load_progress is not None:
+            self.load_progress.set_progress(indexed_bytes, self.mapped.size)
+        self.update_scroll_range()
+
+    def on_index_done(self, lines):
+        if self.loader is None:
+            return
+        self.loader = None
+        self.load_progress.deleteLater()
+        self.load_progress = None
+        self.text = PieceTable(self.mapped)
+        first_line = self.text.text(0, self.text.line_offset(1))
+        self.newline = b'\r\n' if first_line.endswith(b'\r\n') else b'\n'
+        self.update_scroll_range()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.load_progress is not None:
+            rect = self.contentsRect()
+            self.load_progress.move(rect.right() - self.load_progress.width() - 16, rect.top() + 8)
+
+    # Positions
+
+    def line_text(self, line):
+        """Text of line without its line break"""
+        if self.cached_line is None or self.cached_line[0] != line:
+            start = self.text.line_offset(line)
+            end = self.text.line_offset(line + 1) if line < self.text.newline_count else self.text.size
+            raw = self.text.text(start, end)
+            self.cached_line = (line, PieceTable.decode(raw.rstrip(b'\n')))
+        return self.cached_line[1]
+
+    def offset_of(self, position):
+        line, column = position
+        return self.text.line_offset(line) + len(PieceTable.encode(self.line_text(line)[:column]))
+
+    def position_of(self, offset):
+        line = self.text.line_at(offset)
+        start = self.text.line_offset(line)
+        return line, len(PieceTable.decode(self.text.text(start, offset)))
+
+    def selection(self):
+        """(start, end) positions of the selection, or None"""
+        if self.anchor is None or self.anchor == self.caret:
+            return None
+        return min(self.anchor, self.caret), max(self.anchor, self.caret)
+
+    def selected_bytes(self):
+        start, end = self.selection()
+        return self.text.text(self.offset_of(start), self.offset_of(end))
+
+    def set_caret(self, position, extend=False):
+        if extend:
+            if self.anchor is None:
+                self.anchor = self.caret
+        else:
+            self.anchor = None
+        self.caret = position
+        self.merge_typing = False
+        self.ensure_caret_visible()
+        self.viewport().update()
+
+    def ensure_caret_visible(self):
+        line, column = self.caret
+        bar = self.verticalScrollBar()
+        if line < bar.value():
+            bar.setValue(line)
+        elif line >= bar.value() + self.visible_rows():
+            bar.setValue(line - self.visible_rows() + 1)
+        column = len(self.line_text(line)[:column].expandtabs(self.TAB_SIZE))
+        columns = self.horizontalScrollBar()
+        if column < columns.value():
+            columns.setValue(max(0, column - 4))
+        elif column >= columns.value() + self.visible_columns():
+            columns.setValue(column - self.visible_columns() + 4)
+
+    def position_at(self, point):
+        """(line, column) nearest to a point of the viewport"""
+        line = self.first_visible_line() + max(0, point.y()) // self.line_height()
+        line = min(line, self.line_count() - 1)
+        char_width = QFontMetricsF(self.font()).horizontalAdvance(' ')
+        target = self.horizontalScrollBar().value() + (point.x() - self.gutter_width() - 4) / char_width
+        # Walk the line, expanding tabs, to the character nearest target
+        column = display = 0
+        for character in self.line_text(line):
+            width = self.TAB_SIZE - display % self.TAB_SIZE if character == '\t' else 1
+            if target < display + width / 2:
+                break
+            display += width
+            column += 1
+        return line, column
+
+    # Editing
+
+    def replace(self, start, end, data, merge=False):
+        """Replace the bytes from start to end with data, as one undo step"""
+        removed = self.text.text(start, end)
+        edit = (start, removed, data)
+        if merge and self.merge_typing and self.undo_stack:
+            self.undo_stack[-1].append(edit)
+            if self.clean_depth == len(self.undo_stack):
+                self.clean_depth = -1
+        else:
+            self.undo_stack.append([edit])
+            if self.clean_depth >= len(self.undo_stack):
+                self.clean_depth = -1  # The saved state can no longer be reached
+        self.redo_stack.clear()
+        self.apply(edit)
+        self.set_caret(self.position_of(start + len(data)))
+        self.merge_typing = merge
+
+    def apply(self, edit, undo=False):
+        offset, removed, inserted = edit
+        if undo:
+            removed, inserted = inserted, removed
+        self.text.delete(offset, offset + len(removed))
+        self.text.insert(offset, inserted)
+        self.cached_line = None
+        self.update_scroll_range()
+        self.text_document.setModified(len(self.undo_stack) != self.clean_depth)
+        self.text_document.contentsChanged.emit()
+
+    def insert_text(self, text, merge=False):
+        data = PieceTable.encode(text)
+        if self.newline != b'\n':
+            data = data.replace(b'\r\n', b'\n').replace(b'\n', self.newline)
+        selection = self.selection()
+        if selection:
+            self.replace(self.offset_of(selection[0]), self.offset_of(selection[1]), data)
+        else:
+            offset = self.offset_of(self.caret)
+            self.replace(offset, offset, data, merge)
+
+    def delete_selection_or(self, forward):
+        """Delete the selection, else the character (or line break)
+        before or after the caret"""
+        selection = self.selection()
+        if selection:
+            self.replace(self.offset_of(selection[0]), self.offset_of(selection[1]), b'')
+            return
+        line, column = self.caret
+        offset = self.offset_of(self.caret)
+        if forward:
+            if column < len(self.line_text(line)):
+                end = self.offset_of((line, column + 1))
+            elif line + 1 < self.line_count():
+                end = self.text.line_offset(line + 1)
+            else:
+                return
+            self.replace(offset, end, b'')
+        else:
+            if column > 0:
+                start = self.offset_of((line, column - 1))
+            elif line > 0:
+                start = self.offset_of((line - 1, len(self.line_text(line - 1))))
+            else:
+                return
+            self.replace(start, offset, b'')
+
+    def undo(self):
+        if self.undo_stack:
+            group = self.undo_stack.pop()
+            self.redo_stack.append(group)
+            for edit in reversed(group):
+                self.apply(edit, undo=True)
+            self.set_caret(self.position_of(group[0][0] + len(group[0][1])))
+
+    def redo(self):
+        if self.redo_stack:
+            group = self.redo_stack.pop()
+            self.undo_stack.append(group)
+            for edit in group:
+                self.apply(edit)
+            self.set_caret(self.position_of(group[-1][0] + len(group[-1][2])))
+
+    def copy(self):
+        if self.selection():
+            QApplication.clipboard().setText(PieceTable.decode(self.selected_bytes())
+                                             .replace('\r\n', '\n'))
+
+    def move_caret(self, key, ctrl, extend):
+        line, column = self.caret
+        if key == Qt.Key_Left:
+            if column > 0:
+                column -= 1
+            elif line > 0:
+                line -= 1
+                column = len(self.line_text(line))
+        elif key == Qt.Key_Right:
+            if column < len(self.line_text(line)):
+                column += 1
+            elif line + 1 < self.line_count():
+                line, column = line + 1, 0
+        elif key in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+            step = 1 if key in (Qt.Key_Up, Qt.Key_Down) else self.visible_rows()
+            step = -step if key in (Qt.Key_Up, Qt.Key_PageUp) else step
+            line = min(max(0, line + step), self.line_count() - 1)
+            column = min(column, len(self.line_text(line)))
+        elif key == Qt.Key_Home:
+            line, column = (0 if ctrl else line), 0
+        elif key == Qt.Key_End:
+            line = self.line_count() - 1 if ctrl else line
+            column = len(self.line_text(line))
+        self.set_caret((line, column), extend)
+
+    def keyPressEvent(self, event):
+        if self.is_loading():
+            super().keyPressEvent(event)
+            return
+        key = event.key()
+        ctrl = bool(event.modifiers() & Qt.ControlModifier)
+        shift = bool(event.modifiers() & Qt.ShiftModifier)
+        if event.matches(QKeySequence.Undo):
+            self.undo()
+        elif event.matches(QKeySequence.Redo):
+            self.redo()
+        elif event.matches(QKeySequence.Copy):
+            self.copy()
+        elif event.matches(QKeySequence.Cut):
+            self.copy()
+            if self.selection():
+                self.delete_selection_or(forward=True)
+        elif event.matches(QKeySequence.Paste):
+            text = QApplication.clipboard().text()
+            if text:
+                self.insert_text(text)
+        elif event.matches(QKeySequence.SelectAll):
+            self.anchor = (0, 0)
+            last = self.line_count() - 1
+            self.caret = (last, len(self.line_text(last)))
+            self.viewport().update()
+        elif key in (Qt.Key_Left, Qt.Key_Right, Qt.Key_Up, Qt.Key_Down, Qt.Key_Home,
+                     Qt.Key_End, Qt.Key_PageUp, Qt.Key_PageDown):
+            self.move_caret(key, ctrl, shift)
+        elif key == Qt.Key_Backspace:
+            self.delete_selection_or(forward=False)
+        elif key == Qt.Key_Delete:
+            self.delete_selection_or(forward=True)
+        elif key in (Qt.Key_Return, Qt.Key_Enter):
+            text = self.line_text(self.caret[0])
+            self.insert_text('\n' + text[:len(text) - len(text.lstrip())][:self.caret[1]])
+        elif key == Qt.Key_Tab:
+            self.insert_text(self.indent_unit)
+        elif event.text() and event.text().isprintable() and not ctrl:
+            self.insert_text(event.text(), merge=True)
+        else:
+            super().keyPressEvent(event)
+
+    def focusNextPrevChild(self, next):
+        return False  # Tab indents
+
+    def inputMethodEvent(self, event):
+        if event.commitString() and not self.is_loading():
+            self.insert_text(event.commitString())
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and not self.is_loading():
+            extend = bool(event.modifiers() & Qt.ShiftModifier)
+            self.set_caret(self.position_at(event.position().toPoint()), extend)
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton and not self.is_loading():
+            self.set_caret(self.position_at(event.position().toPoint()), extend=True)
+
+    # Painting
+
+    def highlight_range(self, line, text):
+        selection = self.selection()
+        if selection is None or not selection[0][0] <= line <= selection[1][0]:
+            return super().highlight_range(line, text)
+        (first_line, first), (last_line, last) = selection
+        start = first if line == first_line else 0
+        # Selected line breaks show as one more column
+        end = last if line == last_line else len(text) + 1
+        return start, end
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        line, column = self.caret
+        row = line - self.first_visible_line()
+        if self.is_loading() or not self.hasFocus() or not 0 <= row <= self.visible_rows():
+            return
+        painter = QPainter(self.viewport())
+        metrics = QFontMetricsF(self.font())
+        x = self.gutter_width() + 4 + self.column_x(self.line_text(line), column, metrics)
+        painter.fillRect(QRectF(x, row * self.line_height(), 2, self.line_height()),
+                         QColor(EDITOR_COLORS['text']))
+        painter.end()
+
+    def focusInEvent(self, event):
+        super().focusInEvent(event)
+        self.viewport().update()
+
+    def focusOutEvent(self, event):
+        super().focusOutEvent(event)
+        self.viewport().update()
+
+def can_save(widget):
+    """Whether widget is an editor whose text may be written to its file"""
+    return (isinstance(widget, (GlassmorphicCodeEditor, PieceTableEditor))
+            and not widget.is_loading())
+
+def save_text(file_path, text, encoding='utf-8', newline='\n'):
+    """Write text to file_path atomically, returning the encoding used.
+
+    The text is written to a temporary file next to file_path, synced to
+    disk and renamed over it, so a crash leaves either the old file or
+    the new one. \\n becomes newline; text the encoding cannot represent
+    is written as UTF-8 instead. A symlink is followed, not replaced.
+    """
+    file_path = os.path.realpath(file_path)
+    if newline != '\n':
+        text = text.replace('\n', newline)
+    try:
+        data = text.encode(encoding)
+    except (UnicodeEncodeError, LookupError):
+        encoding = 'utf-8'
+        data = text.encode(encoding)
+    data = BYTE_ORDER_MARKS.get(encoding, b'') + data
+
+    write_atomically(file_path, data)
+    return encoding
+
+def write_atomically(file_path, data):
+    """Replace file_path by a file holding data, synced to disk first"""
+    directory = os.path.dirname(file_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.pylight-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    sync_directory(directory)
+
+def sync_directory(directory):
+    """Make a rename in directory durable, where directories can be synced"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class SaveThread(WorkerThread):
+    """Join, encode and write a DocumentSnapshot off the GUI thread.
+
+    ``done`` gets the encoding the file was written in, ``failed`` an
+    error message. The editor, path and document revision saved are
+    kept for the receiver.
+    """
+    done = Signal(str)
+    failed = Signal(str)
+
+    def __init__(self, editor, file_path, revision, pieces):
+        super().__init__()
+        self.editor = editor
+        self.file_path = file_path
+        self.revision = revision
+        self.pieces = pieces
+        self.encoding = editor.encoding
+        self.newline = editor.newline
+
+    def run(self):
+        try:
+            text = ''.join(self.pieces).replace('\u2029', '\n')
+            self.pieces = None
+            encoding = save_text(self.file_path, text, self.encoding, self.newline)
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+            return
+        self.done.emit(encoding)
+
+class SaveService(QObject):
+    """Saves editors without blocking the GUI.
+
+    The text of an editor is copied in GUI-thread slices and written
+    by a SaveThread, so saving several editors runs them side by side.
+    A save requested while the editor is being saved runs after it. A
+    document edited after it was copied stays modified. PieceTableEditor
+    writes its mapped text itself, on the GUI thread.
+    """
+    saved = Signal(object, str)
+    failed = Signal(object, str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Editor -> path being saved, and path to save once that is done
+        self.active = {}
+        self.queued = {}
+
+    def is_saving(self, editor=None):
+        return editor in self.active if editor is not None else bool(self.active)
+
+    def save(self, editor, file_path):
+        if editor in self.active:
+            self.queued[editor] = file_path
+            return
+        if isinstance(editor, PieceTableEditor):
+            # Its text is read from the mapped file, which must not be
+            # truncated by opening it for writing
+            try:
+                editor.save_to(file_path)
+            except OSError as e:
+                self.failed.emit(editor, file_path, str(e))
+                return
+            ProjectIndex.file_saved(file_path)
+            SymbolIndex.file_saved(file_path)
+            self.saved.emit(editor, file_path)
+            return
+        self.active[editor] = file_path
+        self.copy_text(editor, file_path)
+
+    def copy_text(self, editor, file_path):
+        document = editor.document()
+        revision = document.revision()
+        snapshot = DocumentSnapshot(document, self)
+        snapshot.ready.connect(lambda pieces: self.write(editor, file_path, revision, pieces))
+        snapshot.start()
+
+    def write(self, editor, file_path, revision, pieces):
+        if editor.document().revision() != revision:
+            # Edited while it was being copied
+            self.copy_text(editor, file_path)
+            return
+        worker = SaveThread(editor, file_path, revision, pieces)
+        worker.done.connect(self.on_written)
+        worker.failed.connect(self.on_failed)
+        worker.start()
+
+    def on_written(self, encoding):
+        worker = self.sender()
+        editor = worker.editor
+        editor.encoding = encoding
+        if editor.document().revision() == worker.revision:
+            editor.document().setModified(False)
+        ProjectIndex.file_saved(worker.file_path)
+        SymbolIndex.file_saved(worker.file_path)
+        self.finish(editor)
+        self.saved.emit(editor, worker.file_path)
+
+    def on_failed(self, message):
+        worker = self.sender()
+        self.finish(worker.editor)
+        self.failed.emit(worker.editor, worker.file_path, message)
+
+    def finish(self, editor):
+        del self.active[editor]
+        file_path = self.queued.pop(editor, None)
+        if file_path is not None:
+            self.save(editor, file_path)
+
+def journal_directory():
+    """Where the edit journals of unsaved tabs are kept"""
+    return os.path.join(os.path.expanduser('~'), PROJECT_DATA_DIR, 'journal')
+
+# A journal record: kind, position, chars removed, payload length and the
+# CRC-32 of the payload, followed by the payload. META holds the file,
+# encoding and newline as JSON, TEXT the text the edits apply to and
+# EDIT the text inserted at position after removing chars there
+JOURNAL_RECORD = struct.Struct('<BQQII')
+JOURNAL_META, JOURNAL_TEXT, JOURNAL_EDIT = 0, 1, 2
+
+def journal_record(kind, payload, position=0, removed=0):
+    return JOURNAL_RECORD.pack(kind, position, removed, len(payload),
+                               zlib.crc32(payload)) + payload
+
+def read_journal(path):
+    """(meta, text, edits) of the journal at path, read up to its first
+    torn or corrupt record; None if that leaves no text to restore"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    meta = text = None
+    edits = []
+    offset = 0
+    while offset + JOURNAL_RECORD.size <= len(data):
+        kind, position, removed, length, crc = JOURNAL_RECORD.unpack_from(data, offset)
+        start = offset + JOURNAL_RECORD.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        offset = start + length
+        if kind == JOURNAL_META:
+            meta = json.loads(payload)
+        elif kind == JOURNAL_TEXT:
+            text = payload.decode('utf-8', 'surrogatepass')
+            edits = []
+        elif kind == JOURNAL_EDIT:
+            edits.append((position, removed, payload.decode('utf-8', 'surrogatepass')))
+    if meta is None or text is None:
+        return None
+    return meta, text, edits
+
+class JournalWriter(WorkerThread):
+    """Write the edit journals on a thread of its own, in the order asked.
+
+    The GUI thread only puts work in the queue. Appends are synced to
+    disk; a new base text replaces a journal atomically. ``failed`` gets
+    the path and an error message.
+    """
+    failed = Signal(str, str)
+
+    APPEND, REWRITE, REMOVE, SYNC = range(4)
+
+    def __init__(self):
+        super().__init__()
+        self.queue = queue.Queue()
+
+    def append(self, path, data):
+        self.queue.put((self.APPEND, path, data))
+
+    def rewrite(self, path, meta, pieces):
+        self.queue.put((self.REWRITE, path, (meta, pieces)))
+
+    def remove(self, path):
+        self.queue.put((self.REMOVE, path, None))
+
+    def sync(self, timeout=10):
+        """Wait until everything asked so far is on disk"""
+        done = threading.Event()
+        self.queue.put((self.SYNC, None, done))
+        return done.wait(timeout)
+
+    def stop(self):
+        self.queue.put(None)
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            kind, path, data = job
+            try:
+                if kind == self.APPEND:
+                    with open(path, 'ab') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                elif kind == self.REWRITE:
+                    meta, pieces = data
+                    text = ''.join(pieces).replace('\u2029', '\n')
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    write_atomically(path,
+                        journal_record(JOURNAL_META, json.dumps(meta).encode())
+                        + journal_record(JOURNAL_TEXT, text.encode('utf-8', 'surrogatepass')))
+                elif kind == self.REMOVE:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    data.set()
+            except (OSError, ValueError) as e:
+                self.failed.emit(path, str(e))
+
+class DocumentJournal(QObject):
+    """Journal the unsaved edits of one editor, so they survive a crash.
+
+    Once the document is modified, a DocumentSnapshot of it is written as
+    the base of the journal. From then on every contentsChange is kept as
+    a compact delta, and the deltas are handed to the JournalWriter every
+    FLUSH_INTERVAL ms. When the deltas outgrow COMPACT_BYTES and the base,
+    a new snapshot replaces them. Saving or discarding the changes
+    removes the journal.
+    """
+    FLUSH_INTERVAL = 300
+    COMPACT_BYTES = 1 << 20
+
+    def __init__(self, editor, writer, path):
+        super().__init__(editor)
+        self.editor = editor
+        self.writer = writer
+        self.path = path
+        self.document = editor.document()
+        # Whether the journal has a base, and the snapshot being taken
+        self.active = False
+        self.snapshot = None
+        self.revision = 0
+        self.length = 0
+        self.pending = []
+        self.written = 0
+        self.base_bytes = 0
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FLUSH_INTERVAL)
+        self.flush_timer.timeout.connect(self.flush)
+        self.document.contentsChange.connect(self.on_contents_change)
+        self.document.modificationChanged.connect(self.on_modification_changed)
+
+    def meta(self):
+        return {
+            'file': getattr(self.editor, 'current_file', None),
+            'encoding': self.editor.encoding,
+            'newline': self.editor.newline,
+        }
+
+    def on_modification_changed(self, modified):
+        if self.editor.is_loading():
+            return
+        if not modified:
+            self.discard()
+        elif not self.active and self.snapshot is None:
+            self.take_snapshot()
+
+    def take_snapshot(self):
+        revision = self.document.revision()
+        self.snapshot = DocumentSnapshot(self.document, self)
+        self.snapshot.ready.connect(lambda pieces: self.on_snapshot(revision, pieces))
+        self.snapshot.start()
+
+    def on_snapshot(self, revision, pieces):
+        self.snapshot = None
+        if self.document.revision() != revision:
+            # Edited while it was being copied; a compaction is retried
+            # by the next flush
+            if not self.active:
+                self.take_snapshot()
+            return
+        if not self.document.isModified():
+            return
+        self.writer.rewrite(self.path, self.meta(), pieces)
+        self.active = True
+        self.revision = revision
+        self.length = self.document.characterCount() - 1
+        self.pending = []
+        self.written = 0
+        self.base_bytes = self.length
+
+    def on_contents_change(self, position, removed, added):
+        if not self.active:
+            return
+        revision = self.document.revision()
+        if revision == self.revision:
+            # Only formats changed
+            return
+        self.revision = revision
+        # The counts Qt reports can include the final paragraph separator;
+        # what was removed follows from the change in length
+        length = self.document.characterCount() - 1
+        added = max(0, min(added, length - position))
+        removed = max(0, self.length + added - length)
+        self.length = length
+        text = ''
+        if added:
+            cursor = QTextCursor(self.document)
+            cursor.setPosition(position)
+            cursor.setPosition(position + added, QTextCursor.KeepAnchor)
+            text = cursor.selectedText().replace('\u2029', '\n')
+        self.pending.append(journal_record(
+            JOURNAL_EDIT, text.encode('utf-8', 'surrogatepass'), position, removed))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        self.flush_timer.stop()
+        if not self.pending:
+            return
+        data = b''.join(self.pending)
+        self.pending = []
+        self.writer.append(self.path, data)
+        self.written += len(data)
+        if self.written > max(self.COMPACT_BYTES, self.base_bytes) and self.snapshot is None:
+            self.take_snapshot()
+
+    def sync(self):
+        """Queue all edits, first writing a base if there is none yet"""
+        if self.editor.is_loading() or not self.document.isModified():
+            return
+        if not self.active:
+            if self.snapshot is not None:
+                self.snapshot.cancelled = True
+                self.snapshot = None
+            self.on_snapshot(self.document.revision(), [document_text(self.document)])
+        self.flush()
+
+    def discard(self):
+        """Forget the edits and remove the journal"""
+        self.flush_timer.stop()
+        self.pending = []
+        if self.snapshot is not None:
+            self.snapshot.cancelled = True
+            self.snapshot = None
+        if self.active:
+            self.active = False
+            self.writer.remove(self.path)
+
+class EditJournal(QObject):
+    """The edit journals of all editors, and restoring them at startup.
+
+    Each GlassmorphicCodeEditor gets a DocumentJournal; PieceTableEditor
+    and LargeFileViewer tabs are not journaled. Journals left behind by
+    a session that did not save them are reopened as modified tabs.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.directory = journal_directory()
+        self.journals = {}
+        self.writer = JournalWriter()
+        self.writer.failed.connect(self.on_failed)
+        self.writer.start()
+
+    def attach(self, editor):
+        path = os.path.join(self.directory, f'{uuid.uuid4().hex}.journal')
+        self.journals[editor] = DocumentJournal(editor, self.writer, path)
+
+    def detach(self, editor):
+        journal = self.journals.pop(editor, None)
+        if journal is not None:
+            journal.discard()
+
+    def covers(self, widget):
+        return widget in self.journals
+
+    def restore(self, tab_widget):
+        """Reopen the tabs of every journal in the directory, returning
+        how many were restored"""
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return 0
+        restored = 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.journal'):
+                continue
+            try:
+                journal = read_journal(path)
+                if journal is None:
+                    # Torn before its base was written; nothing to restore
+                    os.remove(path)
+                    continue
+            except (OSError, ValueError) as e:
+                print(f"Could not read journal {path}: {e}")
+                continue
+            meta, text, edits = journal
+            file_path = meta.get('file')
+            title = os.path.basename(file_path) if file_path else "Untitled"
+            editor = tab_widget.add_new_tab(title, text, file_path)
+            editor.current_file = file_path
+            editor.encoding = meta.get('encoding', 'utf-8')
+            editor.newline = meta.get('newline', '\n')
+            # The journal is carried on, so its next base replaces the
+            # old file rather than leaving it behind
+            self.journals[editor].path = path
+            document = editor.document()
+            document.setUndoRedoEnabled(False)
+            cursor = QTextCursor(document)
+            cursor.beginEditBlock()
+            for position, removed, inserted in edits:
+                cursor.setPosition(position)
+                cursor.setPosition(position + removed, QTextCursor.KeepAnchor)
+                cursor.insertText(inserted)
+            cursor.endEditBlock()
+            document.setUndoRedoEnabled(True)
+            document.setModified(True)
+            if file_path:
+                tab_widget.setTabToolTip(tab_widget.indexOf(editor), file_path)
+            restored += 1
+        return restored
+
+    def sync(self):
+        """Write every journal to disk, waiting until it is done"""
+        for journal in self.journals.values():
+            journal.sync()
+        self.writer.sync()
+
+    def discard(self):
+        for journal in self.journals.values():
+            journal.discard()
+
+    def close(self):
+        self.writer.stop()
+        self.writer.wait()
+
+    def on_failed(self, path, message):
+        print(f"Could not write journal {path}: {message}")
+
+class EditorTabWidget(QTabWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.main_window = parent
+        # Editors to close once they are saved
+        self.close_after_save = set()
+        self.setTabsClosable(True)
+        self.setMovable(True)
+        self.tabCloseRequested.connect(self.close_tab)
+        self.setup_style()
+        if hasattr(parent, 'save_service'):
+            parent.save_service.saved.connect(self.on_saved)
+            parent.save_service.failed.connect(self.on_save_failed)
+        self.edit_journal = getattr(parent, 'edit_journal', None)
+
+    def setup_style(self):
+        self.setStyleSheet("""
+            QTabWidget::pane {
+                border: none;
+            }
+            QTabWidget::tab-bar {
+                alignment: left;
+            }
+            QTabBar::tab {
+                background: rgba(40, 42, 54, 0.7);
+                color: #F8F8F2;
+                padding: 8px 16px;
+                border: none;
+                margin-right: 2px;
+            }
+            QTabBar::tab:selected {
+                background: rgba(68, 71, 90, 0.9);
+            }
+            QTabBar::tab:hover {
+                background: rgba(98, 114, 164, 0.8);
+            }
+        """)
+        
+    def add_welcome_page(self):
+        welcome = WelcomePage(self)
+        self.addTab(welcome, "Welcome")
+        self.setTabsClosable(False)  # Don't allow closing the welcome page
+        
+    def add_new_tab(self, title="Untitled", content="", file_path=None):
+        # If this is the first regular tab, make tabs closable
+        if self.count() == 1 and isinstance(self.widget(0), WelcomePage):
+            self.setTabsClosable(True)
+        
+        # The language is picked before loading, so the text is only
+        # highlighted once and plain text gets no highlighter at all
+        editor = GlassmorphicCodeEditor(self, file_path)
+        editor.setPlainText(content)
+        if self.edit_journal is not None:
+            self.edit_journal.attach(editor)
+        index = self.addTab(editor, title)
+        self.setCurrentIndex(index)
+        return editor
+
+    def open_file(self, file_path):
+        """Open file_path in a new tab; files above the piece_table_mb
+        setting get a PieceTableEditor, and those above large_file_mb a
+        read-only LargeFileViewer, instead of an editor"""
+        try:
+            with open('settings.json', 'r') as f:
+                settings = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            settings = {}
+        viewer_limit = settings.get('large_file_mb', LargeFileViewer.LARGE_FILE_MB)
+        piece_table_limit = settings.get('piece_table_mb', PieceTableEditor.PIECE_TABLE_MB)
+
+        title = os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+        if size > min(viewer_limit, piece_table_limit) * (1 << 20):
+            if self.count() == 1 and isinstance(self.widget(0), WelcomePage):
+                self.setTabsClosable(True)
+            if size > viewer_limit * (1 << 20):
+                widget = LargeFileViewer(file_path, self)
+            else:
+                widget = PieceTableEditor(file_path, self)
+                widget.load_aborted.connect(self.close_aborted_tab)
+            self.setCurrentIndex(self.addTab(widget, title))
+            widget.setFocus()
+            return widget
+
+        # The tab shows up right away and fills in as the file loads
+        editor = self.add_new_tab(title, "", file_path)
+        editor.current_file = file_path
+        editor.load_aborted.connect(self.close_aborted_tab)
+        editor.load_file(file_path)
+        return editor
+
+    def close_aborted_tab(self):
+        """Close the tab of an editor whose file failed to load"""
+        index = self.indexOf(self.sender())
+        if index >= 0:
+            self.close_tab(index)
+
+    def close_tab(self, index):
+        """Close the specified tab, once its changes are saved if asked to"""
+        widget = self.widget(index)  # Use self.widget instead of self.tab_widget
+        if widget and hasattr(widget, 'document') and widget.document().isModified():
+            reply = QMessageBox.question(
+                self,
+                'Save Changes?',
+                'Do you want to save changes before closing?',
+                QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel,
+                QMessageBox.Save
+            )
+
+            if reply == QMessageBox.Save:
+                # The tab closes when the save is done, and stays open
+                # if it fails
+                if getattr(widget, 'current_file', None):
+                    self.close_after_save.add(widget)
+                    self.main_window.save_service.save(widget, widget.current_file)
+                elif self.main_window.save_editor_as(widget):
+                    self.close_after_save.add(widget)
+            elif reply == QMessageBox.Discard:
+                self.remove_editor(widget)
+        else:
+            self.remove_editor(widget)
+
+    def remove_editor(self, widget):
+        """Remove the tab of widget and stop its workers"""
+        index = self.indexOf(widget)
+        if index < 0:
+            return
+        self.removeTab(index)
+        if isinstance(widget, (LargeFileViewer, PieceTableEditor)):
+            widget.release()
+        elif isinstance(widget, GlassmorphicCodeEditor):
+            if self.edit_journal is not None:
+                self.edit_journal.detach(widget)
+            widget.release()
+
+        # If no tabs left, show welcome screen
+        if self.count() == 0 and hasattr(self.main_window, 'show_welcome_screen'):
+            self.main_window.show_welcome_screen()
+
+    def on_saved(self, editor, file_path):
+        if editor in self.close_after_save:
+            self.close_after_save.discard(editor)
+            if not editor.document().isModified():
+                self.remove_editor(editor)
+
+    def on_save_failed(self, editor, file_path, message):
+        self.close_after_save.discard(editor)
+
+# Per-project data, like the trigram index, is kept in this directory
+PROJECT_DATA_DIR = '.pylight'
+# Directories find-in-files never descends into
+IGNORED_DIRS = {'.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv',
+                '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.idea',
+                '.vscode', '.eggs', 'build', 'dist', PROJECT_DATA_DIR}
+# Files with these extensions are skipped without being opened
+BINARY_EXTENSIONS = {'.pyc', '.pyo', '.so', '.dll', '.dylib', '.exe', '.o', '.a', '.lib',
+                     '.obj', '.class', '.jar', '.zip', '.gz', '.bz2', '.xz', '.7z', '.tar',
+                     '.whl', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.webp',
+                     '.pdf', '.mp3', '.mp4', '.wav', '.avi', '.mov', '.ttf', '.otf',
+                     '.woff', '.woff2', '.db', '.sqlite', '.bin', '.pkl', '.npy'}
+# Files larger than this are neither searched nor indexed
+MAX_SEARCH_FILE_BYTES = 32 << 20
+# Files with a NUL byte in this many leading bytes count as binary
+BINARY_SAMPLE = 8192
+# Process pool workers run at a lower priority so they never starve the GUI
+WORKER_NICENESS = 5
+
+def gitignore_patterns(root):
+    """The simple patterns of the .gitignore at root"""
+    patterns = []
+    try:
+        with open(os.path.join(root, '.gitignore'), encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                # Negations are not supported; they only search more
+                if line and not line.startswith(('#', '!')):
+                    patterns.append(line.strip('/'))
+    except OSError:
+        pass
+    return patterns
+
+def walk_project(root, cancelled, include=(), top=None, skip=(), directories=None):
+    """Yield the os.DirEntry of every file under root worth searching.
+
+    The tree is walked iteratively with os.scandir, skipping
+    IGNORED_DIRS, the simple patterns of the root .gitignore and
+    BINARY_EXTENSIONS, from top (root by default) down, but not into
+    the directories in skip. include globs, if any, filter the file
+    names. Every directory walked is appended to directories, if given.
+    Stops early once cancelled() is true.
+    """
+    ignored = gitignore_patterns(root)
+    pending = [top or root]
+    while pending:
+        if cancelled():
+            return
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+        if directories is not None:
+            directories.append(directory)
+        for entry in entries:
+            name = entry.name
+            if ignored:
+                relative = entry.path[len(root) + 1:]
+                if any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relative, p) for p in ignored):
+                    continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in IGNORED_DIRS and entry.path not in skip:
+                        pending.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if os.path.splitext(name)[1].lower() in BINARY_EXTENSIONS:
+                continue
+            if include and not any(fnmatch.fnmatch(name, p) for p in include):
+                continue
+            yield entry
+        # Hand the GIL back so the GUI thread never queues behind us
+        time.sleep(0)
+
+def process_pool():
+    """A pool of forked workers, or None where forking is unsafe.
+
+    Spawned workers re-import the main module, which builds widgets at
+    import time, so without fork the work is done by the calling thread.
+    """
+    if sys.platform == 'darwin' or 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context('fork'),
+        initializer=os.nice, initargs=(WORKER_NICENESS,))
+
+def map_batches(function, batches, cancelled, parallel=True, ahead=16):
+    """Yield (batch, function(batch)) for each of batches as they finish.
+
+    With parallel, function runs in a process_pool(), with at most
+    ahead batches handed out at a time; otherwise, or once the pool has
+    broken down, in the calling thread. function must be picklable.
+    Close the generator to stop early.
+    """
+    pool = process_pool() if parallel else None
+    pending = {}
+
+    def collect():
+        finished, _ = concurrent.futures.wait(
+            pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in finished:
+            batch = pending.pop(future)
+            try:
+                result = future.result()
+            except concurrent.futures.process.BrokenProcessPool:
+                # A worker died; do its batch here instead
+                result = function(batch)
+            yield batch, result
+
+    try:
+        for batch in batches:
+            if cancelled():
+                return
+            if pool is not None:
+                try:
+                    pending[pool.submit(function, batch)] = batch
+                except (RuntimeError, concurrent.futures.process.BrokenProcessPool):
+                    pool = None
+                else:
+                    while len(pending) >= ahead and not cancelled():
+                        yield from collect()
+                    continue
+            yield batch, function(batch)
+        while pending and not cancelled():
+            yield from collect()
+    finally:
+        # Only waits for the batches in progress, which are small; it
+        # is the calling thread that waits, not the GUI
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+def search_files(paths, pattern, flags, literal, max_hits):
+    """Search files for a pattern; runs in the find-in-files workers.
+
+    Each file is memory mapped and files without a match are rejected
+    by a single regex search of the map. literal patterns are ASCII and
+    are matched as bytes; other patterns are matched against the
+    decoded text. Files with a NUL byte near the start count as binary.
+    Returns [(path, [(line, column, length, preview), ...]), ...] for
+    the files that matched, at most max_hits hits each; lines are
+    1-based, columns count characters.
+    """
+    if literal:
+        regex = re.compile(pattern.encode('ascii'), flags & ~re.UNICODE)
+        newline = b'\n'
+    else:
+        regex = re.compile(pattern, flags)
+        newline = '\n'
+    results = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size or size > MAX_SEARCH_FILE_BYTES:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if mapped.find(b'\0', 0, BINARY_SAMPLE) >= 0:
+                        continue
+                    if literal:
+                        if regex.search(mapped) is None:
+                            continue
+                        text = mapped[:]
+                    else:
+                        text = mapped[:].decode('utf-8', 'replace')
+        except (OSError, ValueError):
+            continue
+
+        hits = []
+        line = 1
+        counted = 0
+        for match in regex.finditer(text):
+            start, end = match.span()
+            if start == end:
+                # Empty matches would list every position of the file
+                continue
+            line += text.count(newline, counted, start)
+            counted = start
+            line_start = text.rfind(newline, 0, start) + 1
+            line_end = text.find(newline, start)
+            line_text = text[line_start:line_end if line_end >= 0 else len(text)]
+            column = start - line_start
+            length = end - start
+            if literal:
+                line_text = line_text.decode('utf-8', 'replace')
+                column = len(text[line_start:start].decode('utf-8', 'replace'))
+            hits.append((line, column, length, ProjectSearchThread.preview(line_text, column)))
+            if len(hits) >= max_hits:
+                break
+        if hits:
+            results.append((path, hits))
+    return results
+
+class ProjectSearchThread(WorkerThread):
+    """Find a pattern in every text file under a directory.
+
+    The files come from walk_project(), or from paths when a
+    TrigramIndex already narrowed them down, and are searched in
+    BATCH_FILES batches by search_files, in a process pool unless there
+    are only a few. Matches stream out as (job, [(path, hits), ...]) at
+    most every EMIT_INTERVAL seconds; ``progress`` reports the files
+    searched and found so far. Set ``cancelled`` to stop a search.
+    """
+    results_ready = Signal(int, object)
+    progress = Signal(int, int, int)
+    done = Signal(int, int)
+
+    BATCH_FILES = 64
+    # Fewer files than this are searched without a process pool
+    POOL_FILES = 1024
+    EMIT_INTERVAL = 0.05
+    MAX_FILE_HITS = 1000
+    MAX_HITS = 100000
+    PREVIEW_CHARS = 200
+
+    def __init__(self, root, job, pattern, literal, include=(), paths=None):
+        super().__init__()
+        self.root = root
+        self.job = job
+        self.pattern = pattern.pattern
+        self.flags = pattern.flags
+        self.literal = literal
+        self.include = include
+        self.paths = paths
+        self.hits = 0
+        self.searched = 0
+        self.found = 0
+        self.pending_results = []
+        self.last_emit = 0.0
+
+    @classmethod
+    def preview(cls, line_text, column):
+        """The part of a line shown for a hit at column"""
+        line_text = line_text.rstrip('\r\n')
+        if len(line_text) > cls.PREVIEW_CHARS:
+            start = max(0, min(column - cls.PREVIEW_CHARS // 4, len(line_text) - cls.PREVIEW_CHARS))
+            line_text = line_text[start:start + cls.PREVIEW_CHARS]
+        return line_text.strip()
+
+    def batches(self):
+        if self.paths is None:
+            paths = (entry.path for entry in walk_project(self.root, lambda: self.cancelled,
+                                                          self.include))
+        else:
+            paths = (path for path in self.paths if not self.include
+                     or any(fnmatch.fnmatch(os.path.basename(path), p) for p in self.include))
+        batch = []
+        for path in paths:
+            batch.append(path)
+            self.found += 1
+            if len(batch) == self.BATCH_FILES:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self):
+        search = functools.partial(search_files, pattern=self.pattern, flags=self.flags,
+                                   literal=self.literal, max_hits=self.MAX_FILE_HITS)
+        parallel = self.paths is None or len(self.paths) > self.POOL_FILES
+        results = map_batches(search, self.batches(), lambda: self.cancelled, parallel)
+        try:
+            for batch, found in results:
+                self.add_results(batch, found)
+                if self.hits >= self.MAX_HITS:
+                    break
+        finally:
+            results.close()
+        if self.cancelled:
+            return
+        self.emit_results(force=True)
+        self.done.emit(self.job, self.hits)
+
+    def add_results(self, batch, results):
+        self.searched += len(batch)
+        for path, hits in results:
+            hits = hits[:self.MAX_HITS - self.hits]
+            if not hits:
+                break
+            self.hits += len(hits)
+            self.pending_results.append((path, hits))
+        self.emit_results()
+
+    def emit_results(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last_emit < self.EMIT_INTERVAL:
+            return
+        self.last_emit = now
+        if self.pending_results:
+            self.results_ready.emit(self.job, self.pending_results)
+            self.pending_results = []
+        self.progress.emit(self.job, self.searched, self.found)
+
+def file_trigrams(data):
+    """Sorted array('I') of the distinct trigrams of the bytes data.
+
+    A trigram is b0 << 16 | b1 << 8 | b2 after ASCII lower-casing, so
+    one index serves case-sensitive and -insensitive searches alike.
+    Trigrams never span a newline and repeated lines are read once.
+    """
+    triples = set()
+    for line in set(data.lower().split(b'\n')):
+        triples.update(zip(line, line[1:], line[2:]))
+    return array('I', sorted((a << 16) | (b << 8) | c for a, b, c in triples))
+
+def pattern_trigrams(pattern):
+    """Trigrams every match of a compiled pattern contains, as in
+    file_trigrams, or None if it has none to narrow a search with.
+
+    They come from the runs of literal characters the pattern cannot
+    match without; anything else (classes, alternatives, optional
+    parts) just ends a run. Case-insensitive runs only keep their ASCII
+    parts, as the index folds ASCII letters only.
+    """
+    runs = []
+
+    def walk(items, ignore_case):
+        run = []
+        for op, argument in items:
+            if op == sre_parse.LITERAL:
+                run.append(chr(argument))
+                continue
+            runs.append((''.join(run), ignore_case))
+            run = []
+            if op == sre_parse.SUBPATTERN:
+                _, add_flags, del_flags, items = argument
+                walk(items, bool((ignore_case or add_flags & re.IGNORECASE)
+                                 and not del_flags & re.IGNORECASE))
+            elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+                walk(argument, ignore_case)
+            elif op in REQUIRED_REPEATS and argument[0] >= 1:
+                walk(argument[2], ignore_case)
+        runs.append((''.join(run), ignore_case))
+
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except re.error:
+        return None
+    walk(parsed, bool(parsed.state.flags & re.IGNORECASE))
+    trigrams = set()
+    for text, ignore_case in runs:
+        data = text.encode('utf-8').lower()
+        pieces = re.split(rb'[\x80-\xff]+', data) if ignore_case else [data]
+        for piece in pieces:
+            trigrams.update(file_trigrams(piece))
+    return sorted(trigrams) or None
+
+REQUIRED_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                    getattr(sre_parse, 'POSSESSIVE_REPEAT', sre_parse.MAX_REPEAT)}
+
+def index_files(paths):
+    """[(path, mtime_ns, size, trigrams bytes or None), ...] for files;
+    runs in the index workers.
+
+    Files that are empty, binary or too large to search get None, like
+    files that vanished, which also have no mtime_ns and size.
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                data = f.read(MAX_SEARCH_FILE_BYTES + 1)
+        except OSError:
+            results.append((path, None, None, None))
+            continue
+        trigrams = None
+        if 0 < len(data) <= MAX_SEARCH_FILE_BYTES and b'\0' not in data[:BINARY_SAMPLE]:
+            trigrams = file_trigrams(data).tobytes()
+        results.append((path, stat.st_mtime_ns, stat.st_size, trigrams))
+    return results
+
+# The set bits of each byte value, for reading bitmaps
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+def bitmap_ids(bitmap):
+    """The ids set in a bitmap (bytes, lowest bit of the first byte is id 0)"""
+    ids = []
+    for index, value in enumerate(bitmap):
+        if value:
+            base = index << 3
+            ids.extend(base + bit for bit in BYTE_BITS[value])
+    return ids
+
+def ids_bitmap(ids, size):
+    """The bitmap of size bytes with ids set"""
+    bitmap = bytearray(size)
+    for i in ids:
+        bitmap[i >> 3] |= 1 << (i & 7)
+    return bitmap
+
+class TrigramIndex:
+    """On-disk trigram index of the files of a project.
+
+    ``files[id]`` is [path relative to the root, mtime_ns, size]. Files
+    that changed get a new id; the old one, like those of deleted
+    files, goes in ``removed``. The posting list of a trigram, the ids
+    of the files that contain it, is stored as sorted uint32s, or as a
+    bitmap over all ids once that is smaller, and is only read from the
+    mapped file when a query needs it.
+
+    The file holds a header, the posting lists, then the sorted
+    trigrams, the offsets and kinds of their lists and the file table.
+    """
+    MAGIC = b'PLTRI001'
+    # magic, ids, trigrams, offset of the trigrams, offset of the table
+    HEADER = struct.Struct('<8sIIQQ')
+    ARRAY, BITMAP = 0, 1
+
+    def __init__(self):
+        self.files = []
+        self.removed = set()
+        self.keys = array('I')
+        self.offsets = array('Q', [0])
+        self.kinds = b''
+        self.mapped = None
+
+    @classmethod
+    def load(cls, path):
+        """The index written to path; OSError or ValueError if it is
+        missing or unreadable"""
+        index = cls()
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, _, key_count, keys_start, table_start = cls.HEADER.unpack_from(mapped)
+            if magic != cls.MAGIC:
+                raise ValueError(f"{path} is not a trigram index")
+            offsets_start = keys_start + 4 * key_count
+            kinds_start = offsets_start + 8 * (key_count + 1)
+            index.keys.frombytes(mapped[keys_start:offsets_start])
+            index.offsets = array('Q')
+            index.offsets.frombytes(mapped[offsets_start:kinds_start])
+            index.kinds = mapped[kinds_start:kinds_start + key_count]
+            table = json.loads(mapped[table_start:])
+            index.files = table['files']
+            index.removed = set(table['removed'])
+        except (struct.error, KeyError, TypeError) as e:
+            mapped.close()
+            raise ValueError(f"{path} is damaged: {e}")
+        except ValueError:
+            mapped.close()
+            raise
+        index.mapped = mapped
+        return index
+
+    def close(self):
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+
+    def postings(self, number):
+        """The posting list of the trigram at keys[number]: an array of
+        ids or bitmap bytes, see kinds"""
+        start = self.HEADER.size + self.offsets[number]
+        data = self.mapped[start:self.HEADER.size + self.offsets[number + 1]]
+        if self.kinds[number] == self.BITMAP:
+            return data
+        ids = array('I')
+        ids.frombytes(data)
+        return ids
+
+    def find(self, trigram):
+        """Position of trigram in keys, or -1"""
+        number = bisect.bisect_left(self.keys, trigram)
+        if number < len(self.keys) and self.keys[number] == trigram:
+            return number
+        return -1
+
+    def lookup(self, trigrams):
+        """Set of the ids of the files containing all of trigrams,
+        including ids in removed"""
+        numbers = []
+        for trigram in trigrams:
+            number = self.find(trigram)
+            if number < 0:
+                return set()
+            numbers.append(number)
+        # Shortest lists first; arrays are always sparser than bitmaps
+        numbers.sort(key=lambda n: (self.kinds[n], self.offsets[n + 1] - self.offsets[n]))
+        ids = None
+        bits = None
+        for number in numbers:
+            postings = self.postings(number)
+            if self.kinds[number] == self.ARRAY:
+                ids = set(postings) if ids is None else ids.intersection(postings)
+            elif ids is not None:
+                ids = {i for i in ids if i >> 3 < len(postings) and postings[i >> 3] >> (i & 7) & 1}
+            elif bits is None:
+                bits = int.from_bytes(postings, 'little')
+            else:
+                bits &= int.from_bytes(postings, 'little')
+            if ids is not None and not ids:
+                break
+        if ids is None:
+            ids = set(bitmap_ids(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')))
+        return ids
+
+    @classmethod
+    def write(cls, path, files, removed, sources):
+        """Write an index of files to path, atomically.
+
+        Each source is a TrigramIndex or a dict of trigram -> array of
+        ids, and all the ids of a source are higher than those of the
+        sources before it, so joining their posting lists in order keeps
+        them sorted.
+        """
+        bitmap_size = (len(files) + 7) // 8
+        keys = set()
+        for source in sources:
+            keys.update(source.keys if isinstance(source, TrigramIndex) else source)
+        keys = array('I', sorted(keys))
+        offsets = array('Q', [0])
+        kinds = bytearray()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(bytes(cls.HEADER.size))
+            written = 0
+            for trigram in keys:
+                parts = []
+                for source in sources:
+                    if isinstance(source, TrigramIndex):
+                        number = source.find(trigram)
+                        if number >= 0:
+                            parts.append(source.postings(number))
+                    elif trigram in source:
+                        parts.append(source[trigram])
+                count = sum(len(part) if isinstance(part, array) else
+                            int.from_bytes(part, 'little').bit_count() for part in parts)
+                if 4 * count >= bitmap_size:
+                    bits = 0
+                    for part in parts:
+                        if isinstance(part, array):
+                            part = ids_bitmap(part, bitmap_size)
+                        bits |= int.from_bytes(part, 'little')
+                    data = bits.to_bytes(bitmap_size, 'little')
+                    kinds.append(cls.BITMAP)
+                else:
+                    ids = array('I')
+                    for part in parts:
+                        ids.extend(part if isinstance(part, array) else bitmap_ids(part))
+                    data = ids.tobytes()
+                    kinds.append(cls.ARRAY)
+                f.write(data)
+                written += len(data)
+                offsets.append(written)
+            keys_start = cls.HEADER.size + written
+            f.write(keys.tobytes())
+            f.write(offsets.tobytes())
+            f.write(kinds)
+            table_start = keys_start + 4 * len(keys) + 8 * len(offsets) + len(kinds)
+            f.write(json.dumps({'files': files, 'removed': sorted(removed)}).encode('utf-8'))
+            f.seek(0)
+            f.write(cls.HEADER.pack(cls.MAGIC, len(files), len(keys), keys_start, table_start))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+def make_project_data_dir(root):
+    """Create the PROJECT_DATA_DIR of the project at root, with a
+    .gitignore so its caches never end up in the project's commits"""
+    directory = os.path.join(root, PROJECT_DATA_DIR)
+    os.makedirs(directory, exist_ok=True)
+    ignore = os.path.join(directory, '.gitignore')
+    if not os.path.exists(ignore):
+        with open(ignore, 'w', encoding='utf-8') as file:
+            file.write('*\n')
+    return directory
+
+def trigram_index_path(root, generation):
+    """Where generation of the trigram index of the project at root goes.
+
+    A new index is written next to the one in use instead of over it, as
+    a mapped file cannot be replaced everywhere.
+    """
+    return os.path.join(root, PROJECT_DATA_DIR, f'trigrams.{generation}.idx')
+
+class TrigramIndexThread(WorkerThread):
+    """Bring the on-disk TrigramIndex of a project up to date.
+
+    Without updates, the newest index on disk is loaded (and reported
+    with ``loaded`` so it can serve searches right away), the project is
+    walked, and files whose mtime or size changed are indexed again in a
+    process pool. With updates, a list of (id, trigrams) already worked
+    out for files[id], they are merged into base instead. Either way a
+    new generation of the index is written, unless nothing changed, and
+    ``done`` reports (index, generation, directories walked).
+    Posting lists collected in memory are written out to a temporary
+    segment every SEGMENT_POSTINGS postings, so building the index of a
+    large project takes bounded memory.
+    """
+    loaded = Signal(object, int)
+    done = Signal(object, int, object)
+    failed = Signal(str)
+
+    BATCH_FILES = 64
+    SEGMENT_POSTINGS = 1 << 24
+
+    def __init__(self, root, base=None, generation=0, files=None, removed=None, updates=None):
+        super().__init__()
+        self.root = root
+        self.base = base
+        self.generation = generation
+        self.files = [] if files is None else files
+        self.removed = set() if removed is None else removed
+        self.updates = updates
+        self.segments = []
+        self.postings = {}
+        self.posting_count = 0
+
+    def run(self):
+        try:
+            make_project_data_dir(self.root)
+            if self.updates is None:
+                self.refresh()
+            else:
+                for number, trigrams in self.updates:
+                    self.add_postings(number, trigrams)
+                self.write()
+        except (OSError, ValueError) as e:
+            if not self.cancelled:
+                self.failed.emit(str(e))
+        finally:
+            for segment, path in self.segments:
+                segment.close()
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def load_latest(self):
+        """Load the newest readable generation and delete the others,
+        along with whatever an interrupted build left behind"""
+        directory = os.path.join(self.root, PROJECT_DATA_DIR)
+        names = [name for name in os.listdir(directory) if name.startswith('trigrams.')]
+        generations = sorted((int(match.group(1)) for match in
+                              map(re.compile(r'trigrams\.(\d+)\.idx').fullmatch, names) if match),
+                             reverse=True)
+        for generation in generations:
+            try:
+                self.base = TrigramIndex.load(trigram_index_path(self.root, generation))
+            except (OSError, ValueError):
+                continue
+            self.generation = generation
+            self.files = list(self.base.files)
+            self.removed = set(self.base.removed)
+            self.loaded.emit(self.base, generation)
+            break
+        for name in names:
+            path = os.path.join(directory, name)
+            if self.base is None or path != trigram_index_path(self.root, self.generation):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def refresh(self):
+        self.load_latest()
+        directories = []
+        known = {}
+        if self.base is not None:
+            known = {file[0]: number for number, file in enumerate(self.files)
+                     if number not in self.removed}
+        paths = []
+        changed = []
+        for entry in walk_project(self.root, lambda: self.cancelled, directories=directories):
+            paths.append(entry.path)
+            relative = os.path.relpath(entry.path, self.root)
+            number = known.pop(relative, None)
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if number is not None:
+                if self.files[number][1:] == [stat.st_mtime_ns, stat.st_size]:
+                    continue
+                self.removed.add(number)
+            changed.append(entry.path)
+        if self.cancelled:
+            return
+        self.removed.update(known.values())
+        if self.base is not None and not changed and not known:
+            self.done.emit(self.base, self.generation, directories)
+            return
+        if self.base is None or 2 * len(self.removed) > len(self.files):
+            # Mostly stale; the lists of removed ids are not worth keeping
+            self.base = None
+            self.files = []
+            self.removed = set()
+            changed = paths
+
+        batches = (changed[i:i + self.BATCH_FILES] for i in range(0, len(changed), self.BATCH_FILES))
+        results = map_batches(index_files, batches, lambda: self.cancelled)
+        try:
+            for _, indexed in results:
+                for path, mtime, size, trigrams in indexed:
+                    if mtime is None:
+                        continue
+                    self.files.append([os.path.relpath(path, self.root), mtime, size])
+                    if trigrams:
+                        self.add_postings(len(self.files) - 1, trigrams)
+        finally:
+            results.close()
+        if self.cancelled:
+            return
+        self.write(directories)
+
+    def add_postings(self, number, trigrams):
+        postings = self.postings
+        for trigram in array('I', trigrams) if isinstance(trigrams, bytes) else trigrams:
+            ids = postings.get(trigram)
+            if ids is None:
+                ids = postings[trigram] = array('I')
+            ids.append(number)
+        self.posting_count += len(trigrams)
+        if self.posting_count >= self.SEGMENT_POSTINGS:
+            path = trigram_index_path(self.root, f'{self.generation}-{len(self.segments)}.segment')
+            TrigramIndex.write(path, self.files, (), [self.postings])
+            self.segments.append((TrigramIndex.load(path), path))
+            self.postings = {}
+            self.posting_count = 0
+
+    def write(self, directories=None):
+        sources = [] if self.base is None else [self.base]
+        sources.extend(segment for segment, _ in self.segments)
+        sources.append(self.postings)
+        generation = self.generation + 1
+        path = trigram_index_path(self.root, generation)
+        TrigramIndex.write(path, self.files, self.removed, sources)
+        if self.cancelled:
+            os.remove(path)
+            return
+        self.done.emit(TrigramIndex.load(path), generation, directories)
+
+class TrigramUpdateThread(WorkerThread):
+    """Find the files that changed in some directories of a project, or
+    among some paths, and work out their trigrams.
+
+    known maps the relative paths of the files in the index to their
+    [mtime_ns, size]; directories in watched are not walked into.
+    ``done`` reports [(relative path, mtime_ns, size, trigrams bytes or
+    None), ...], with a None mtime_ns for files that are gone, the
+    directories walked and the watched directories that are gone.
+    """
+    done = Signal(object, object, object)
+
+    def __init__(self, root, directories, paths, known, watched):
+        super().__init__()
+        self.root = root
+        self.directories = directories
+        self.paths = paths
+        self.known = known
+        self.watched = watched
+
+    def run(self):
+        seen = set()
+        walked = []
+        candidates = set(self.paths)
+        # A watched directory renamed or removed with its parent only
+        # shows up as a change of the parent
+        directories = set(self.directories)
+        directories.update(directory for directory in self.watched
+                           if os.path.dirname(directory) in directories)
+        gone = []
+        for directory in sorted(directories):
+            prefix = os.path.relpath(directory, self.root) + os.sep
+            if prefix == '.' + os.sep:
+                prefix = ''
+            if not os.path.isdir(directory):
+                # Gone, and everything below it with it
+                gone.append(directory)
+                candidates.update(os.path.join(self.root, relative) for relative in self.known
+                                  if relative.startswith(prefix))
+                continue
+            if directory not in self.directories:
+                continue
+            for entry in walk_project(self.root, lambda: self.cancelled, top=directory,
+                                      skip=self.watched - {directory}, directories=walked):
+                seen.add(entry.path)
+                candidates.add(entry.path)
+            # Files directly in the directory that were not seen are gone
+            candidates.update(os.path.join(self.root, relative) for relative in self.known
+                              if relative.startswith(prefix) and os.sep not in relative[len(prefix):])
+        changed = []
+        for path in candidates:
+            if self.cancelled:
+                return
+            relative = os.path.relpath(path, self.root)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if relative in self.known:
+                    changed.append(path)
+                continue
+            if self.known.get(relative) != [stat.st_mtime_ns, stat.st_size]:
+                changed.append(path)
+        updates = [(os.path.relpath(path, self.root), mtime, size, trigrams)
+                   for path, mtime, size, trigrams in index_files(changed)]
+        if not self.cancelled:
+            self.done.emit(updates, walked, gone)
+
+class ProjectIndex(QObject):
+    """Keeps the trigram index of a project current while it is open.
+
+    The index is brought up to date in the background when the project
+    opens. After that, the directories of the project are watched, and
+    files saved from the editor are reported through file_saved();
+    changed files are indexed again after UPDATE_DELAY and kept in
+    memory until COMPACT_FILES of them are merged into a new generation
+    on disk. Files changed in place by other programs are only picked
+    up the next time the project opens, as that changes no directory.
+
+    candidates() narrows a search down to the files that contain every
+    trigram of its pattern.
+    """
+    UPDATE_DELAY = 1000
+    COMPACT_FILES = 2000
+
+    # Open indexes, told about files saved from the editor
+    open_indexes = set()
+
+    def __init__(self, root, parent=None):
+        super().__init__(parent)
+        self.root = os.path.abspath(root)
+        self.base = None
+        self.generation = 0
+        self.files = []
+        self.removed = set()
+        # Live relative path -> id
+        self.ids = {}
+        # Id -> frozenset of trigrams, for ids past those of base
+        self.overlay = {}
+        self.ready = False
+        self.job = None
+        self.dirty_directories = set()
+        self.dirty_paths = set()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(self.UPDATE_DELAY)
+        self.update_timer.timeout.connect(self.start_update)
+
+        ProjectIndex.open_indexes.add(self)
+        self.start_job(TrigramIndexThread(self.root))
+
+    @classmethod
+    def file_saved(cls, path):
+        path = os.path.abspath(path)
+        for index in cls.open_indexes:
+            if path.startswith(index.root + os.sep):
+                index.dirty_paths.add(path)
+                index.update_timer.start()
+
+    def close(self):
+        ProjectIndex.open_indexes.discard(self)
+        self.update_timer.stop()
+        if self.job is not None:
+            self.job.cancelled = True
+            self.job = None
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        if self.base is not None:
+            self.base.close()
+
+    def start_job(self, job):
+        self.job = job
+        if isinstance(job, TrigramIndexThread):
+            job.loaded.connect(self.on_loaded)
+            job.done.connect(self.on_index_written)
+            job.failed.connect(self.on_failed)
+        else:
+            job.done.connect(self.on_updated)
+        job.start()
+
+    def set_base(self, index, generation):
+        old, old_path = self.base, trigram_index_path(self.root, self.generation)
+        self.base = index
+        self.generation = generation
+        self.files = list(index.files)
+        self.removed = set(index.removed)
+        self.ids = {file[0]: number for number, file in enumerate(self.files)
+                    if number not in self.removed}
+        self.overlay = {}
+        if old is not None and old is not index:
+            old.close()
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def on_loaded(self, index, generation):
+        if self.sender() is self.job:
+            self.set_base(index, generation)
+
+    def on_index_written(self, index, generation, directories):
+        if self.sender() is not self.job:
+            return
+        self.job = None
+        # Updates wait for the job, so the index holds every change
+        self.set_base(index, generation)
+        if directories is not None:
+            self.ready = True
+            self.watcher.addPaths(directories)
+        if self.dirty_directories or self.dirty_paths:
+            self.update_timer.start()
+
+    def on_failed(self, message):
+        if self.sender() is self.job:
+            self.job = None
+            print(f"Could not index {self.root}: {message}")
+
+    def on_directory_changed(self, directory):
+        self.dirty_directories.add(directory)
+        self.update_timer.start()
+
+    def start_update(self):
+        if self.job is not None or not self.ready:
+            # Picked up once the job in progress is done
+            return
+        known = {relative: self.files[number][1:] for relative, number in self.ids.items()}
+        job = TrigramUpdateThread(self.root, sorted(self.dirty_directories), sorted(self.dirty_paths),
+                                  known, set(self.watcher.directories()))
+        self.dirty_directories = set()
+        self.dirty_paths = set()
+        self.start_job(job)
+
+    def on_updated(self, updates, directories, gone):
+        if self.sender() is not self.job:
+            return
+        self.job = None
+        watched = set(self.watcher.directories())
+        gone = [directory for directory in gone if directory in watched]
+        if gone:
+            self.watcher.removePaths(gone)
+        for relative, mtime, size, trigrams in updates:
+            number = self.ids.pop(relative, None)
+            if number is not None:
+                self.removed.add(number)
+                self.overlay.pop(number, None)
+            if mtime is None:
+                continue
+            number = len(self.files)
+            self.files.append([relative, mtime, size])
+            self.ids[relative] = number
+            self.overlay[number] = frozenset(array('I', trigrams)) if trigrams else frozenset()
+        if directories:
+            self.watcher.addPaths(directories)
+        if len(self.files) - len(self.base.files) >= self.COMPACT_FILES:
+            self.start_job(TrigramIndexThread(
+                self.root, self.base, self.generation, list(self.files), set(self.removed),
+                [(number, sorted(trigrams)) for number, trigrams in self.overlay.items()]))
+        elif self.dirty_directories or self.dirty_paths:
+            self.update_timer.start()
+
+    def candidates(self, pattern):
+        """Absolute paths of the files that may match a compiled pattern,
+        or None if the index cannot tell (not built yet, or the pattern
+        has no trigrams) and every file has to be searched"""
+        if not self.ready:
+            return None
+        trigrams = pattern_trigrams(pattern)
+        if trigrams is None:
+            return None
+        ids = self.base.lookup(trigrams) - self.removed
+        ids.update(number for number, present in self.overlay.items()
+                   if number not in self.removed and present.issuperset(trigrams))
+        return [os.path.join(self.root, self.files[number][0]) for number in sorted(ids)]
+
+# What comes before the name of a definition
+DEFINITION_KEYWORD = re.compile(r'(?:async\s+)?(?:def|class)\s+')
+
+def python_symbols(data):
+    """[(name, kind, line, column, scope, detail), ...] of Python source
+    data (bytes); runs in the index workers.
+
+    Kinds are class, function, method, variable (module globals) and
+    import; scope is the dotted name of the enclosing classes and detail
+    the module an import comes from. Only classes are looked into, so
+    the names local to functions are left out; so are files that do not
+    parse. Lines are 1-based and columns count characters, like the hits
+    of search_files.
+    """
+    text = data.decode('utf-8', 'replace')
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return []
+    # The line breaks ast counts; splitlines() also breaks at form feeds
+    lines = re.split(r'\r\n|\r|\n', text)
+    symbols = []
+
+    def add(name, kind, node, scope, detail=''):
+        line = lines[node.lineno - 1]
+        # Offsets are in UTF-8 bytes, and definitions start at a keyword
+        column = len(line.encode('utf-8')[:node.col_offset].decode('utf-8', 'replace'))
+        if kind in ('class', 'function', 'method'):
+            keyword = DEFINITION_KEYWORD.match(line, column)
+            if keyword is not None:
+                column = keyword.end()
+        symbols.append((name, kind, node.lineno, column, scope, detail))
+
+    def visit(body, scope, in_class):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                add(node.name, 'class', node, scope)
+                visit(node.body, f'{scope}.{node.name}' if scope else node.name, True)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                add(node.name, 'method' if in_class else 'function', node, scope)
+            elif in_class:
+                continue
+            elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    for name in ast.walk(target):
+                        if isinstance(name, ast.Name):
+                            add(name.id, 'variable', name, scope)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                module = ''
+                if isinstance(node, ast.ImportFrom):
+                    module = '.' * node.level + (node.module or '')
+                for alias in node.names:
+                    if alias.name == '*':
+                        continue
+                    if alias.asname:
+                        name = alias.asname
+                    else:
+                        name = alias.name if module else alias.name.split('.')[0]
+                    # Relative modules like '.' or '..' already end with the dot
+                    detail = module + ('' if not module or module.endswith('.') else '.') + alias.name
+                    add(name, 'import', alias, scope, detail)
+            else:
+                # Names defined under if, try, with and loops are globals too
+                for field in ('body', 'orelse', 'finalbody'):
+                    visit(getattr(node, field, ()), scope, False)
+                for handler in getattr(node, 'handlers', ()):
+                    visit(handler.body, scope, False)
+
+    visit(tree.body, '', False)
+    return symbols
+
+def index_symbols(paths):
+    """[(path, mtime_ns, size, symbols or None), ...] for Python files;
+    runs in the index workers.
+
+    Files that vanished get None, and no mtime_ns and size; files too
+    large to search, or whose symbols cannot be read, have none.
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                data = f.read(MAX_SEARCH_FILE_BYTES + 1)
+        except OSError:
+            results.append((path, None, None, None))
+            continue
+        symbols = []
+        if len(data) <= MAX_SEARCH_FILE_BYTES:
+            try:
+                symbols = python_symbols(data)
+            except Exception as e:
+                # One odd file must not stop the whole project's index
+                print(f"Could not read the symbols of {path}: {e}")
+        results.append((path, stat.st_mtime_ns, stat.st_size, symbols))
+    return results
+
+class SymbolDatabase:
+    """The SQLite cache of the symbols of a project's Python files.
+
+    ``files`` has a row per file indexed, with the mtime_ns and size it
+    had then, and ``symbols`` a row per symbol of python_symbols().
+    Paths are relative to the root. Each thread opens its own; the
+    journal is a write-ahead log, so the GUI reads while a worker
+    writes. A cache of an older SCHEMA is dropped and built again.
+    """
+    SCHEMA = 1
+    FILE_NAME = 'symbols.db'
+
+    def __init__(self, root):
+        self.root = root
+        self.connection = sqlite3.connect(
+            os.path.join(root, PROJECT_DATA_DIR, self.FILE_NAME), timeout=10)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA:
+            with self.connection:
+                self.connection.executescript(f"""
+                    DROP TABLE IF EXISTS symbols;
+                    DROP TABLE IF EXISTS files;
+                    CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL,
+                                        mtime INTEGER NOT NULL, size INTEGER NOT NULL);
+                    CREATE TABLE symbols (file INTEGER NOT NULL, name TEXT NOT NULL,
+                                          kind TEXT NOT NULL, line INTEGER NOT NULL,
+                                          column INTEGER NOT NULL, scope TEXT NOT NULL,
+                                          detail TEXT NOT NULL);
+                    CREATE INDEX symbols_name ON symbols (name);
+                    CREATE INDEX symbols_file ON symbols (file);
+                    PRAGMA user_version = {self.SCHEMA};
+                """)
+
+    def close(self):
+        self.connection.close()
+
+    def files(self):
+        """Relative path -> [mtime_ns, size] of every file indexed"""
+        return {path: [mtime, size] for path, mtime, size in
+                self.connection.execute('SELECT path, mtime, size FROM files')}
+
+    def remove(self, paths):
+        """Drop the relative paths, and their symbols"""
+        with self.connection:
+            self.delete(paths)
+
+    def delete(self, paths):
+        for path in paths:
+            row = self.connection.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()
+            if row is not None:
+                self.connection.execute('DELETE FROM symbols WHERE file = ?', row)
+                self.connection.execute('DELETE FROM files WHERE id = ?', row)
+
+    def replace(self, indexed):
+        """Store the results of index_symbols(), in one transaction"""
+        with self.connection:
+            self.delete(os.path.relpath(path, self.root) for path, _, _, _ in indexed)
+            for path, mtime, size, symbols in indexed:
+                if mtime is None:
+                    continue
+                number = self.connection.execute(
+                    'INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)',
+                    (os.path.relpath(path, self.root), mtime, size)).lastrowid
+                self.connection.executemany(
+                    'INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(number, *symbol) for symbol in symbols])
+
+    def names(self):
+        """Every name defined in the project, imports aside"""
+        return {name for name, in self.connection.execute(
+            "SELECT DISTINCT name FROM symbols WHERE kind != 'import'")}
+
+    def lookup(self, name, limit):
+        """Up to limit (absolute path, line, column, kind, scope) where
+        name is defined, imports aside"""
+        rows = self.connection.execute(
+            "SELECT files.path, line, column, kind, scope FROM symbols"
+            " JOIN files ON files.id = symbols.file"
+            " WHERE name = ? AND kind != 'import' LIMIT ?", (name, limit))
+        return [(os.path.join(self.root, path), line, column, kind, scope)
+                for path, line, column, kind, scope in rows]
+
+class SymbolIndexThread(WorkerThread):
+    """Bring the SymbolDatabase of a project up to date.
+
+    Without paths, the project is walked, and the Python files whose
+    mtime or size changed since they were indexed are parsed again, in
+    a process pool when there are more than POOL_FILES; files that are
+    gone are dropped. With paths, only those are looked at. ``done``
+    reports the names defined in the project and a FuzzyMatcher of
+    them when they are not those of names, or (None, None).
+    """
+    done = Signal(object, object)
+    failed = Signal(str)
+
+    BATCH_FILES = 64
+    POOL_FILES = 256
+    PATTERNS = ('*.py', '*.pyw')
+
+    def __init__(self, root, paths=None, names=None):
+        super().__init__()
+        self.root = root
+        self.paths = paths
+        self.names = names
+
+    def run(self):
+        database = None
+        try:
+            make_project_data_dir(self.root)
+            database = SymbolDatabase(self.root)
+            self.refresh(database)
+        except (OSError, sqlite3.Error) as e:
+            if not self.cancelled:
+                self.failed.emit(str(e))
+        finally:
+            if database is not None:
+                database.close()
+
+    def refresh(self, database):
+        known = database.files()
+        changed = []
+        if self.paths is None:
+            gone = set(known)
+            for entry in walk_project(self.root, lambda: self.cancelled, self.PATTERNS):
+                relative = os.path.relpath(entry.path, self.root)
+                gone.discard(relative)
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if known.get(relative) != [stat.st_mtime_ns, stat.st_size]:
+                    changed.append(entry.path)
+        else:
+            gone = set()
+            for path in self.paths:
+                relative = os.path.relpath(path, self.root)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    gone.add(relative)
+                    continue
+                if known.get(relative) != [stat.st_mtime_ns, stat.st_size]:
+                    changed.append(path)
+        if self.cancelled:
+            return
+
+        batches = (changed[i:i + self.BATCH_FILES] for i in range(0, len(changed), self.BATCH_FILES))
+        results = map_batches(index_symbols, batches, lambda: self.cancelled,
+                              len(changed) > self.POOL_FILES)
+        try:
+            for _, indexed in results:
+                database.replace(indexed)
+        finally:
+            results.close()
+        if self.cancelled:
+            return
+        database.remove(gone & set(known))
+
+        names = database.names()
+        if names == self.names:
+            self.done.emit(None, None)
+        else:
+            self.done.emit(names, FuzzyMatcher(names))
+
+class SymbolIndex(QObject):
+    """Keeps the symbols of a project's Python files while it is open.
+
+    The SymbolDatabase is brought up to date in the background when the
+    project opens, so reopening it only parses the files that changed.
+    Files saved from the editor are reported through file_saved() and
+    indexed again after UPDATE_DELAY; like for ProjectIndex, files
+    changed by other programs wait until the project opens again.
+
+    matcher, once built, fuzzy matches the names defined in the project,
+    for completion; definitions() and search() find where they are.
+    """
+    UPDATE_DELAY = 1000
+    LOOKUP_LIMIT = 100
+
+    # Open indexes, told about files saved from the editor
+    open_indexes = set()
+
+    def __init__(self, root, parent=None):
+        super().__init__(parent)
+        self.root = os.path.abspath(root)
+        self.names = None
+        self.matcher = None
+        # The GUI's own connection, opened once a job made the database
+        self.database = None
+        self.job = None
+        self.dirty_paths = set()
+
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(self.UPDATE_DELAY)
+        self.update_timer.timeout.connect(self.start_update)
+
+        SymbolIndex.open_indexes.add(self)
+        self.start_job(SymbolIndexThread(self.root))
+
+    @classmethod
+    def file_saved(cls, path):
+        path = os.path.abspath(path)
+        if not path.endswith(('.py', '.pyw')):
+            return
+        for index in cls.open_indexes:
+            if path.startswith(index.root + os.sep):
+                index.dirty_paths.add(path)
+                index.update_timer.start()
+
+    @classmethod
+    def matcher_for(cls, path):
+        """The FuzzyMatcher of the project path is in, or None"""
+        if path:
+            path = os.path.abspath(path)
+            for index in cls.open_indexes:
+                if path.startswith(index.root + os.sep):
+                    return index.matcher
+        return None
 
-        if not self.isReadOnly():
-            selection = QTextEdit.ExtraSelection()
-            
-            # Set the line color
-            lineColor = QColor(EDITOR_COLORS['current_line'])
-            lineColor.setAlpha(60)  # Make it semi-transparent
-            
-            selection.format.setBackground(lineColor)
-            selection.format.setProperty(QTextFormat.FullWidthSelection, True)
-            selection.cursor = self.textCursor()
-            selection.cursor.clearSelection()
-            
-            extraSelections.append(selection)
-        
-        self.setExtraSelections(extraSelections)
+    def close(self):
+        SymbolIndex.open_indexes.discard(self)
+        self.update_timer.stop()
+        if self.job is not None:
+            self.job.cancelled = True
+            self.job = None
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+
+    def start_job(self, job):
+        self.job = job
+        job.done.connect(self.on_done)
+        job.failed.connect(self.on_failed)
+        job.start()
+
+    def on_done(self, names, matcher):
+        if self.sender() is not self.job:
+            return
+        self.job = None
+        if matcher is not None:
+            self.names = names
+            self.matcher = matcher
+        if self.database is None:
+            try:
+                self.database = SymbolDatabase(self.root)
+            except sqlite3.Error as e:
+                print(f"Could not open the symbols of {self.root}: {e}")
+        if self.dirty_paths:
+            self.update_timer.start()
+
+    def on_failed(self, message):
+        if self.sender() is self.job:
+            self.job = None
+            print(f"Could not index the symbols of {self.root}: {message}")
+
+    def start_update(self):
+        if self.job is not None:
+            # Picked up once the job in progress is done
+            return
+        job = SymbolIndexThread(self.root, sorted(self.dirty_paths), self.names)
+        self.dirty_paths = set()
+        self.start_job(job)
+
+    def lookup(self, name, limit):
+        if self.database is None:
+            return []
+        try:
+            return self.database.lookup(name, limit)
+        except sqlite3.Error:
+            return []
+
+    def definitions(self, name, path=None):
+        """Where name is defined: [(path, line, column, kind, scope)],
+        those in the file at path first"""
+        found = self.lookup(name, self.LOOKUP_LIMIT)
+        if path:
+            path = os.path.normcase(os.path.abspath(path))
+            found.sort(key=lambda location: os.path.normcase(location[0]) != path)
+        return found
+
+    def search(self, query, limit):
+        """Up to limit (name, path, line, column, kind, scope) of the
+        names that fuzzy match query, best first"""
+        if self.matcher is None:
+            return []
+        results = []
+        for _, name in self.matcher.match(query, limit):
+            for location in self.lookup(name, limit - len(results)):
+                results.append((name, *location))
+            if len(results) >= limit:
+                break
+        return results
+
+class SearchResults:
+    """Find-in-files hits grouped by file, as a list of rows.
+
+    Each file is a header row followed by a row per hit, unless the
+    file is collapsed. ``row_starts[i]`` is the row of the header of
+    file i, so a row is found by bisection and appending results never
+    touches the rows already there.
+    """
+    def __init__(self, root=''):
+        self.root = root
+        self.files = []  # [(path, [(line, column, length, preview), ...])]
+        self.collapsed = bytearray()
+        self.row_starts = array('q')
+        self.row_count = 0
+        self.hit_count = 0
+
+    def add(self, results):
+        for path, hits in results:
+            self.files.append((path, hits))
+            self.collapsed.append(0)
+            self.row_starts.append(self.row_count)
+            self.row_count += 1 + len(hits)
+            self.hit_count += len(hits)
+
+    def row(self, row):
+        """(file index, hit index) of row; the hit index of a header is -1"""
+        number = bisect.bisect_right(self.row_starts, row) - 1
+        return number, row - self.row_starts[number] - 1
+
+    def toggle(self, number):
+        """Collapse or expand file number"""
+        self.collapsed[number] ^= 1
+        row = self.row_starts[number]
+        for i in range(number, len(self.files)):
+            self.row_starts[i] = row
+            row += 1 if self.collapsed[i] else 1 + len(self.files[i][1])
+        self.row_count = row
+
+class SearchResultsView(QAbstractScrollArea):
+    """Paints only the visible rows of a SearchResults.
+
+    Like MappedTextView, the vertical scroll bar counts rows, so
+    streaming in more results costs nothing for the rows shown. Clicking
+    a file collapses or expands it; double-clicking a hit, or Enter on
+    the current one, emits ``hit_activated`` with (path, hit).
+    """
+    hit_activated = Signal(str, object)
 
-# Add new TabWidget class
-class EditorTabWidget(QTabWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.main_window = parent
-        self.setTabsClosable(True)
-        self.setMovable(True)
-        self.tabCloseRequested.connect(self.close_tab)
-        self.setup_style()
+        self.results = SearchResults()
+        self.current = -1
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setStyleSheet(f"""
+            QAbstractScrollArea {{
+                background-color: {EDITOR_COLORS['background']};
+                border: none;
+            }}
+        """)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+        self.update_scroll_range()
 
-    def add_new_tab(self, file_path=None):
-        """Add a new tab with a code editor"""
-        editor = GlassmorphicCodeEditor(self)
-        editor.setPlainText("")
-        
-        if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    editor.setPlainText(f.read())
-                editor.current_file = file_path
-                tab_name = os.path.basename(file_path)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
-                return
+    def set_results(self, results):
+        self.results = results
+        self.current = -1
+        self.verticalScrollBar().setValue(0)
+        self.update_scroll_range()
+
+    def row_height(self):
+        return self.fontMetrics().height() + 2
+
+    def visible_rows(self):
+        return max(1, self.viewport().height() // self.row_height())
+
+    def update_scroll_range(self):
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(0, self.results.row_count - self.visible_rows()))
+        bar.setPageStep(self.visible_rows())
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scroll_range()
+
+    def row_at(self, y):
+        row = self.verticalScrollBar().value() + y // self.row_height()
+        return row if row < self.results.row_count else -1
+
+    def set_current(self, row):
+        self.current = min(max(0, row), self.results.row_count - 1)
+        bar = self.verticalScrollBar()
+        if self.current < bar.value():
+            bar.setValue(self.current)
+        elif self.current >= bar.value() + self.visible_rows():
+            bar.setValue(self.current - self.visible_rows() + 1)
+        self.viewport().update()
+
+    def activate(self, row):
+        number, hit = self.results.row(row)
+        if hit < 0:
+            self.results.toggle(number)
+            self.current = self.results.row_starts[number]
+            self.update_scroll_range()
         else:
-            tab_name = "Untitled"
-            editor.current_file = None
+            path, hits = self.results.files[number]
+            self.hit_activated.emit(path, hits[hit])
 
-        # Set up syntax highlighting
-        highlighter = PythonHighlighter(editor.document())
-        
-        index = self.addTab(editor, tab_name)
-        self.setCurrentIndex(index)
-        editor.setFocus()
-        return editor
+    def mousePressEvent(self, event):
+        row = self.row_at(int(event.position().y()))
+        if row < 0:
+            return
+        self.set_current(row)
+        if self.results.row(row)[1] < 0:
+            self.activate(row)
 
-    def close_tab(self, index):
-        """Close the specified tab"""
-        editor = self.widget(index)
-        if editor and hasattr(editor, 'document') and editor.document().isModified():
-            reply = QMessageBox.question(
-                self,
-                'Save Changes?',
-                'Do you want to save changes before closing?',
-                QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel,
-                QMessageBox.Save
-            )
+    def mouseDoubleClickEvent(self, event):
+        row = self.row_at(int(event.position().y()))
+        if row >= 0 and self.results.row(row)[1] >= 0:
+            self.set_current(row)
+            self.activate(row)
 
-            if reply == QMessageBox.Save:
-                if hasattr(editor, 'current_file') and editor.current_file:
-                    try:
-                        with open(editor.current_file, 'w', encoding='utf-8') as f:
-                            f.write(editor.toPlainText())
-                        editor.document().setModified(False)
-                        self.removeTab(index)
-                    except Exception as e:
-                        QMessageBox.critical(self, "Error", f"Could not save file: {str(e)}")
-                else:
-                    # Handle unsaved new files
-                    file_path, _ = QFileDialog.getSaveFileName(
-                        self,
-                        "Save File As",
-                        "",
-                        "All Files (*.*);;"
-                        "Python Files (*.py);;"
-                        "Text Files (*.txt)"
-                    )
-                    if file_path:
-                        try:
-                            with open(file_path, 'w', encoding='utf-8') as f:
-                                f.write(editor.toPlainText())
-                            editor.document().setModified(False)
-                            self.removeTab(index)
-                        except Exception as e:
-                            QMessageBox.critical(self, "Error", f"Could not save file: {str(e)}")
-            elif reply == QMessageBox.Discard:
-                self.removeTab(index)
+    def keyPressEvent(self, event):
+        steps = {
+            Qt.Key_Up: -1, Qt.Key_Down: 1,
+            Qt.Key_PageUp: -self.visible_rows(), Qt.Key_PageDown: self.visible_rows(),
+        }
+        if event.key() in steps and self.results.row_count:
+            self.set_current(self.current + steps[event.key()])
+        elif event.key() in (Qt.Key_Return, Qt.Key_Enter) and self.current >= 0:
+            self.activate(self.current)
         else:
-            self.removeTab(index)
+            super().keyPressEvent(event)
 
-        # If no tabs left, show welcome screen
-        if self.count() == 0:
-            if hasattr(self.main_window, 'show_welcome_screen'):
-                self.main_window.show_welcome_screen()
-            else:
-                # Fallback if welcome screen not available
-                self.add_new_tab("Untitled")
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), QColor(EDITOR_COLORS['background']))
+        row_height = self.row_height()
+        ascent = self.fontMetrics().ascent() + 1
+        indent = self.fontMetrics().horizontalAdvance('9') * 2
+        first = self.verticalScrollBar().value()
+        results = self.results
+        for row in range(first, min(first + self.visible_rows() + 1, results.row_count)):
+            y = (row - first) * row_height
+            if row == self.current:
+                painter.fillRect(0, y, self.viewport().width(), row_height,
+                                 QColor(EDITOR_COLORS['selection_bg']))
+            number, hit = results.row(row)
+            path, hits = results.files[number]
+            if hit < 0:
+                marker = '▸' if results.collapsed[number] else '▾'
+                painter.setPen(QColor(EDITOR_COLORS['class_names']))
+                painter.drawText(4, y + ascent,
+                                 f"{marker} {os.path.relpath(path, results.root)}  ({len(hits)})")
+                continue
+            line, _, _, preview = hits[hit]
+            label = f"{line}: "
+            painter.setPen(QColor(EDITOR_COLORS['line_numbers']))
+            painter.drawText(indent, y + ascent, label)
+            painter.setPen(QColor(EDITOR_COLORS['text']))
+            painter.drawText(indent + self.fontMetrics().horizontalAdvance(label), y + ascent, preview)
+        painter.end()
+
+class FindInFilesPanel(QWidget):
+    """Search every file of the open project and list the matches.
+
+    Results stream in while the search runs; activating a hit opens its
+    file (or switches to its tab) with the match selected.
+    """
+    def __init__(self, main_window):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.job = 0
+        self.worker = None
+        self.started = 0.0
+        self.setup_ui()
 
-    def setup_style(self):
-        self.setStyleSheet("""
-            QTabWidget::pane {
-                border: none;
-            }
-            QTabWidget::tab-bar {
-                alignment: left;
-            }
-            QTabBar::tab {
-                background: rgba(40, 42, 54, 0.7);
-                color: #F8F8F2;
-                padding: 8px 16px;
-                border: none;
-                margin-right: 2px;
-            }
-            QTabBar::tab:selected {
-                background: rgba(68, 71, 90, 0.9);
-            }
-            QTabBar::tab:hover {
-                background: rgba(98, 114, 164, 0.8);
-            }
-        """)
-        
-    def add_welcome_page(self):
-        welcome = WelcomePage(self)
-        self.addTab(welcome, "Welcome")
-        self.setTabsClosable(False)  # Don't allow closing the welcome page
-        
-    def add_new_tab(self, title="Untitled", content=""):
-        # If this is the first regular tab, make tabs closable
-        if self.count() == 1 and isinstance(self.widget(0), WelcomePage):
-            self.setTabsClosable(True)
-        
-        editor = GlassmorphicCodeEditor(self)
-        editor.setPlainText(content)
-        index = self.addTab(editor, title)
-        self.setCurrentIndex(index)
-        return editor
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(5, 5, 5, 5)
 
-    def close_tab(self, index):
-        """Close the specified tab"""
-        widget = self.widget(index)  # Use self.widget instead of self.tab_widget
-        if widget and hasattr(widget, 'document') and widget.document().isModified():
-            reply = QMessageBox.question(
-                self,
-                'Save Changes?',
-                'Do you want to save changes before closing?',
-                QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel,
-                QMessageBox.Save
-            )
+        query_layout = QHBoxLayout()
+        self.find_input = QLineEdit()
+        self.find_input.setPlaceholderText("Find in files")
+        self.find_input.returnPressed.connect(self.start_search)
+        self.search_button = QPushButton("Search")
+        self.search_button.clicked.connect(self.toggle_search)
+        query_layout.addWidget(self.find_input)
+        query_layout.addWidget(self.search_button)
 
-            if reply == QMessageBox.Save:
-                if hasattr(widget, 'current_file'):
-                    try:
-                        with open(widget.current_file, 'w', encoding='utf-8') as f:
-                            f.write(widget.toPlainText())
-                        widget.document().setModified(False)
-                        self.removeTab(index)  # Use self.removeTab instead of self.tab_widget.removeTab
-                    except Exception as e:
-                        QMessageBox.critical(self, "Error", f"Could not save file: {str(e)}")
-                else:
-                    self.main_window.save_file_as()
-                    if not widget.document().isModified():
-                        self.removeTab(index)
-            elif reply == QMessageBox.Discard:
-                self.removeTab(index)
+        self.include_input = QLineEdit()
+        self.include_input.setPlaceholderText("Files to include, e.g. *.py, *.cpp")
+        self.include_input.returnPressed.connect(self.start_search)
+
+        options_layout = QHBoxLayout()
+        self.case_sensitive = QCheckBox("Case sensitive")
+        self.whole_words = QCheckBox("Whole words")
+        self.regex = QCheckBox("Regular expression")
+        options_layout.addWidget(self.case_sensitive)
+        options_layout.addWidget(self.whole_words)
+        options_layout.addWidget(self.regex)
+
+        self.status_label = QLabel()
+        self.results = SearchResultsView()
+        self.results.hit_activated.connect(self.main_window.open_location)
+
+        layout.addLayout(query_layout)
+        layout.addWidget(self.include_input)
+        layout.addLayout(options_layout)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.results)
+        self.setFocusProxy(self.find_input)
+
+    def toggle_search(self):
+        if self.worker is not None:
+            self.cancel_search()
         else:
-            self.removeTab(index)
+            self.start_search()
 
-        # If no tabs left, show welcome screen
-        if self.count() == 0 and hasattr(self.main_window, 'show_welcome_screen'):
-            self.main_window.show_welcome_screen()
+    def start_search(self):
+        self.cancel_search()
+        text = self.find_input.text()
+        if not text:
+            return
+        if not self.main_window.project_path:
+            self.status_label.setText("Open a project to search in it")
+            return
+        root = os.path.abspath(self.main_window.project_path)
+        try:
+            pattern = compile_search(text, self.regex.isChecked(),
+                                     self.case_sensitive.isChecked(), self.whole_words.isChecked())
+        except re.error as e:
+            self.status_label.setText(f"Invalid regular expression: {e}")
+            return
+        include = [p.strip() for p in self.include_input.text().split(',') if p.strip()]
+
+        # The project's trigram index narrows the files down, if it can
+        index = self.main_window.project_index
+        paths = index.candidates(pattern) if index is not None and index.root == root else None
+
+        self.job += 1
+        self.results.set_results(SearchResults(root))
+        self.worker = ProjectSearchThread(root, self.job, pattern,
+                                          not self.regex.isChecked() and text.isascii(),
+                                          include, paths)
+        self.worker.results_ready.connect(self.on_results)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.done.connect(self.on_done)
+        self.started = time.perf_counter()
+        self.search_button.setText("Cancel")
+        self.status_label.setText("Searching…")
+        self.worker.start()
+
+    def cancel_search(self):
+        if self.worker is None:
+            return
+        self.worker.cancelled = True
+        self.worker = None
+        self.search_button.setText("Search")
+        self.status_label.setText(f"Cancelled; {self.summary()}")
+
+    def summary(self):
+        hits = self.results.results.hit_count
+        files = len(self.results.results.files)
+        return (f"{hits:,} result{'s' if hits != 1 else ''} "
+                f"in {files:,} file{'s' if files != 1 else ''}")
+
+    def on_results(self, job, results):
+        if job == self.job:
+            self.results.results.add(results)
+            self.results.update_scroll_range()
+
+    def on_progress(self, job, searched, found):
+        if job == self.job and self.worker is not None:
+            self.status_label.setText(f"Searching… {searched:,}/{found:,} files; {self.summary()}")
+
+    def on_done(self, job, hits):
+        if job != self.job:
+            return
+        self.worker = None
+        self.search_button.setText("Search")
+        seconds = time.perf_counter() - self.started
+        limit = " (limit reached)" if hits >= ProjectSearchThread.MAX_HITS else ""
+        self.status_label.setText(f"{self.summary()}{limit} · {seconds:.2f}s")
+
+class WorkspaceSymbolDialog(QDialog):
+    """Fuzzy find a class, function, method or global of the project's
+    Python files and go to it; Up and Down pick among the matches."""
+    MAX_RESULTS = 200
+
+    def __init__(self, main_window, query=''):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.setWindowTitle("Go to Symbol in Workspace")
+        self.resize(600, 400)
+        layout = QVBoxLayout(self)
+        self.query_input = QLineEdit()
+        self.query_input.setPlaceholderText("Symbol name, e.g. stext for setText")
+        self.query_input.installEventFilter(self)
+        self.query_input.textChanged.connect(self.update_results)
+        self.results = QListWidget()
+        self.results.itemActivated.connect(self.open_symbol)
+        self.status_label = QLabel()
+        layout.addWidget(self.query_input)
+        layout.addWidget(self.results)
+        layout.addWidget(self.status_label)
+        self.query_input.setText(query)
+        self.query_input.selectAll()
+        self.update_results()
+
+    def eventFilter(self, obj, event):
+        if obj is self.query_input and event.type() == QEvent.KeyPress:
+            if event.key() in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+                QApplication.sendEvent(self.results, event)
+                return True
+            if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+                if self.results.currentItem() is not None:
+                    self.open_symbol(self.results.currentItem())
+                return True
+        return super().eventFilter(obj, event)
+
+    def update_results(self):
+        self.results.clear()
+        index = self.main_window.symbol_index
+        if index is None:
+            self.status_label.setText("Open a project to find its symbols")
+            return
+        if index.matcher is None:
+            self.status_label.setText("Indexing the project…")
+            return
+        query = self.query_input.text().strip()
+        found = index.search(query, self.MAX_RESULTS) if query else []
+        for name, path, line, column, kind, scope in found:
+            qualified = f'{scope}.{name}' if scope else name
+            item = QListWidgetItem(f"{qualified}  ({kind})  "
+                                   f"{os.path.relpath(path, index.root)}:{line}")
+            item.setData(Qt.UserRole, (path, (line, column, len(name), '')))
+            self.results.addItem(item)
+        self.results.setCurrentRow(0)
+        self.status_label.setText(f"{len(found):,} symbol{'s' if len(found) != 1 else ''}")
+
+    def open_symbol(self, item):
+        path, hit = item.data(Qt.UserRole)
+        self.accept()
+        self.main_window.open_location(path, hit)
 
 # Improve Terminal class
 class Terminal(QWidget):
@@ -1474,11 +8018,10 @@ class BuildRunner:
     def detect_language(cls, file_path):
         if not file_path:
             return None
-        ext = os.path.splitext(file_path)[1].lower()
-        for lang, config in cls.LANGUAGE_CONFIGS.items():
-            if ext in config['file_extensions']:
-                return lang
-        return None
+        language = language_for_path(file_path)
+        if language is None or language.build not in cls.LANGUAGE_CONFIGS:
+            return None
+        return language.build
 
     @classmethod
     def build_and_run(cls, file_path, output_callback):
@@ -1670,6 +8213,30 @@ class SettingsDialog(QDialog):
         self.tab_size.setRange(2, 8)
         editor_layout.addRow("Tab Size:", self.tab_size)
         
+        self.lazy_highlight_lines = QSpinBox()
+        self.lazy_highlight_lines.setRange(1000, 10000000)
+        self.lazy_highlight_lines.setSingleStep(1000)
+        editor_layout.addRow("Lazy Highlighting Above (lines):", self.lazy_highlight_lines)
+        
+        self.semantic_highlighting = QCheckBox("Color parameters, locals, classes and imports")
+        editor_layout.addRow("Semantic Highlighting:", self.semantic_highlighting)
+        
+        self.minimap = QCheckBox("Show an overview of the file beside the editor")
+        editor_layout.addRow("Minimap:", self.minimap)
+        
+        self.large_file_mb = QSpinBox()
+        self.large_file_mb.setRange(1, 1 << 20)
+        self.large_file_mb.setSuffix(" MB")
+        editor_layout.addRow("Read-only Viewer Above:", self.large_file_mb)
+
+        self.piece_table_mb = QSpinBox()
+        self.piece_table_mb.setRange(1, 1 << 20)
+        self.piece_table_mb.setSuffix(" MB")
+        editor_layout.addRow("Piece-Table Editor Above:", self.piece_table_mb)
+
+        self.hot_exit = QCheckBox("Close without asking, restoring unsaved tabs next time")
+        editor_layout.addRow("Hot Exit:", self.hot_exit)
+        
         self.tab_widget.addTab(editor_widget, "Editor")
         
         # Theme settings
@@ -1698,6 +8265,13 @@ class SettingsDialog(QDialog):
                 settings = json.load(f)
                 self.font_size.setValue(settings.get('font_size', 12))
                 self.tab_size.setValue(settings.get('tab_size', 4))
+                self.lazy_highlight_lines.setValue(settings.get(
+                    'lazy_highlight_lines', GlassmorphicCodeEditor.LAZY_HIGHLIGHT_LINES))
+                self.semantic_highlighting.setChecked(settings.get('semantic_highlighting', True))
+                self.minimap.setChecked(settings.get('minimap', True))
+                self.large_file_mb.setValue(settings.get('large_file_mb', LargeFileViewer.LARGE_FILE_MB))
+                self.piece_table_mb.setValue(settings.get('piece_table_mb', PieceTableEditor.PIECE_TABLE_MB))
+                self.hot_exit.setChecked(settings.get('hot_exit', True))
                 self.theme_selector.setCurrentText(settings.get('theme', 'Dark'))
         except FileNotFoundError:
             pass
@@ -1706,6 +8280,12 @@ class SettingsDialog(QDialog):
         settings = {
             'font_size': self.font_size.value(),
             'tab_size': self.tab_size.value(),
+            'lazy_highlight_lines': self.lazy_highlight_lines.value(),
+            'semantic_highlighting': self.semantic_highlighting.isChecked(),
+            'minimap': self.minimap.isChecked(),
+            'large_file_mb': self.large_file_mb.value(),
+            'piece_table_mb': self.piece_table_mb.value(),
+            'hot_exit': self.hot_exit.isChecked(),
             'theme': self.theme_selector.currentText()
         }
         with open('settings.json', 'w') as f:
@@ -1757,6 +8337,20 @@ class MainWindow(QMainWindow):
         # Initialize current_file and project path
         self.current_file = None
         self.project_path = None
+        self.project_index = None
+        self.symbol_index = None
+        self.find_dialog = None
+
+        # Files are written in the background; failures are listed in
+        # the status bar rather than in a dialog
+        self.save_service = SaveService(self)
+        self.save_service.saved.connect(self.on_file_saved)
+        self.save_service.failed.connect(self.on_save_failed)
+        self.save_errors = {}
+        self.close_when_saved = False
+
+        # Unsaved edits are journaled, so a crash or a hot exit loses none
+        self.edit_journal = EditJournal(self)
         
         # Create central widget
         self.central_widget = QWidget()
@@ -1772,6 +8366,15 @@ class MainWindow(QMainWindow):
         # Show welcome screen initially
         self.show_welcome_screen()
 
+        # Completion vocabularies are built once per process, as soon as
+        # the event loop is idle rather than by the first keystroke
+        QTimer.singleShot(0, build_vocabularies)
+
+        # Bring back the tabs left unsaved last time
+        if self.edit_journal.restore(self.tab_widget):
+            self.cleanup_welcome_screen()
+            self.show_editor_interface()
+
         # Add window flags for proper closing
         self.setWindowFlags(
             Qt.Window |
@@ -1861,49 +8464,32 @@ class MainWindow(QMainWindow):
         editor = QPlainTextEdit()
         
         # Add line number area methods to editor
+        gutter = GutterRenderer(editor, "#1E1E1E", "#858585")
+
         def lineNumberAreaWidth():
-            digits = len(str(max(1, editor.blockCount())))
-            space = 3 + editor.fontMetrics().horizontalAdvance('9') * digits
-            return space
+            return gutter.width(editor.blockCount())
 
         def updateLineNumberAreaWidth(dummy=0):
-            editor.setViewportMargins(lineNumberAreaWidth(), 0, 0, 0)
+            if gutter.width_changed(editor.blockCount()):
+                editor.setViewportMargins(lineNumberAreaWidth(), 0, 0, 0)
 
         def updateLineNumberArea(rect, dy):
-            if dy:
-                editor.line_number_area.scroll(0, dy)
-            else:
-                editor.line_number_area.update(0, rect.y(), editor.line_number_area.width(), rect.height())
+            gutter.update_request(editor.line_number_area, rect, dy)
             if rect.contains(editor.viewport().rect()):
                 updateLineNumberAreaWidth()
 
         def lineNumberAreaPaintEvent(event):
-            painter = QPainter(editor.line_number_area)
-            painter.fillRect(event.rect(), QColor("#1E1E1E"))
-
-            block = editor.firstVisibleBlock()
-            block_number = block.blockNumber()
-            offset = editor.contentOffset()
-            top = editor.blockBoundingGeometry(block).translated(offset).top()
-            bottom = top + editor.blockBoundingRect(block).height()
-
-            while block.isValid() and top <= event.rect().bottom():
-                if block.isVisible() and bottom >= event.rect().top():
-                    number = str(block_number + 1)
-                    painter.setPen(QColor("#858585"))
-                    painter.drawText(0, int(top), editor.line_number_area.width(), 
-                                   editor.fontMetrics().height(),
-                                   Qt.AlignRight, number)
-                block = block.next()
-                top = bottom
-                bottom = top + editor.blockBoundingRect(block).height()
-                block_number += 1
+            gutter.paint(editor.line_number_area, event)
+
+        def lineNumberAreaMousePressEvent(event):
+            pass  # No folding here
 
         # Add methods to editor
         editor.lineNumberAreaWidth = lineNumberAreaWidth
         editor.updateLineNumberAreaWidth = updateLineNumberAreaWidth
         editor.updateLineNumberArea = updateLineNumberArea
         editor.lineNumberAreaPaintEvent = lineNumberAreaPaintEvent
+        editor.lineNumberAreaMousePressEvent = lineNumberAreaMousePressEvent
 
         # Set up editor styling
         editor.setStyleSheet("""
@@ -1961,7 +8547,7 @@ class MainWindow(QMainWindow):
         editor.updateLineNumberAreaWidth()
         
         # Add syntax highlighting
-        highlighter = PythonHighlighter(editor.document())
+        highlighter = PythonHighlighter(editor.document(), threaded=True)
         
         # Add drag & drop support
         editor.setAcceptDrops(True)
@@ -2008,6 +8594,7 @@ class MainWindow(QMainWindow):
         try:
             # Store project path
             self.project_path = project_path
+            self.open_project_index(project_path)
             
             # Hide welcome screen
             self.cleanup_welcome_screen()
@@ -2026,6 +8613,16 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Error", f"Failed to open project: {str(e)}")
             self.show_welcome_screen()
 
+    def open_project_index(self, project_path):
+        """Index the project in the background for find-in-files, and
+        its Python symbols"""
+        if self.project_index is not None:
+            self.project_index.close()
+        self.project_index = ProjectIndex(project_path, self)
+        if self.symbol_index is not None:
+            self.symbol_index.close()
+        self.symbol_index = SymbolIndex(project_path, self)
+
     def create_project_panel(self, project_path):
         """Create project panel with file operations"""
         # Create dock widget
@@ -2309,20 +8906,8 @@ class MainWindow(QMainWindow):
             # Ensure editor interface is visible
             self.show_editor_interface()
             
-            # Read file content
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Create new tab with file
-            editor = self.tab_widget.add_new_tab(os.path.basename(file_path))
-            editor.setPlainText(content)
-            editor.current_file = file_path
-            
-            # Apply appropriate syntax highlighting based on file extension
-            ext = os.path.splitext(file_path)[1].lower()
-            if ext == '.py':
-                highlighter = PythonHighlighter(editor.document())
-            # Add more syntax highlighters for other file types as needed
+            # Create new tab with file; the highlighter follows the extension
+            editor = self.tab_widget.open_file(file_path)
             
             # Update status bar
             self.statusBar().showMessage(f"Opened {file_path}")
@@ -2333,6 +8918,53 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
 
+    def open_location(self, path, hit):
+        """Open path, or switch to its tab, and select hit, a (line,
+        column, length, preview) like those of search_files"""
+        tab_widget = self.tab_widget
+        for i in range(tab_widget.count()):
+            widget = tab_widget.widget(i)
+            current = getattr(widget, 'current_file', None)
+            if current and os.path.normcase(os.path.abspath(current)) == os.path.normcase(path):
+                tab_widget.setCurrentIndex(i)
+                break
+        else:
+            try:
+                widget = tab_widget.open_file(path)
+            except OSError as e:
+                QMessageBox.critical(self, "Error", f"Could not open file: {e}")
+                return
+        if isinstance(widget, GlassmorphicCodeEditor) and widget.loader is not None:
+            # Select the hit once the file has loaded
+            def select(widget=widget):
+                widget.loaded.disconnect(select)
+                self.show_location(widget, hit)
+            widget.loaded.connect(select)
+        else:
+            self.show_location(widget, hit)
+
+    @staticmethod
+    def show_location(widget, hit):
+        line, column, length, _ = hit
+        if isinstance(widget, (LargeFileViewer, PieceTableEditor)):
+            widget.goto_line(line)
+            return
+        if not isinstance(widget, QPlainTextEdit):
+            return
+        block = widget.document().findBlockByNumber(line - 1)
+        if not block.isValid():
+            return
+        text = block.text()
+        # Cursor positions count UTF-16 units
+        start = len(text[:column].encode('utf-16-le')) // 2
+        end = len(text[:column + length].encode('utf-16-le')) // 2
+        cursor = QTextCursor(block)
+        cursor.setPosition(block.position() + start)
+        cursor.setPosition(block.position() + end, QTextCursor.KeepAnchor)
+        widget.setTextCursor(cursor)
+        widget.centerCursor()
+        widget.setFocus()
+
     def refresh_project_tree(self):
         """Refresh the project tree view"""
         if hasattr(self, 'project_model') and hasattr(self, 'project_tree'):
@@ -2378,11 +9010,7 @@ class MainWindow(QMainWindow):
         file_path = self.project_model.filePath(index)
         if os.path.isfile(file_path):
             try:
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                editor = self.create_new_tab(os.path.basename(file_path))
-                editor.setPlainText(content)
-                editor.current_file = file_path
+                self.tab_widget.open_file(file_path)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
 
@@ -2516,13 +9144,7 @@ class MainWindow(QMainWindow):
 
     def load_file(self, file_name):
         try:
-            with open(file_name, 'r') as f:
-                content = f.read()
-            editor = self.tab_widget.add_new_tab(
-                title=os.path.basename(file_name),
-                content=content
-            )
-            editor.current_file = file_name
+            self.tab_widget.open_file(file_name)
             self.statusBar().showMessage(f"Opened {file_name}")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
@@ -2884,6 +9506,17 @@ class MainWindow(QMainWindow):
         edit_menu.addAction(self.create_action("Cut", "Ctrl+X", lambda: self.get_current_editor().cut()))
         edit_menu.addAction(self.create_action("Copy", "Ctrl+C", lambda: self.get_current_editor().copy()))
         edit_menu.addAction(self.create_action("Paste", "Ctrl+V", lambda: self.get_current_editor().paste()))
+        edit_menu.addSeparator()
+        edit_menu.addAction(self.create_action("Find", "Ctrl+F", self.show_find))
+        edit_menu.addAction(self.create_action("Replace", "Ctrl+H", self.show_find_replace))
+        edit_menu.addSeparator()
+        edit_menu.addAction(self.create_action("Go to Definition", "F12", self.go_to_definition))
+        edit_menu.addAction(self.create_action("Go to Symbol in Workspace", "Ctrl+T",
+                                               lambda: self.show_workspace_symbols()))
+        edit_menu.addSeparator()
+        edit_menu.addAction(self.create_action("Toggle Fold", "Ctrl+Shift+[", self.toggle_fold))
+        edit_menu.addAction(self.create_action("Fold All", "Ctrl+K, Ctrl+0", self.fold_all))
+        edit_menu.addAction(self.create_action("Unfold All", "Ctrl+K, Ctrl+J", self.unfold_all))
 
         # View Menu
         view_menu = self.menubar.addMenu("View")
@@ -2893,6 +9526,8 @@ class MainWindow(QMainWindow):
         view_menu.addAction(self.create_action("Search", "Ctrl+Shift+F", self.toggle_search))
         view_menu.addAction(self.create_action("Source Control", "Ctrl+Shift+G", self.toggle_source_control))
         view_menu.addAction(self.create_action("Debug", "Ctrl+Shift+D", self.toggle_debug))
+        view_menu.addSeparator()
+        view_menu.addAction(self.create_action("Minimap", "Ctrl+Shift+M", self.toggle_minimap))
 
         # Run Menu
         run_menu = self.menubar.addMenu("Run")
@@ -2996,24 +9631,20 @@ class MainWindow(QMainWindow):
 
     def save_file(self):
         editor = self.tab_widget.currentWidget()
-        if not editor:
+        if not can_save(editor):
             return
         
         if not hasattr(editor, 'current_file') or not editor.current_file:
             file_name, _ = QFileDialog.getSaveFileName(self, "Save File")
             if file_name:
                 editor.current_file = file_name
+                editor.set_file_type(file_name)
                 self.tab_widget.setTabText(
                     self.tab_widget.currentIndex(),
                     os.path.basename(file_name))
         
         if hasattr(editor, 'current_file') and editor.current_file:
-            try:
-                with open(editor.current_file, 'w') as f:
-                    f.write(editor.toPlainText())
-                self.statusBar().showMessage(f"Saved {editor.current_file}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Could not save file: {str(e)}")
+            self.save_service.save(editor, editor.current_file)
 
     def setup_build_tools(self):
         # Add build and run actions to toolbar
@@ -3128,7 +9759,8 @@ class MainWindow(QMainWindow):
         edit_menu.addAction("Undo", lambda: self.get_current_editor().undo(), "Ctrl+Z")
         edit_menu.addAction("Redo", lambda: self.get_current_editor().redo(), "Ctrl+Y")
         edit_menu.addSeparator()
-        edit_menu.addAction("Find/Replace", self.show_find_replace, "Ctrl+F")
+        edit_menu.addAction("Find", self.show_find, "Ctrl+F")
+        edit_menu.addAction("Replace", self.show_find_replace, "Ctrl+H")
         edit_menu.addAction("Go to Line", self.goto_line, "Ctrl+G")
 
         # View menu
@@ -3149,16 +9781,61 @@ class MainWindow(QMainWindow):
         help_menu.addSeparator()
         help_menu.addAction("About Pylight IDE", self.show_about)
 
+    def show_find(self):
+        editor = self.get_current_editor()
+        if isinstance(editor, GlassmorphicCodeEditor):
+            editor.show_find_bar()
+        else:
+            self.show_find_replace()
+
     def show_find_replace(self):
-        dialog = FindReplaceDialog(self)
-        dialog.exec()
+        editor = self.get_current_editor()
+        if isinstance(editor, LargeFileViewer):
+            editor.show_find()
+            return
+        # Non-modal, so the editor stays usable while it is open
+        if self.find_dialog is None:
+            self.find_dialog = FindReplaceDialog(self)
+        self.find_dialog.show()
+        self.find_dialog.raise_()
+        self.find_dialog.activateWindow()
+
+    def go_to_definition(self):
+        """Go to where the word under the cursor is defined in the
+        project, or list the definitions when there are several"""
+        editor = self.get_current_editor()
+        if not isinstance(editor, GlassmorphicCodeEditor):
+            return
+        name = editor.text_under_cursor()
+        if not name or self.symbol_index is None:
+            return
+        found = self.symbol_index.definitions(name, getattr(editor, 'current_file', None))
+        if not found:
+            self.statusBar().showMessage(f"No definition of {name} found", 3000)
+        elif len(found) == 1:
+            path, line, column, _, _ = found[0]
+            self.open_location(path, (line, column, len(name), ''))
+        else:
+            self.show_workspace_symbols(name)
+
+    def show_workspace_symbols(self, query=''):
+        WorkspaceSymbolDialog(self, query).exec()
 
     def goto_line(self):
+        editor = self.get_current_editor()
+        if isinstance(editor, (LargeFileViewer, PieceTableEditor)):
+            line, ok = QInputDialog.getInt(self, "Go to Line", "Line number:",
+                                         1, 1, max(1, editor.line_count()))
+            if ok:
+                editor.goto_line(line)
+            return
+        if not isinstance(editor, QPlainTextEdit):
+            return
         line, ok = QInputDialog.getInt(self, "Go to Line", "Line number:",
-                                     1, 1, self.editor.blockCount())
+                                     1, 1, editor.blockCount())
         if ok:
-            cursor = QTextCursor(self.editor.document().findBlockByLineNumber(line - 1))
-            self.editor.setTextCursor(cursor)
+            cursor = QTextCursor(editor.document().findBlockByLineNumber(line - 1))
+            editor.setTextCursor(cursor)
 
     def toggle_terminal(self):
         if hasattr(self, 'terminal_dock'):
@@ -3200,6 +9877,11 @@ class MainWindow(QMainWindow):
             git_panel = self.git_manager.get_git_panel()
             git_dock.setWidget(git_panel)
             self.addDockWidget(Qt.BottomDockWidgetArea, git_dock)
+
+            # Find in files, searches the open project
+            self.search_panel = QDockWidget("Search", self)
+            self.search_panel.setWidget(FindInFilesPanel(self))
+            self.addDockWidget(Qt.LeftDockWidgetArea, self.search_panel)
             
         except Exception as e:
             QMessageBox.warning(self, "Setup Warning", f"Error setting up dock widgets: {str(e)}")
@@ -3390,7 +10072,7 @@ class MainWindow(QMainWindow):
         for i in range(self.tab_widget.count()):
             editor = self.tab_widget.widget(i)
             if hasattr(editor, 'current_file') and editor.current_file == file_path:
-                self.tab_widget.removeTab(i)
+                self.tab_widget.remove_editor(editor)
                 break
 
     def update_file_tab(self, old_path, new_path):
@@ -3399,6 +10081,7 @@ class MainWindow(QMainWindow):
             editor = self.tab_widget.widget(i)
             if hasattr(editor, 'current_file') and editor.current_file == old_path:
                 editor.current_file = new_path
+                editor.set_file_type(new_path)
                 self.tab_widget.setTabText(i, os.path.basename(new_path))
                 break
 
@@ -3497,37 +10180,37 @@ class MainWindow(QMainWindow):
 
     def save_file_as(self):
         """Save current file with a new name"""
-        editor = self.get_current_editor()
-        if editor:
-            file_name, _ = QFileDialog.getSaveFileName(
-                self,
-                "Save File As",
-                "",
-                "All Files (*.*);;"
-                "Python Files (*.py);;"
-                "C++ Files (*.cpp *.h);;"
-                "Text Files (*.txt)"
-            )
-            if file_name:
-                try:
-                    with open(file_name, 'w', encoding='utf-8') as f:
-                        f.write(editor.toPlainText())
-                    
-                    # Update editor's current file
-                    editor.current_file = file_name
-                    
-                    # Update tab text
-                    current_index = self.tab_widget.currentIndex()
-                    self.tab_widget.setTabText(current_index, os.path.basename(file_name))
-                    
-                    # Show success message
-                    self.statusBar().showMessage(f"Saved as: {file_name}")
-                    
-                    # Add to recent files
-                    self.add_to_recent_files(file_name)
-                    
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Could not save file: {str(e)}")
+        self.save_editor_as(self.get_current_editor())
+
+    def save_editor_as(self, editor):
+        """Ask for a file name and start saving editor to it; False if
+        there was nothing to save or no name was given"""
+        if not can_save(editor):
+            return False
+        file_name, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save File As",
+            "",
+            "All Files (*.*);;"
+            "Python Files (*.py);;"
+            "C++ Files (*.cpp *.h);;"
+            "Text Files (*.txt)"
+        )
+        if not file_name:
+            return False
+        self.save_service.save(editor, file_name)
+
+        # Update editor's current file
+        editor.current_file = file_name
+        editor.set_file_type(file_name)
+
+        # Update tab text
+        index = self.tab_widget.indexOf(editor)
+        self.tab_widget.setTabText(index, os.path.basename(file_name))
+
+        # Add to recent files
+        self.add_to_recent_files(file_name)
+        return True
 
     def add_to_recent_files(self, file_path):
         """Add file to recent files list"""
@@ -3580,6 +10263,7 @@ class MainWindow(QMainWindow):
             ("Open File", self.open_file),
             ("Save", self.save_file),
             ("Save As", self.save_file_as),
+            ("Go to Symbol in Workspace", lambda: self.show_workspace_symbols()),
             None,  # Separator
             ("Toggle Terminal", self.toggle_terminal),
             ("Toggle Explorer", self.toggle_explorer),
@@ -3614,6 +10298,9 @@ class MainWindow(QMainWindow):
         """Toggle search panel visibility"""
         if hasattr(self, 'search_panel'):
             self.search_panel.setVisible(not self.search_panel.isVisible())
+            if self.search_panel.isVisible():
+                self.search_panel.raise_()
+                self.search_panel.widget().setFocus()
 
     def toggle_source_control(self):
         """Toggle source control panel visibility"""
@@ -3625,6 +10312,28 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'debug_panel'):
             self.debug_panel.setVisible(not self.debug_panel.isVisible())
 
+    def toggle_fold(self):
+        """Fold or unfold the region at the cursor of the current editor"""
+        editor = self.get_current_editor()
+        if isinstance(editor, GlassmorphicCodeEditor):
+            editor.toggle_fold()
+
+    def fold_all(self):
+        editor = self.get_current_editor()
+        if isinstance(editor, GlassmorphicCodeEditor):
+            editor.fold_all()
+
+    def unfold_all(self):
+        editor = self.get_current_editor()
+        if isinstance(editor, GlassmorphicCodeEditor):
+            editor.unfold_all()
+
+    def toggle_minimap(self):
+        """Toggle the minimap of the current editor"""
+        editor = self.get_current_editor()
+        if isinstance(editor, GlassmorphicCodeEditor):
+            editor.set_minimap_visible(editor.minimap.isHidden())
+
     def build_current_file(self):
         """Build the current file"""
         editor = self.get_current_editor()
@@ -3715,7 +10424,11 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         """Handle window close event"""
         # Check if there are unsaved changes
-        if self.has_unsaved_changes():
+        if self.has_unsaved_changes() and self.hot_exit():
+            # The unsaved tabs are restored from their journals next time
+            self.edit_journal.sync()
+            event.accept()
+        elif self.has_unsaved_changes():
             reply = QMessageBox.question(
                 self,
                 'Save Changes?',
@@ -3725,15 +10438,44 @@ class MainWindow(QMainWindow):
             )
 
             if reply == QMessageBox.Save:
-                # Save all unsaved files
+                # Close again once every file is saved; on_file_saved()
+                # does, unless a save fails
+                self.close_when_saved = True
                 self.save_all_files()
+                if self.save_service.is_saving():
+                    event.ignore()
+                    return
                 event.accept()
             elif reply == QMessageBox.Discard:
+                self.edit_journal.discard()
                 event.accept()
             else:
                 event.ignore()
         else:
             event.accept()
+        if event.isAccepted():
+            if self.project_index is not None:
+                self.project_index.close()
+            if self.symbol_index is not None:
+                self.symbol_index.close()
+            self.edit_journal.close()
+
+    def hot_exit(self):
+        """Whether to close without asking, keeping unsaved tabs in their
+        journals; only when every modified tab is journaled"""
+        try:
+            with open('settings.json', 'r') as f:
+                settings = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            settings = {}
+        if not settings.get('hot_exit', True):
+            return False
+        for i in range(self.tab_widget.count()):
+            editor = self.tab_widget.widget(i)
+            if (hasattr(editor, 'document') and editor.document().isModified()
+                    and not self.edit_journal.covers(editor)):
+                return False
+        return True
 
     def has_unsaved_changes(self):
         """Check if any open files have unsaved changes"""
@@ -3744,16 +10486,38 @@ class MainWindow(QMainWindow):
         return False
 
     def save_all_files(self):
-        """Save all open files"""
+        """Save all modified files at once; failures are reported by
+        on_save_failed()"""
         for i in range(self.tab_widget.count()):
             editor = self.tab_widget.widget(i)
-            if hasattr(editor, 'current_file'):
-                try:
-                    with open(editor.current_file, 'w', encoding='utf-8') as f:
-                        f.write(editor.toPlainText())
-                    editor.document().setModified(False)
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Could not save file: {str(e)}")
+            if (getattr(editor, 'current_file', None) and can_save(editor)
+                    and editor.document().isModified()):
+                self.save_service.save(editor, editor.current_file)
+
+    def on_file_saved(self, editor, file_path):
+        self.save_errors.pop(file_path, None)
+        index = self.tab_widget.indexOf(editor)
+        if index >= 0:
+            self.tab_widget.setTabToolTip(index, file_path)
+            self.tab_widget.tabBar().setTabTextColor(index, QColor())
+        if not self.save_errors:
+            self.statusBar().showMessage(f"Saved {file_path}", 5000)
+        if self.close_when_saved and not self.save_service.is_saving():
+            self.close_when_saved = False
+            self.close()
+
+    def on_save_failed(self, editor, file_path, message):
+        """Mark the tab and list every file that failed in the status bar"""
+        self.save_errors[file_path] = message
+        self.close_when_saved = False
+        index = self.tab_widget.indexOf(editor)
+        if index >= 0:
+            self.tab_widget.setTabToolTip(index, f"Could not save: {message}")
+            self.tab_widget.tabBar().setTabTextColor(index, QColor('#F44747'))
+        failures = "; ".join(f"{os.path.basename(path)}: {error}"
+                             for path, error in self.save_errors.items())
+        count = len(self.save_errors)
+        self.statusBar().showMessage(f"Could not save {count} file{'s' if count != 1 else ''} ({failures})")
 
     def cleanup_welcome_screen(self):
         """Clean up welcome screen properly"""
@@ -3943,13 +10707,8 @@ class MainWindow(QMainWindow):
         file_path = self.file_model.filePath(index)
         if os.path.isfile(file_path):
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
                 # Create new tab with file
-                editor = self.tab_widget.add_new_tab(os.path.basename(file_path))
-                editor.setPlainText(content)
-                editor.current_file = file_path
+                self.tab_widget.open_file(file_path)
                 
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
@@ -4068,17 +10827,9 @@ class LanguageSupport:
         ext = os.path.splitext(file_name)[1].lower()
 
         # Determine language
-        language = None
-        if ext == '.c':
-            language = 'C'
-        elif ext in ['.cpp', '.cxx', '.cc']:
-            language = 'C++'
-        elif ext == '.py':
-            language = 'Python'
-        elif ext == '.js':
-            language = 'JavaScript'
+        language = BuildRunner.detect_language(file_path)
 
-        if not language:
+        if language not in ('C', 'C++', 'Python', 'JavaScript'):
             output_callback(f"Unsupported file type: {ext}")
             return
 
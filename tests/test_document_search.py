@@ -0,0 +1,61 @@
+"""The find bar's search finds the same matches window by window as
+re does over the whole text.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import re
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+# code_editor needs a QApplication at import time
+app = QApplication.instance() or QApplication(sys.argv[:1])
+
+import code_editor
+
+def search(text, pattern, window=16):
+    """(start, end) of each match a DocumentSearchThread reports"""
+    thread = code_editor.DocumentSearchThread(0, [text], pattern)
+    thread.WINDOW = window
+    starts, ends = [], []
+
+    def found(job, found_starts, found_ends):
+        starts.extend(found_starts)
+        ends.extend(found_ends)
+
+    thread.found.connect(found)
+    # Run on this thread, so the signals are delivered right away
+    thread.run()
+    return list(zip(starts, ends))
+
+def spans(text, pattern):
+    return [match.span() for match in pattern.finditer(text) if match.start() != match.end()]
+
+LINES = [f'line {i} foo;\n' for i in range(40)]
+TEXT = ''.join(LINES[:20] + ['a\n', 'b foo\n'] + LINES[20:]) + 'a\nb; foo'
+# Window sizes that cut the text at different lines
+WINDOWS = (14, 16, 32, 48)
+
+def test_patterns_across_lines_are_found_across_windows():
+    for source in (r'a\s+b', r'[^;]+;', r'foo;\W+line', r'(?s)0.*?1'):
+        pattern = code_editor.compile_search(source, regex=True)
+        assert code_editor.pattern_spans_lines(pattern)
+        for window in WINDOWS:
+            assert search(TEXT, pattern, window) == spans(TEXT, pattern), (source, window)
+
+def test_end_anchors_match_at_the_end_only():
+    for source in (r'(?-m:foo$)', r'foo\Z'):
+        pattern = code_editor.compile_search(source, regex=True)
+        for window in WINDOWS:
+            assert search(TEXT, pattern, window) == [(len(TEXT) - 3, len(TEXT))], (source, window)
+
+def test_single_line_patterns_are_windowed():
+    for source in (r'foo;$', r'\bline \d+', r'[^\n;]+'):
+        pattern = code_editor.compile_search(source, regex=True)
+        assert not code_editor.pattern_spans_lines(pattern)
+        for window in WINDOWS:
+            assert search(TEXT, pattern, window) == spans(TEXT, pattern), (source, window)
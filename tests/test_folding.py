@@ -0,0 +1,36 @@
+"""Fold regions line up with the blocks of the document.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication, QPlainTextEdit
+from PySide6.QtGui import QTextCursor
+
+# code_editor needs a QApplication at import time
+app = QApplication.instance() or QApplication(sys.argv[:1])
+
+import code_editor
+
+def test_line_separator_in_a_string_is_not_a_block():
+    # toPlainText() turns U+2028 into a newline; the document does not
+    editor = QPlainTextEdit()
+    editor.setPlainText("x = 'a\u2028b'\ndef f():\n    pass\n\ndef g():\n    pass\n")
+    document = editor.document()
+    folds = code_editor.IndentFolds(document)
+    assert len(folds.entries) == document.blockCount()
+    assert folds.regions() == [(1, 2), (4, 5)]
+
+    assert folds.fold(1)
+    assert not document.findBlockByNumber(2).isVisible()
+    folds.unfold(1)
+
+    cursor = QTextCursor(document.findBlockByNumber(4))
+    cursor.insertText('class C:\n    ')
+    assert len(folds.entries) == document.blockCount()
+    assert folds.regions() == [(1, 2), (4, 6)]
+    folds.release()
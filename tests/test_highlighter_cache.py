@@ -0,0 +1,62 @@
+"""Highlighter rules and formats are built once per language, however
+many tabs are open.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import gc
+import tracemalloc
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtGui import QTextDocument
+
+# code_editor needs a QApplication at import time
+app = QApplication.instance() or QApplication(sys.argv[:1])
+
+import code_editor
+
+TABS = 50
+
+def test_tabs_share_rules_and_formats():
+    editors = [code_editor.GlassmorphicCodeEditor(None, f'file{i}.py') for i in range(TABS)]
+    highlighters = [editor.highlighter for editor in editors]
+    assert all(isinstance(h, code_editor.PythonHighlighter) for h in highlighters)
+    # One highlighter per document
+    assert len({id(h.document()) for h in highlighters}) == TABS
+    assert len({id(h.rules) for h in highlighters}) == 1
+    assert len({id(h.formats) for h in highlighters}) == 1
+    for editor in editors:
+        editor.deleteLater()
+    app.processEvents()
+
+def test_rule_memory_does_not_grow_per_tab():
+    # A subclass of its own compiles its rules afresh, so their size
+    # can be measured
+    class Highlighter(code_editor.PythonHighlighter):
+        pass
+
+    documents = [QTextDocument() for _ in range(TABS)]
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        Highlighter.compiled_rules()
+        Highlighter.shared_formats()
+        rule_bytes = tracemalloc.get_traced_memory()[0] - start
+
+        highlighters = [Highlighter(document) for document in documents[:5]]
+        gc.collect()
+        start = tracemalloc.get_traced_memory()[0]
+        highlighters += [Highlighter(document) for document in documents[5:]]
+        gc.collect()
+        per_highlighter = (tracemalloc.get_traced_memory()[0] - start) / (TABS - 5)
+    finally:
+        tracemalloc.stop()
+
+    assert len({id(h.rules) for h in highlighters}) == 1
+    assert len({id(h.formats) for h in highlighters}) == 1
+    # Each highlighter only holds its own state, far less than the rules
+    assert per_highlighter < rule_bytes / 4, (per_highlighter, rule_bytes)